@@ -1,7 +1,7 @@
 # pyright: reportUnusedExpression=false
 {
     'name': 'Business Trip Management',
-    'version': '1.0.0',
+    'version': '1.0.1',
     'license': 'LGPL-3',
     'summary': 'Redirects users to different business trip views based on role',
     'description': """
@@ -27,6 +27,7 @@ This module provides a dynamic redirection to business trip management views:
         'views/business_trip_action.xml',
         'views/business_trip_sale_order_views.xml',
         'views/business_trip_settings_views.xml',
+        'views/res_users_views.xml',
         'views/menu_views.xml',
         'views/mail_templates.xml',
         'demo/demo.xml',
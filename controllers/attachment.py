@@ -2,38 +2,43 @@
 
 import json
 import logging
-import base64
 import magic
-import hashlib
 import mimetypes
-from odoo import http, fields, tools
+import psycopg2
+import random
+import time
+from odoo import api, http, fields, tools, SUPERUSER_ID
 from odoo.http import request, Response
 from odoo.exceptions import UserError
-from datetime import datetime, timedelta, timezone
+from datetime import timedelta
+from ..models.business_trip_upload import UPLOAD_CHUNK_SIZE
 
 _logger = logging.getLogger(__name__)
 
+# Attempts at taking a rate limit token when concurrent uploads update the bucket
+RATE_LIMIT_MAX_TRIES = 5
+
 
 class BusinessTripAttachmentController(http.Controller):
     """
     Secure and robust controller for handling asynchronous file uploads.
     """
     
-    # Security settings
-    MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+    # Security settings (the size cap and upload rate are set from the Business Trip settings)
     ALLOWED_EXTENSIONS = {'.pdf', '.jpg', '.jpeg', '.png', '.doc', '.docx', '.xls', '.xlsx'}
     ALLOWED_MIME_TYPES = {
         'application/pdf', 'image/jpeg', 'image/png', 
         'application/msword', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
         'application/vnd.ms-excel', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
     }
-    MAX_UPLOADS_PER_HOUR = 50
+    # libmagic only looks at the start of the file
+    MIME_SNIFF_SIZE = 8192
 
     # --- Main Routes ---
 
     @http.route('/business_trip/upload_attachment', type='http', auth='user', methods=['POST'], csrf=True)
     def upload_attachment(self, **kwargs):
-        """ Handles the secure upload of a file. """
+        """ Handles the secure upload of a file sent in a single request. """
         try:
             # 1. Rate Limiting
             if not self._is_rate_limit_ok(request):
@@ -45,66 +50,178 @@ class BusinessTripAttachmentController(http.Controller):
                 return self._error_response("No file or filename provided.", 400)
 
             filename = uploaded_file.filename
-            file_ext = '.' + filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
-            if file_ext not in self.ALLOWED_EXTENSIONS:
-                _logger.warning(f"User {request.env.user.login} uploaded file with disallowed extension: {file_ext}")
+            if not self._is_extension_allowed(filename):
                 return self._error_response("Invalid file type.", 400)
 
-            # 3. File Content and Size Validation
-            file_content = uploaded_file.read()
-            file_size = len(file_content)
+            # 3. MIME sniffing on the first bytes, before the rest of the file is read
+            head = uploaded_file.stream.read(self.MIME_SNIFF_SIZE)
+            if not head:
+                return self._error_response("File is empty.", 400)
+            detected_mime = self._check_mime_type(head, filename)
+            if not detected_mime:
+                return self._error_response("Invalid file content.", 400)
 
-            if file_size > self.MAX_FILE_SIZE:
+            # 4. Spool the file to disk by blocks, hashing it and enforcing the size cap while reading
+            upload = request.env['business.trip.upload'].sudo().create({
+                'name': tools.ustr(filename),
+                'user_id': request.env.user.id,
+                'mimetype': detected_mime,
+            })
+            try:
+                upload.spool_stream(uploaded_file.stream, head=head)
+            except UserError:
+                upload.unlink()
                 return self._error_response("File is too large.", 413)
-            if file_size == 0:
-                return self._error_response("File is empty.", 400)
+            return self._finalize_upload(upload)
 
-            # 4. Secure MIME and Duplicate Detection
-            detected_mime = self._detect_mime_type(file_content, filename)
-            if detected_mime not in self.ALLOWED_MIME_TYPES:
-                _logger.warning(f"User {request.env.user.login} uploaded disallowed MIME: {detected_mime} for file {filename}")
-                return self._error_response("Invalid file content.", 400)
+        except UserError as e:
+            return self._error_response(f"Upload failed: {e}", 400)
+        except Exception as e:
+            _logger.error(f"Unexpected error during upload: {str(e)}", exc_info=True)
+            return self._error_response("Server error during upload.", 500)
+
+    # --- Chunked Upload Routes ---
+    # 1. POST /business_trip/upload/init with filename, size and optionally the sha256 of the file:
+    #    returns an upload_id and the chunk size. A known sha256 is rejected as a duplicate right away.
+    #    With a sha256, a 'proof' challenge (algorithm, nonce) is always returned: sending the hex
+    #    HMAC-SHA256 of the file keyed with the nonce with PUT /business_trip/upload/<upload_id>/proof
+    #    completes the upload at once when the user can already read the same content. Otherwise the
+    #    proof is refused (once per session) and the file is sent in chunks.
+    # 2. PUT /business_trip/upload/<upload_id>?offset=<n> with the raw chunk as body, in order.
+    #    An optional X-Chunk-Sha256 header is checked against the received chunk.
+    #    The file type is checked on the first chunk.
+    # 3. POST /business_trip/upload/<upload_id>/finalize: validates the file and creates the attachment.
+    # An interrupted upload is resumed from the 'received' size returned by GET /business_trip/upload/<upload_id>.
+
+    @http.route('/business_trip/upload/init', type='http', auth='user', methods=['POST'], csrf=True)
+    def upload_init(self, filename=None, size=None, sha256=None, **kwargs):
+        """ Opens a chunked upload session. """
+        try:
+            if not self._is_rate_limit_ok(request):
+                return self._error_response("Too many uploads. Try again later.", 429)
+            if not filename:
+                return self._error_response("No filename provided.", 400)
+            if not self._is_extension_allowed(filename):
+                return self._error_response("Invalid file type.", 400)
+            try:
+                file_size = int(size)
+            except (TypeError, ValueError):
+                return self._error_response("Invalid file size.", 400)
 
-            file_hash = hashlib.sha256(file_content).hexdigest()
-            if self._is_duplicate(request, file_hash):
+            Upload = request.env['business.trip.upload'].sudo()
+            if file_size > Upload._get_max_upload_size():
+                return self._error_response("File is too large.", 413)
+            if file_size <= 0:
+                return self._error_response("File is empty.", 400)
+            if sha256 and self._is_duplicate(request, sha256.lower()):
                 return self._error_response("Duplicate file detected.", 409)
 
-            # 5. Create Attachment
-            attachment_vals = {
+            upload = Upload.create({
                 'name': tools.ustr(filename),
-                'datas': base64.b64encode(file_content),
-                'res_model': 'business.trip.data',
-                'res_id': 0,
-                'mimetype': detected_mime,
-                'checksum': file_hash,
-                'public': False,
-            }
+                'user_id': request.env.user.id,
+                'total_size': file_size,
+                'sha256': sha256 and sha256.lower(),
+            })
+            result = self._upload_status(upload)
+            if sha256:
+                # Content-addressed dedup among the content the user can read: known content is not
+                # uploaded again. The challenge is returned in any case, so it gives nothing away.
+                source = request.env['ir.attachment']._business_trip_find_content(sha256.lower(), file_size)
+                result['proof'] = upload._request_content_proof(source)
+            return self._success_response({'result': result})
 
-            attachment = request.env['ir.attachment'].create(attachment_vals)
-            _logger.info(f"User {request.env.user.login} uploaded attachment ID {attachment.id}: {filename}")
+        except Exception as e:
+            _logger.error(f"Unexpected error opening upload session: {str(e)}", exc_info=True)
+            return self._error_response("Server error during upload.", 500)
 
-            # 6. Log upload and prepare success response
-            self._log_upload_for_rate_limit(request)
-            
-            base_url = request.httprequest.host_url.rstrip('/')
-            response_data = {
-                'id': attachment.id,
-                'name': filename,
-                'size': file_size,
-                'type': detected_mime,
-                'url': f'{base_url}/web/content/{attachment.id}?access_token={attachment.access_token}',
-                'storage': 'url',
-                'attachment_id': attachment.id,
-            }
-            
-            return self._success_response({'result': response_data})
+    @http.route('/business_trip/upload/<string:upload_id>', type='http', auth='user', methods=['GET'], csrf=False)
+    def upload_status(self, upload_id, **kwargs):
+        """ Returns the progress of a chunked upload, to resume it. """
+        upload = self._get_user_upload(upload_id)
+        if not upload:
+            return self._error_response("Upload not found", 404)
+        return self._success_response({'result': self._upload_status(upload)})
+
+    @http.route('/business_trip/upload/<string:upload_id>', type='http', auth='user', methods=['PUT'], csrf=True)
+    def upload_chunk(self, upload_id, offset=None, **kwargs):
+        """ Receives one chunk of a chunked upload. """
+        try:
+            upload = self._get_user_upload(upload_id)
+            if not upload:
+                return self._error_response("Upload not found", 404)
+            try:
+                chunk_offset = int(offset)
+            except (TypeError, ValueError):
+                return self._error_response("Invalid chunk offset.", 400)
+            if chunk_offset > upload.received_size:
+                # The client lost track of the progress: tell it where to resume
+                response = self._error_response("Unexpected chunk offset.", 409)
+                response.headers['X-Upload-Received'] = str(upload.received_size)
+                return response
+
+            httprequest = request.httprequest
+            upload.write_chunk(chunk_offset, httprequest.stream, httprequest.content_length or 0,
+                               chunk_sha256=httprequest.headers.get('X-Chunk-Sha256'))
+            if chunk_offset == 0:
+                # Reject a disallowed file type before the remaining chunks are sent
+                detected_mime = self._check_mime_type(upload.read_prefix(self.MIME_SNIFF_SIZE), upload.name)
+                if not detected_mime:
+                    upload.unlink()
+                    return self._error_response("Invalid file content.", 400)
+                upload.mimetype = detected_mime
+            return self._success_response({'result': self._upload_status(upload)})
 
         except UserError as e:
             return self._error_response(f"Upload failed: {e}", 400)
         except Exception as e:
-            _logger.error(f"Unexpected error during upload: {str(e)}", exc_info=True)
+            _logger.error(f"Unexpected error receiving chunk of upload {upload_id}: {str(e)}", exc_info=True)
             return self._error_response("Server error during upload.", 500)
 
+    @http.route('/business_trip/upload/<string:upload_id>/proof', type='http', auth='user', methods=['PUT'], csrf=True)
+    def upload_proof(self, upload_id, **kwargs):
+        """ Completes an upload of known content with the keyed hash of the file. """
+        try:
+            upload = self._get_user_upload(upload_id)
+            if not upload:
+                return self._error_response("Upload not found", 404)
+            httprequest = request.httprequest
+            if not upload.check_content_proof(httprequest.stream, httprequest.content_length or 0):
+                # The client can still send the file in chunks
+                return self._error_response("Invalid content proof.", 400)
+            return self._finalize_upload(upload)
+
+        except UserError as e:
+            return self._error_response(f"Upload failed: {e}", 400)
+        except Exception as e:
+            _logger.error(f"Unexpected error checking content proof of upload {upload_id}: {str(e)}", exc_info=True)
+            return self._error_response("Server error during upload.", 500)
+
+    @http.route('/business_trip/upload/<string:upload_id>/finalize', type='http', auth='user', methods=['POST'], csrf=True)
+    def upload_finalize(self, upload_id, **kwargs):
+        """ Validates a complete chunked upload and creates its attachment. """
+        try:
+            upload = self._get_user_upload(upload_id)
+            if not upload:
+                return self._error_response("Upload not found", 404)
+            if upload.received_size != upload.total_size:
+                return self._error_response("Upload incomplete.", 409)
+            return self._finalize_upload(upload)
+
+        except UserError as e:
+            return self._error_response(f"Upload failed: {e}", 400)
+        except Exception as e:
+            _logger.error(f"Unexpected error finalizing upload {upload_id}: {str(e)}", exc_info=True)
+            return self._error_response("Server error during upload.", 500)
+
+    @http.route('/business_trip/upload/<string:upload_id>', type='http', auth='user', methods=['DELETE'], csrf=True)
+    def upload_abort(self, upload_id, **kwargs):
+        """ Cancels a chunked upload and drops what was received. """
+        upload = self._get_user_upload(upload_id)
+        if not upload:
+            return self._error_response("Upload not found", 404)
+        upload.unlink()
+        return self._success_response({"message": "Upload cancelled"})
+
     @http.route('/business_trip/delete_attachment/<int:attachment_id>', type='http', auth='user', methods=['DELETE'], csrf=True)
     def delete_attachment(self, attachment_id, **kwargs):
         """ Handles the secure deletion of a file. """
@@ -128,13 +245,84 @@ class BusinessTripAttachmentController(http.Controller):
             _logger.error(f"Error deleting attachment {attachment_id}: {str(e)}", exc_info=True)
             return self._error_response("Delete failed", 500)
 
-    @http.route(['/business_trip/upload_attachment', '/business_trip/delete_attachment/<int:attachment_id>'], type='http', auth='user', methods=['OPTIONS'], csrf=False)
+    @http.route(['/business_trip/upload_attachment', '/business_trip/delete_attachment/<int:attachment_id>',
+                 '/business_trip/upload/init', '/business_trip/upload/<string:upload_id>',
+                 '/business_trip/upload/<string:upload_id>/finalize', '/business_trip/upload/<string:upload_id>/proof'], type='http', auth='user', methods=['OPTIONS'], csrf=False)
     def options_handler(self, **kwargs):
         """ Handles CORS preflight requests. """
         return self._success_response({})
 
     # --- Helper Methods ---
 
+    def _is_extension_allowed(self, filename):
+        file_ext = '.' + filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+        if file_ext not in self.ALLOWED_EXTENSIONS:
+            _logger.warning(f"User {request.env.user.login} uploaded file with disallowed extension: {file_ext}")
+            return False
+        return True
+
+    def _get_user_upload(self, upload_id):
+        """Returns the upload session upload_id of the current user (possibly empty)."""
+        return request.env['business.trip.upload'].sudo().search([
+            ('token', '=', upload_id),
+            ('user_id', '=', request.env.user.id),
+        ], limit=1)
+
+    def _upload_status(self, upload):
+        return {
+            'upload_id': upload.token,
+            'size': upload.total_size,
+            'received': upload.received_size,
+            'chunk_size': UPLOAD_CHUNK_SIZE,
+        }
+
+    def _finalize_upload(self, upload):
+        """
+        Validates the content of a complete upload session and turns it into an
+        unlinked business.trip.data attachment. Returns the HTTP response.
+        """
+        filename = upload.name
+        file_size = upload.total_size
+        if file_size == 0:
+            upload.unlink()
+            return self._error_response("File is empty.", 400)
+
+        # Secure MIME and Duplicate Detection, before the file is moved into the filestore.
+        # Both were usually done while the file was received: the MIME type on its
+        # first bytes, the digests while it was spooled.
+        detected_mime = upload.mimetype or self._check_mime_type(upload.read_prefix(self.MIME_SNIFF_SIZE), filename)
+        if detected_mime not in self.ALLOWED_MIME_TYPES:
+            upload.unlink()
+            return self._error_response("Invalid file content.", 400)
+
+        file_hash = upload.sha256 if upload.checksum else upload.compute_digests()
+        if self._is_duplicate(request, file_hash):
+            upload.unlink()
+            return self._error_response("Duplicate file detected.", 409)
+
+        # Create the attachment from the spooled file, without loading or encoding it,
+        # or sharing the stored file of a known content
+        attachment = upload.create_attachment({
+            'name': filename,
+            'res_model': 'business.trip.data',
+            'res_id': 0,
+            'mimetype': detected_mime,
+            'public': False,
+        })
+        _logger.info(f"User {request.env.user.login} uploaded attachment ID {attachment.id}: {filename}")
+
+        base_url = request.httprequest.host_url.rstrip('/')
+        response_data = {
+            'id': attachment.id,
+            'name': filename,
+            'size': file_size,
+            'type': detected_mime,
+            'url': f'{base_url}/web/content/{attachment.id}?access_token={attachment.access_token}',
+            'storage': 'url',
+            'attachment_id': attachment.id,
+        }
+        return self._success_response({'result': response_data})
+
     def _detect_mime_type(self, content, filename):
         """Detect MIME type using magic and fallback to mimetypes."""
         try:
@@ -143,10 +331,18 @@ class BusinessTripAttachmentController(http.Controller):
             _logger.warning(f"MIME detection via magic failed for {filename}. Falling back to extension.")
             return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
 
+    def _check_mime_type(self, head, filename):
+        """Returns the MIME type detected on the first bytes of a file, or None if it is not allowed."""
+        detected_mime = self._detect_mime_type(head, filename)
+        if detected_mime not in self.ALLOWED_MIME_TYPES:
+            _logger.warning(f"User {request.env.user.login} uploaded disallowed MIME: {detected_mime} for file {filename}")
+            return None
+        return detected_mime
+
     def _is_duplicate(self, req, file_hash):
-        """Check if the same file has been uploaded by the user recently."""
+        """Check if the same file (by SHA-256) has been uploaded by the user recently."""
         domain = [
-            ('checksum', '=', file_hash),
+            ('business_trip_sha256', '=', file_hash),
             ('create_uid', '=', req.env.user.id),
             ('res_model', '=', 'business.trip.data'),
             ('res_id', '=', 0),
@@ -155,37 +351,51 @@ class BusinessTripAttachmentController(http.Controller):
         return req.env['ir.attachment'].search_count(domain) > 0
 
     def _is_rate_limit_ok(self, req):
-        """Check if user has exceeded upload rate limit. Read-only."""
+        """
+        Takes an upload from the user's rate limit bucket, if it is not empty.
+        The token is taken in its own short transaction, committed at once, so the
+        bucket row is not kept locked while the upload itself is processed.
+        """
         try:
-            history = req.session.get('upload_history', [])
-            now = datetime.now(timezone.utc)
-            # Filter history to the last hour
-            recent_uploads = [ts for ts in history if now - datetime.fromisoformat(ts) < timedelta(hours=1)]
-            req.session['upload_history'] = recent_uploads # Clean up session
-            
-            if len(recent_uploads) >= self.MAX_UPLOADS_PER_HOUR:
-                _logger.warning(f"Rate limit hit for user {req.env.user.login}")
-                return False
-            return True
-        except Exception:
+            limit = req.env.user.sudo()._get_business_trip_upload_limit()
+            tokens_left = self._take_rate_limit_token(req, self._rate_limit_key(req), limit)
+        except psycopg2.errors.SerializationFailure:
+            raise
+        except Exception as e:
+            _logger.warning(f"Could not check upload rate limit: {e}")
             return True # Fail open
+        if tokens_left is None:
+            _logger.warning(f"Rate limit hit for user {req.env.user.login}")
+            return False
+        return True
 
-    def _log_upload_for_rate_limit(self, req):
-        """Log a new upload time for rate limiting."""
-        try:
-            history = req.session.get('upload_history', [])
-            history.append(datetime.now(timezone.utc).isoformat())
-            req.session['upload_history'] = history
-        except Exception as e:
-            _logger.warning(f"Could not log upload for rate limit: {e}")
+    def _take_rate_limit_token(self, req, key, limit):
+        """
+        Takes a token from the bucket key in a separate transaction. Another upload
+        of the user updating the bucket at the same time makes it fail to serialize:
+        it is retried, and the error is raised once the attempts are exhausted.
+        """
+        for attempt in range(1, RATE_LIMIT_MAX_TRIES + 1):
+            try:
+                with req.env.registry.cursor() as cr:
+                    env = api.Environment(cr, SUPERUSER_ID, {})
+                    return env['business.trip.rate.limit']._take(key, limit)
+            except psycopg2.errors.SerializationFailure:
+                if attempt == RATE_LIMIT_MAX_TRIES:
+                    raise
+                time.sleep(random.uniform(0.0, 0.1 * attempt))
+
+    def _rate_limit_key(self, req):
+        return f'upload:{req.env.user.id}'
 
     # --- Response Methods with CORS ---
 
     def _set_cors_headers(self, response):
         """Utility to set common CORS headers."""
         response.headers['Access-Control-Allow-Origin'] = '*'
-        response.headers['Access-Control-Allow-Methods'] = 'POST, DELETE, OPTIONS'
-        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, X-Requested-With'
+        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
+        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, X-Requested-With, X-Chunk-Sha256'
+        response.headers['Access-Control-Expose-Headers'] = 'X-Upload-Received'
         response.headers['Access-Control-Allow-Credentials'] = 'true'
         response.headers['Access-Control-Max-Age'] = '86400'
 
@@ -142,11 +142,8 @@ class BusinessTripRedirect(FormioController):
         if not sale_order.exists():
             return request.not_found()
 
-        # Fetch the CURRENT builder configured for the sale.order model
-        builder = request.env['formio.builder'].sudo().search([
-            ('state', '=', 'CURRENT'),
-            ('res_model_id.model', '=', 'sale.order')
-        ], limit=1)
+        # Fetch the builder configured for business trips (cached)
+        builder = request.env['formio.builder'].sudo()._get_business_trip_builder()
 
         if not builder:
             return request.not_found('custom_business_trip_management.template_no_builder')
@@ -311,10 +308,7 @@ class BusinessTripRedirect(FormioController):
         This is necessary because the regular formio submit handler that calls after_submit() 
         is not triggered during form creation via this route.
         """
-        builder = request.env['formio.builder'].sudo().search([
-            ('state', '=', 'CURRENT'),
-            ('res_model_id.model', '=', 'sale.order') 
-        ], limit=1)
+        builder = request.env['formio.builder'].sudo()._get_business_trip_builder()
 
         if not builder:
             return request.not_found('custom_business_trip_management.template_no_builder')
@@ -1,8 +1,8 @@
-import requests
 import json
 import logging
 from odoo import http
 from odoo.http import request
+from .geonames import geonames_autocomplete
 
 _logger = logging.getLogger(__name__)
 
@@ -39,68 +39,20 @@ except ImportError:
 
 class GeonamesDataFetcher:
     """
-    Helper class to encapsulate Geonames API interaction.
+    Helper class giving the formio overrides access to the shared destination autocomplete.
     """
-    def _fetch_geonames_data_results(self, search_query, username='azerila'):
+    def _fetch_geonames_data_results(self, search_query):
         """
-        Fetches data from Geonames API based on the search query.
+        Fetches cities matching the search query, from the local gazetteer or
+        (cached) from Geonames.
 
         :param search_query: The term to search for.
-        :param username: Your Geonames username.
         :return: A list of dictionaries, where each dictionary has 'value' and 'label'.
         """
         if not search_query:
             _logger.info("GEONAMES_FETCHER: No search query provided.")
             return []
-
-        api_url = "http://api.geonames.org/searchJSON"
-        geonames_params = {
-            'name_startsWith': search_query,
-            'maxRows': 15,
-            'featureClass': 'P',  # Populated places (cities, villages)
-            'style': 'MEDIUM',
-            'username': username,
-        }
-        
-        results = []
-        try:
-            _logger.info(f"GEONAMES_FETCHER: Requesting Geonames. Params: {json.dumps(geonames_params)}")
-            api_response = requests.get(api_url, params=geonames_params, timeout=10)
-            api_response.raise_for_status()  # Raise an HTTPError for bad responses (4xx or 5xx)
-            response_data = api_response.json()
-
-            # Check if Geonames returned an error status within the JSON itself
-            if 'status' in response_data and response_data.get('geonames') is None:
-                error_message = response_data['status'].get('message', 'Unknown Geonames API error')
-                _logger.error(f"GEONAMES_FETCHER: Geonames API returned an error. Message: {error_message}")
-            else:
-                geonames_entries = response_data.get('geonames', [])
-                for item in geonames_entries:
-                    name = item.get('name')
-                    country_name = item.get('countryName')
-                    geoname_id = item.get('geonameId')
-                    
-                    if name and geoname_id:
-                        label_parts = [name]
-                        if country_name:
-                            label_parts.append(country_name)
-                        display_label = ", ".join(filter(None, label_parts))
-                        results.append({
-                            'value': str(geoname_id), 
-                            'label': display_label
-                        })
-                _logger.info(f"GEONAMES_FETCHER: Processed {len(results)} results for search term '{search_query}'.")
-        
-        except requests.exceptions.Timeout:
-            _logger.error(f"GEONAMES_FETCHER: Timeout error fetching data from Geonames for term '{search_query}'.")
-        except requests.exceptions.RequestException as e:
-            _logger.error(f"GEONAMES_FETCHER: Network or HTTP error for term '{search_query}': {str(e)}")
-        except json.JSONDecodeError as e:
-            _logger.error(f"GEONAMES_FETCHER: Error decoding JSON response from Geonames for term '{search_query}': {str(e)}")
-        except Exception as e:
-            _logger.error(f"GEONAMES_FETCHER: An unexpected error occurred for term '{search_query}': {type(e).__name__} - {str(e)}")
-        
-        return results
+        return geonames_autocomplete.autocomplete(request.env, search_query)
 
 class CustomFormioControllerOverride(OriginalFormioController, GeonamesDataFetcher):
     """
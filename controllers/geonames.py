@@ -0,0 +1,241 @@
+import requests
+import logging
+import threading
+import time
+from requests.adapters import HTTPAdapter
+from odoo.tools.lru import LRU
+from ..models.business_trip_city import _normalize_city_name
+
+_logger = logging.getLogger(__name__)
+
+GEONAMES_API_URL = "http://api.geonames.org/searchJSON"
+GEONAMES_USERNAME = 'azerila'
+GEONAMES_MAX_ROWS = 15
+# (connect, read) timeouts: a slow upstream must not pin an HTTP worker
+GEONAMES_TIMEOUT = (2, 3)
+# Keep-alive connections kept per host
+GEONAMES_POOL_SIZE = 10
+# Consecutive failures opening the circuit, and seconds before a trial call
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_TIMEOUT = 30
+
+# Autocomplete results kept per worker process, keyed on the normalized prefix
+AUTOCOMPLETE_CACHE_SIZE = 1024
+AUTOCOMPLETE_CACHE_TTL = 6 * 3600
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing upstream. After failure_threshold consecutive
+    failures the circuit opens and calls are refused for reset_timeout seconds;
+    then one trial call is let through (half-open) and closes the circuit if it
+    succeeds, or re-opens it.
+    """
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if not self._trial_running and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    _logger.warning(f"GEONAMES_FETCHER: Circuit opened after {self.failures} consecutive failures.")
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+
+class GeonamesAutocomplete:
+    """
+    Destination autocomplete shared by the JSON route and the formio overrides.
+
+    The local gazetteer answers when one was imported. Otherwise Geonames is
+    queried, with the results cached in a bounded LRU with a TTL, keyed on the
+    normalized prefix. A result set smaller than GEONAMES_MAX_ROWS holds every
+    match of its prefix, so a longer prefix ("mila" after "mil") is answered by
+    filtering it instead of calling Geonames again. Concurrent lookups of the
+    same prefix in a process wait for the first one instead of each calling out.
+
+    Calls go through a keep-alive connection pool with short timeouts, behind a
+    circuit breaker: while Geonames is failing, lookups fail fast to the cached
+    results, even expired, instead of waiting for the upstream.
+    """
+
+    def __init__(self, cache_size=AUTOCOMPLETE_CACHE_SIZE, cache_ttl=AUTOCOMPLETE_CACHE_TTL):
+        # prefix -> (expires_at, complete, [(normalized name, result dict)])
+        self._cache = LRU(cache_size)
+        self._cache_ttl = cache_ttl
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self.stats = {'hits': 0, 'prefix_hits': 0, 'misses': 0, 'coalesced': 0, 'errors': 0, 'short_circuited': 0}
+        self._circuit = CircuitBreaker()
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=GEONAMES_POOL_SIZE, max_retries=0)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self._adapter = adapter
+
+    def autocomplete(self, env, search_term):
+        """Returns [{'value': <geonames id>, 'label': 'Name, Country'}] for search_term."""
+        City = env['business.trip.city'].sudo()
+        if City._has_gazetteer():
+            return City._autocomplete(search_term)
+
+        prefix = _normalize_city_name(search_term)
+        if not prefix:
+            return []
+        entries = self._get_cached(prefix)
+        if entries is None:
+            entries = self._fetch_once(prefix, search_term.strip())
+        return [result for name, result in entries[:GEONAMES_MAX_ROWS]]
+
+    def _get_cached(self, prefix, allow_stale=False):
+        """
+        Returns the cached entries of prefix, or of a complete shorter prefix
+        filtered, or None. Expired entries are only used with allow_stale.
+        """
+        now = 0 if allow_stale else time.monotonic()
+        cached = self._cache.get(prefix)
+        if cached and cached[0] > now:
+            self.stats['hits'] += 1
+            return cached[2]
+        for length in range(len(prefix) - 1, 0, -1):
+            cached = self._cache.get(prefix[:length])
+            if cached and cached[0] > now and cached[1]:
+                entries = [entry for entry in cached[2] if entry[0].startswith(prefix)]
+                # A subset of a complete set is complete too
+                self._cache[prefix] = (cached[0], True, entries)
+                self.stats['prefix_hits'] += 1
+                return entries
+        return None
+
+    def _fetch_once(self, prefix, search_term):
+        with self._inflight_lock:
+            event = self._inflight.get(prefix)
+            leader = event is None
+            if leader:
+                event = self._inflight[prefix] = threading.Event()
+        if not leader:
+            self.stats['coalesced'] += 1
+            event.wait(sum(GEONAMES_TIMEOUT))
+            entries = self._get_cached(prefix)
+            return entries if entries is not None else []
+
+        try:
+            if not self._circuit.allow_request():
+                # Upstream degraded: fail fast to whatever is cached
+                self.stats['short_circuited'] += 1
+                entries = self._get_cached(prefix, allow_stale=True)
+                return entries if entries is not None else []
+            self.stats['misses'] += 1
+            try:
+                fetched = self._fetch(search_term)
+            except Exception:
+                # An unexpected response must still count as a failure, or a
+                # half-open trial would never end and the circuit stay open
+                _logger.exception(f"GEONAMES_FETCHER: Unexpected error fetching data from Geonames for term '{search_term}'.")
+                fetched = None
+            if fetched is None:
+                # Errors are not cached, the next keystroke tries again
+                self.stats['errors'] += 1
+                self._circuit.record_failure()
+                entries = self._get_cached(prefix, allow_stale=True)
+                return entries if entries is not None else []
+            entries, complete = fetched
+            self._circuit.record_success()
+            self._cache[prefix] = (time.monotonic() + self._cache_ttl, complete, entries)
+            return entries
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(prefix, None)
+            event.set()
+
+    def _fetch(self, search_term):
+        """
+        Queries Geonames. Returns ([(normalized name, result dict)], complete), or
+        None on error. complete tells whether Geonames returned fewer rows than
+        requested, i.e. every match of the term, counting the rows skipped here.
+        """
+        geonames_params = {
+            'name_startsWith': search_term,
+            'maxRows': GEONAMES_MAX_ROWS,
+            'featureClass': 'P',  # Populated places (cities, villages)
+            'style': 'MEDIUM',
+            'username': GEONAMES_USERNAME,
+        }
+        try:
+            _logger.info(f"GEONAMES_FETCHER: Requesting Geonames for term '{search_term}'.")
+            api_response = self._session.get(GEONAMES_API_URL, params=geonames_params, timeout=GEONAMES_TIMEOUT)
+            api_response.raise_for_status()  # Raise an HTTPError for bad responses (4xx or 5xx)
+            response_data = api_response.json()
+        except requests.exceptions.Timeout:
+            _logger.error(f"GEONAMES_FETCHER: Timeout error fetching data from Geonames for term '{search_term}'.")
+            return None
+        except requests.exceptions.RequestException as e:
+            _logger.error(f"GEONAMES_FETCHER: Network or HTTP error for term '{search_term}': {str(e)}")
+            return None
+        except ValueError as e:
+            _logger.error(f"GEONAMES_FETCHER: Error decoding JSON response from Geonames for term '{search_term}': {str(e)}")
+            return None
+
+        # Check if Geonames returned an error status within the JSON itself
+        if 'status' in response_data and response_data.get('geonames') is None:
+            status = response_data['status']
+            error_message = (status.get('message') if isinstance(status, dict) else status) or 'Unknown Geonames API error'
+            _logger.error(f"GEONAMES_FETCHER: Geonames API returned an error. Message: {error_message}")
+            return None
+
+        rows = response_data.get('geonames') or []
+        entries = []
+        for item in rows:
+            if not isinstance(item, dict):
+                continue
+            name = item.get('name')
+            geoname_id = item.get('geonameId')
+            if name and geoname_id:
+                display_label = ", ".join(filter(None, [name, item.get('countryName')]))
+                entries.append((_normalize_city_name(name), {'value': str(geoname_id), 'label': display_label}))
+        _logger.info(f"GEONAMES_FETCHER: Processed {len(entries)} results for search term '{search_term}'.")
+        return entries, len(rows) < GEONAMES_MAX_ROWS
+
+    def get_metrics(self):
+        """Cache, circuit and connection reuse counters of this worker process."""
+        pool_container = self._adapter.poolmanager.pools
+        pools = [pool_container[key] for key in pool_container.keys()]
+        connections = sum(pool.num_connections for pool in pools)
+        requests_sent = sum(pool.num_requests for pool in pools)
+        return dict(
+            self.stats,
+            cache_size=len(self._cache),
+            circuit_state=self._circuit.state,
+            consecutive_failures=self._circuit.failures,
+            http_requests=requests_sent,
+            http_connections_opened=connections,
+            http_connections_reused=max(requests_sent - connections, 0),
+        )
+
+
+geonames_autocomplete = GeonamesAutocomplete()
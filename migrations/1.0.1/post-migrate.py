@@ -0,0 +1,7 @@
+from odoo import api, SUPERUSER_ID
+
+
+def migrate(cr, version):
+    """Creates the plan lines of the trips planned before business.trip.plan.line existed."""
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    env['business.trip']._migrate_plan_lines()
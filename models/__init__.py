@@ -3,15 +3,25 @@
 from . import models
 from . import accompanying_person
 from . import business_trip_airport
+from . import business_trip_city
 from . import business_trip_data
 from . import business_trip
+from . import business_trip_plan_line
+from . import formio_builder
+from . import hr_employee
+from . import ir_attachment
 from . import formio_form_inherit
 from . import mail_message
 from . import mail_template_mixin
 from . import planned_trip_details
+from . import project_project
 from . import res_company
 from . import res_config_settings
+from . import res_groups
 from . import res_users
 from . import sale_order
 from . import zz_trip_wizard
 from . import business_trip_cleanup
+from . import business_trip_reprocess
+from . import business_trip_upload
+from . import business_trip_rate_limit
@@ -3,14 +3,34 @@ from odoo import models, fields, api, _
 import logging
 from odoo.exceptions import UserError, ValidationError
 import json
+import hashlib
 from dateutil.relativedelta import relativedelta
+import psycopg2
 
 _logger = logging.getLogger(__name__)
 
+# Strategy grouping the projects of the business trip tasks (see _get_business_trip_projects)
+PROJECT_POOLING_PARAM = 'custom_business_trip_management.project_pooling'
+DEFAULT_PROJECT_POOLING = 'sale_order'
+BUSINESS_TRIP_PROJECT_POOLING = [
+    ('sale_order', 'One per Sales Order'),
+    ('employee', 'One per Employee'),
+    ('month', 'One per Month'),
+]
+
+# Next workflow step applied by action_batch_workflow_step to the trips of each status:
+# trip_status -> (validation method, transition method).
+# Only the steps of organizers and finance: submitting, starting and ending a trip
+# are left to its employee.
+BATCH_WORKFLOW_STEPS = {
+    'pending_organization': ('_check_organizer_confirm_planning', '_organizer_confirm_planning'),
+    'expense_submitted': ('_check_approve_expenses', '_approve_expenses'),
+}
+
 class BusinessTrip(models.Model):
     _name = 'business.trip'
     _description = 'Business Trip Request'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'mail.template.mixin']
 
     # Link to the original Form.io submission
     formio_form_id = fields.Many2one('formio.form', string='Form.io Form', ondelete='cascade', required=True, index=True)
@@ -72,6 +92,12 @@ class BusinessTrip(models.Model):
     organizer_planned_cost = fields.Monetary(string='Total Planned Cost by Organizer', tracking=False, currency_field='currency_id')
     organizer_trip_plan_details = fields.Text(string='Organizer Trip Plan Notes', tracking=True)
     structured_plan_items_json = fields.Text(string='Structured Plan Items (JSON)', tracking=False, copy=False)
+    # Version of the plan the stored fragments below were rendered from
+    structured_plan_hash = fields.Char(string='Structured Plan Hash', compute='_compute_structured_plan_hash', store=True, copy=False)
+    # Rendered plan HTML shown on formio.form, with and without costs (see formio.form._get_organizer_plan_fragments)
+    structured_plan_fragments_json = fields.Text(string='Rendered Plan Fragments (JSON)', compute='_compute_structured_plan_fragments', store=True, copy=False)
+    # Queryable copy of structured_plan_items_json, rebuilt whenever it is written
+    plan_line_ids = fields.One2many('business.trip.plan.line', 'trip_id', string='Plan Lines', copy=False)
     organizer_attachments_ids = fields.Many2many('ir.attachment', 'business_trip_organizer_ir_attachments_rel', 'trip_id', 'attachment_id', string='Organizer Attachments', copy=False)
     organizer_submission_date = fields.Datetime(string='Organizer Plan Submission Date', tracking=True, copy=False)
     plan_approval_date = fields.Datetime(string='Manager Plan Approval Date', tracking=True, copy=False)
@@ -123,12 +149,33 @@ class BusinessTrip(models.Model):
     can_cancel_trip = fields.Boolean(string="Can Cancel Trip", compute='_compute_can_cancel_trip', store=False)
     can_undo_expense_approval_action = fields.Boolean(string="Can Undo Expense Approval", compute='_compute_can_undo_expense_approval_action', store=False)
 
+    @api.depends('structured_plan_items_json')
+    def _compute_structured_plan_hash(self):
+        for record in self:
+            plan_json = record.structured_plan_items_json
+            record.structured_plan_hash = hashlib.sha1(plan_json.encode()).hexdigest() if plan_json else False
+
+    @api.depends('structured_plan_items_json')
+    def _compute_structured_plan_fragments(self):
+        FormioForm = self.env['formio.form']
+        for record in self:
+            plan_json = record.structured_plan_items_json
+            if not plan_json:
+                record.structured_plan_fragments_json = False
+                continue
+            record.structured_plan_fragments_json = json.dumps({
+                'hash': record.structured_plan_hash,
+                'with_cost': FormioForm._render_organizer_plan_fragments(plan_json, True),
+                'without_cost': FormioForm._render_organizer_plan_fragments(plan_json, False),
+            })
+
     @api.depends('manager_id', 'organizer_id')
     @api.depends_context('uid')
     def _compute_user_roles(self):
+        user = self.env.user
+        roles = user._get_business_trip_roles()
         for record in self:
-            user = self.env.user
-            is_system_admin = user.has_group('base.group_system')
+            is_system_admin = 'system' in roles
 
             if is_system_admin:
                 record.is_manager = True
@@ -139,10 +186,10 @@ class BusinessTrip(models.Model):
 
             record.is_manager = (record.manager_id and user.id == record.manager_id.id)
             record.is_organizer = (record.organizer_id and user.id == record.organizer_id.id)
-            is_finance_user = user.has_group('account.group_account_manager')
+            is_finance_user = 'finance' in roles
             record.is_finance = record.is_organizer or is_finance_user
             
-            is_in_organizer_group = user.has_group('custom_business_trip_management.group_business_trip_organizer')
+            is_in_organizer_group = 'organizer' in roles
             record.can_see_costs = record.is_manager or record.is_organizer or is_in_organizer_group
 
     @api.depends_context('uid')
@@ -170,11 +217,12 @@ class BusinessTrip(models.Model):
         # Get the setting from the environment's company once
         # Using a default value if not configured to avoid errors.
         undo_limit_days = getattr(self.env.company, 'undo_expense_approval_days_limit', 0)
+        # User must be a system admin or in a specific elevated group.
+        roles = self.env.user._get_business_trip_roles()
+        is_approver = 'system' in roles or 'finance' in roles
 
         for record in self:
             can_undo = False
-            # User must be a system admin or in a specific elevated group.
-            is_approver = self.env.user.has_group('base.group_system') or self.env.user.has_group('account.group_account_manager')
 
             if record.trip_status == 'completed' and is_approver:
                 if record.expense_approval_date:
@@ -201,66 +249,79 @@ class BusinessTrip(models.Model):
                 trip.budget_difference = 0
                 trip.budget_status = False
 
+    def _check_approve_expenses(self):
+        """Returns the (trip, message) pairs of the trips whose expenses cannot be approved."""
+        roles = self.env.user._get_business_trip_roles()
+        is_approver = 'system' in roles or 'finance' in roles
+        errors = []
+        for trip in self:
+            if trip.trip_status != 'expense_submitted':
+                errors.append((trip, "You can only approve expenses that have been submitted for review."))
+            elif not is_approver and self.env.user.id != trip.organizer_id.id:
+                errors.append((trip, "Only the trip organizer, finance personnel, or system administrators can approve expenses."))
+        return errors
+
     def action_approve_expenses(self):
         """
-        Approve trip expenses by manager, organizer, or finance personnel
+        Approve trip expenses by manager, organizer, or finance personnel.
+        Works on several trips at once, e.g. from the list view at month end.
         """
-        self.ensure_one()
-        if self.trip_status != 'expense_submitted':
-            raise ValidationError("You can only approve expenses that have been submitted for review.")
+        self._raise_workflow_errors(self._check_approve_expenses(), ValidationError)
+        return self._approve_expenses()
 
-        # TODO: Re-evaluate permissions after moving is_organizer
-        # if not (self.env.user.has_group('account.group_account_manager') or
-        #         self.env.user.has_group('base.group_system') or
-        #         self.is_organizer):
-        #     raise ValidationError("Only the trip organizer, finance personnel, or system administrators can approve expenses.")
+    def _approve_expenses(self):
+        now = fields.Datetime.now()
+        # Final total cost: planned cost plus expenses. Trips sharing it are written together.
+        trips_by_total_cost = {}
+        for trip in self:
+            total_cost = trip.organizer_planned_cost + trip.expense_total
+            trips_by_total_cost[total_cost] = trips_by_total_cost.get(total_cost, self.browse()) | trip
+        for total_cost, trips in trips_by_total_cost.items():
+            trips.write({
+                'trip_status': 'completed',
+                'expense_approval_date': now,
+                'expense_approved_by': self.env.user.id,
+                'final_total_cost': total_cost,
+            })
 
-        # Calculate final total cost
-        total_cost = self.organizer_planned_cost + self.expense_total
+        # Chatter notifications
+        for trip in self:
+            budget_message = ""
+            if trip.budget_difference > 0:
+                budget_message = f"<span style='color:green'>Actual expenses {abs(trip.budget_difference):.2f} {trip.currency_id.symbol} less than planned.</span>"
+            elif trip.budget_difference < 0:
+                budget_message = f"<span style='color:red'>Actual expenses {abs(trip.budget_difference):.2f} {trip.currency_id.symbol} more than planned.</span>"
+            else:
+                budget_message = "<span style='color:blue'>Expenses exactly match the plan.</span>"
 
-        self.write({
-            'trip_status': 'completed',
-            'expense_approval_date': fields.Datetime.now(),
-            'expense_approved_by': self.env.user.id,
-            'final_total_cost': total_cost,
-        })
+            # Notify manager and organizer with financial details
+            partners_to_notify = []
+            if trip.manager_id:
+                partners_to_notify.append(trip.manager_id.partner_id.id)
+            if trip.organizer_id:
+                partners_to_notify.append(trip.organizer_id.partner_id.id)
 
-        # Chatter notifications
-        budget_message = ""
-        if self.budget_difference > 0:
-            budget_message = f"<span style='color:green'>Actual expenses {abs(self.budget_difference):.2f} {self.currency_id.symbol} less than planned.</span>"
-        elif self.budget_difference < 0:
-            budget_message = f"<span style='color:red'>Actual expenses {abs(self.budget_difference):.2f} {self.currency_id.symbol} more than planned.</span>"
-        else:
-            budget_message = "<span style='color:blue'>Expenses exactly match the plan.</span>"
-
-        # Notify manager and organizer with financial details
-        partners_to_notify = []
-        if self.manager_id:
-            partners_to_notify.append(self.manager_id.partner_id.id)
-        if self.organizer_id:
-            partners_to_notify.append(self.organizer_id.partner_id.id)
-        
-        if partners_to_notify:
-            confidential_msg = f"""
+            if partners_to_notify:
+                confidential_msg = f"""
 <strong>Trip Cost Analysis (Confidential)</strong><br/>
 <ul>
-    <li>Maximum Budget Allocated: {self.manager_max_budget:.2f} {self.currency_id.symbol}</li>
-    <li>Planned Travel Costs: {self.organizer_planned_cost:.2f} {self.currency_id.symbol}</li>
-    <li>Employee Expenditures: {self.expense_total:.2f} {self.currency_id.symbol}</li>
+    <li>Maximum Budget Allocated: {trip.manager_max_budget:.2f} {trip.currency_id.symbol}</li>
+    <li>Planned Travel Costs: {trip.organizer_planned_cost:.2f} {trip.currency_id.symbol}</li>
+    <li>Employee Expenditures: {trip.expense_total:.2f} {trip.currency_id.symbol}</li>
     <li>Budget Status: {budget_message}</li>
 </ul>
 """
-            self.message_post(body=confidential_msg, partner_ids=partners_to_notify)
+                trip.message_post(body=confidential_msg, partner_ids=partners_to_notify)
 
-        # Notify the employee (without any financial details)
-        if self.user_id.partner_id:
-            public_msg = f"Your travel expense submission for trip '{self.name}' has been approved. The business trip is now COMPLETED."
-            self.message_post(body=public_msg, partner_ids=[self.user_id.partner_id.id])
+            # Notify the employee (without any financial details)
+            if trip.user_id.partner_id:
+                public_msg = f"Your travel expense submission for trip '{trip.name}' has been approved. The business trip is now COMPLETED."
+                trip.message_post(body=public_msg, partner_ids=[trip.user_id.partner_id.id])
 
-        self.message_post(
-            body=f"Travel expenses for business trip '{self.name}' have been approved by {self.env.user.name}.",
-            subtype_xmlid='mail.mt_note'
+        # Internal approval notes, logged in one batch
+        self._message_log_batch(
+            bodies={trip.id: f"Travel expenses for business trip '{trip.name}' have been approved by {self.env.user.name}." for trip in self},
+            subtype_id=self.env.ref('mail.mt_note').id,
         )
 
         return True
@@ -392,17 +453,15 @@ class BusinessTrip(models.Model):
         trips = super(BusinessTrip, self).create(vals_list)
 
         # Find the formio.builder once for all trips in the batch
-        builder = self.env['formio.builder'].search([('name', '=', 'Business Trip Form')], limit=1)
+        builder = self.env['formio.builder']._get_business_trip_builder()
         if not builder:
             # You might want to create it or raise an error if it's essential
             raise UserError(_("Form.io Builder 'Business Trip Form' not found. Please create it."))
 
+        # Create the associated formio.form records in one call
+        sale_order_model = self.env.ref('sale.model_sale_order') if any(trip.sale_order_id for trip in trips) else False
+        form_vals_list = []
         for trip in trips:
-            # Create the associated business_trip_data record
-            trip_data = self.env['business.trip.data'].create({'form_id': False}) # form_id will be linked later
-            trip.business_trip_data_id = trip_data.id
-
-            # Create the associated formio.form record
             form_vals = {
                 'builder_id': builder.id,
                 'title': trip.name,
@@ -412,18 +471,81 @@ class BusinessTrip(models.Model):
             if trip.sale_order_id:
                 form_vals.update({
                     'sale_order_id': trip.sale_order_id.id,
-                    'res_model_id': self.env.ref('sale.model_sale_order').id,
+                    'res_model_id': sale_order_model.id,
                     'res_id': trip.sale_order_id.id,
                 })
-            
-            form = self.env['formio.form'].create(form_vals)
-            
-            # Now, link the form back to the trip and the data record
-            trip.formio_form_id = form.id
-            trip_data.form_id = form.id
+            form_vals_list.append(form_vals)
+        forms = self.env['formio.form'].create(form_vals_list)
+
+        # Create the associated business_trip_data records in one call, already linked to their form
+        trip_data_records = self.env['business.trip.data'].create([{'form_id': form.id} for form in forms])
+
+        # Now, link the form and the data record back to each trip
+        for trip, trip_data, form in zip(trips, trip_data_records, forms):
+            trip.write({'formio_form_id': form.id, 'business_trip_data_id': trip_data.id})
 
+        trips.filtered('structured_plan_items_json')._sync_plan_lines()
         return trips
 
+    def write(self, vals):
+        res = super(BusinessTrip, self).write(vals)
+        if 'structured_plan_items_json' in vals:
+            self._sync_plan_lines()
+        return res
+
+    def _sync_plan_lines(self):
+        """
+        Rebuilds the plan lines of the trips from their structured_plan_items_json.
+        The lines of every trip are replaced with one unlink and one create.
+        Trips whose JSON cannot be parsed keep their lines and are logged.
+        Returns the number of such trips.
+        """
+        PlanLine = self.env['business.trip.plan.line'].sudo()
+        synced_trips = self.browse()
+        line_vals_list = []
+        for trip in self:
+            try:
+                items = json.loads(trip.structured_plan_items_json or '[]')
+                if not isinstance(items, list):
+                    raise ValueError("the structured plan is not a list")
+                trip_line_vals = [
+                    PlanLine._prepare_line_vals(trip, item, sequence)
+                    for sequence, item in enumerate(items)
+                    if isinstance(item, dict) and item.get('item_type')
+                ]
+            except (ValueError, TypeError) as e:
+                _logger.error(f"Could not sync the plan lines of business trip {trip.id}: {e}")
+                continue
+            synced_trips |= trip
+            line_vals_list += trip_line_vals
+
+        synced_trips.sudo().plan_line_ids.unlink()
+        if line_vals_list:
+            PlanLine.create(line_vals_list)
+        return len(self) - len(synced_trips)
+
+    @api.model
+    def _migrate_plan_lines(self, batch_size=500):
+        """
+        One-shot creation of the plan lines of the trips whose plan was saved
+        before the lines existed. Trips are read by batches of batch_size,
+        ordered by id, and the cache is emptied after every batch.
+        """
+        Trip = self.with_context(active_test=False, tracking_disable=True)
+        domain = [('structured_plan_items_json', '!=', False), ('plan_line_ids', '=', False)]
+        last_trip_id = migrated = errors = 0
+        while True:
+            trips = Trip.search(domain + [('id', '>', last_trip_id)], order='id', limit=batch_size)
+            if not trips:
+                break
+            errors += trips._sync_plan_lines()
+            migrated += len(trips)
+            last_trip_id = trips[-1].id
+            trips.flush()
+            trips.invalidate_cache()
+        _logger.info(f"Plan lines migration: {migrated - errors} business trips migrated, {errors} errors.")
+        return migrated - errors
+
     @api.depends('user_id', 'create_date', 'sale_order_id')
     def _compute_name(self):
         for trip in self:
@@ -467,19 +589,13 @@ class BusinessTrip(models.Model):
 
             # Post summary message to this record's chatter
             try:
-                summary_body_html = self.env.ref('custom_business_trip_management.form_submission_summary')._render({
-                    'record': self.business_trip_data_id,
-                }, engine='ir.qweb')
-
-                message_body = self.env.ref('custom_business_trip_management.chatter_message_card')._render({
-                    'card_type': 'success',
-                    'icon': '📄',
-                    'title': 'Form Submission Summary',
-                    'body_html': summary_body_html,
-                    'submitted_by': self.env.user.name,
-                }, engine='ir.qweb')
-                
-                self.message_post(body=message_body, subtype_xmlid="mail.mt_note")
+                self._post_styled_message(
+                    card_type='success',
+                    icon='📄',
+                    title='Form Submission Summary',
+                    template_xml_id='custom_business_trip_management.form_submission_summary',
+                    render_context={'record': self.business_trip_data_id},
+                )
                 _logger.info(f"Successfully posted styled summary message to chatter for trip {self.id}")
             except Exception as e:
                 _logger.error(f"Failed to render or post summary message for trip {self.id}: {e}", exc_info=True)
@@ -515,51 +631,60 @@ class BusinessTrip(models.Model):
             else:
                 trip.has_trip_details = False
 
-    def action_submit_to_manager(self):
-        """Submit a completed trip request form to a manager for approval."""
-        self.ensure_one()
-
-        if self.user_id.id != self.env.user.id:
-            raise UserError("Only the owner of this form can submit it.")
-
-        if self.trip_status not in ['draft', 'returned']:
-            raise UserError(f"Only forms in 'Draft' or 'Returned' status can be submitted. Current status: {self.trip_status}")
-
-        if not self.has_trip_details:
-            # In a real scenario, you'd return a warning action.
-            raise UserError("Please fill in all required trip details (Destination, Purpose, Dates) before submitting.")
-
-        # Validate dates
-        if self.business_trip_data_id.travel_start_date > self.business_trip_data_id.travel_end_date:
-            raise UserError("End date cannot be before start date.")
+    def _check_submit_to_manager(self):
+        """Returns the (trip, message) pairs of the trips that cannot be submitted."""
+        errors = []
+        for trip in self:
+            if trip.user_id.id != self.env.user.id:
+                errors.append((trip, "Only the owner of this form can submit it."))
+            elif trip.trip_status not in ['draft', 'returned']:
+                errors.append((trip, f"Only forms in 'Draft' or 'Returned' status can be submitted. Current status: {trip.trip_status}"))
+            elif not trip.has_trip_details:
+                # In a real scenario, you'd return a warning action.
+                errors.append((trip, "Please fill in all required trip details (Destination, Purpose, Dates) before submitting."))
+            # Validate dates
+            elif trip.business_trip_data_id.travel_start_date > trip.business_trip_data_id.travel_end_date:
+                errors.append((trip, "End date cannot be before start date."))
+        return errors
 
-        # Find the employee's manager if not already set
-        if not self.manager_id:
-            employee = self.env['hr.employee'].sudo().search([('user_id', '=', self.user_id.id)], limit=1)
-            if employee and employee.parent_id and employee.parent_id.user_id:
-                manager = employee.parent_id.user_id
-            else:
-                # Fallback to admin if no manager found
-                admin_user = self.env.ref('base.user_admin', raise_if_not_found=False)
-                if admin_user:
-                    manager = admin_user
-                else:
-                    raise UserError("Your manager is not set. Please contact HR.")
+    def action_submit_to_manager(self):
+        """Submit completed trip request forms to their manager for approval."""
+        self._raise_workflow_errors(self._check_submit_to_manager())
+        return self._submit_to_manager()
+
+    def _submit_to_manager(self):
+        # Managers of the employees come from the hr.employee hierarchy: the cached
+        # resolver for a single employee, one query for a batch
+        employees = self.filtered(lambda t: not t.manager_id).user_id
+        if len(employees) > 1:
+            employee_managers = employees._get_business_trip_manager_ids()
         else:
-            manager = self.manager_id
-
-        # Update the trip
-        self.write({
-            'trip_status': 'submitted',
-            'submission_date': fields.Datetime.now(),
-            'manager_id': manager.id,
-        })
+            employee_managers = {user.id: user._get_business_trip_manager_id() for user in employees}
+        # Fallback to admin if no manager found
+        admin_user = self.env.ref('base.user_admin', raise_if_not_found=False)
+        admin_user_id = admin_user.id if admin_user else False
 
-        # Notify the manager
-        if self.manager_id and self.manager_id.partner_id:
-            self.message_post(
+        # Trips going to the same manager are written together
+        trips_by_manager = {}
+        for trip in self:
+            manager_id = trip.manager_id.id or employee_managers.get(trip.user_id.id) or admin_user_id
+            if not manager_id:
+                raise UserError("Your manager is not set. Please contact HR.")
+            trips_by_manager[manager_id] = trips_by_manager.get(manager_id, self.browse()) | trip
+
+        now = fields.Datetime.now()
+        for manager_id, trips in trips_by_manager.items():
+            trips.write({
+                'trip_status': 'submitted',
+                'submission_date': now,
+                'manager_id': manager_id,
+            })
+
+        # Notify the managers
+        for trip in self.filtered(lambda t: t.manager_id.partner_id):
+            trip.message_post(
                 body=f"Business trip request submitted by {self.env.user.name} for your review.",
-                partner_ids=[self.manager_id.partner_id.id],
+                partner_ids=[trip.manager_id.partner_id.id],
                 subtype_xmlid="mail.mt_comment",
             )
 
@@ -586,134 +711,303 @@ class BusinessTrip(models.Model):
         }
 
     def confirm_assignment_and_budget(self, manager_max_budget, organizer_id, manager_comments=None, internal_notes=None):
-        """Confirm and assign budget and organizer by manager"""
-        self.ensure_one()
-
+        """
+        Confirm and assign budget and organizer by manager.
+        Works on several trips at once: their projects are resolved together,
+        their tasks created in one call and the followers subscribed per batch.
+        """
         if not self.env.user.has_group('hr.group_hr_manager') and not self.env.user.has_group('base.group_system'):
             raise UserError("Only managers or system administrators can assign organizers and budgets.")
 
         if manager_max_budget <= 0:
             raise UserError("Maximum budget must be a positive value.")
 
-        stakeholder_users = self.user_id | self.manager_id | self.env['res.users'].browse(organizer_id)
-        
-        project = self.sale_order_id.project_ids and self.sale_order_id.project_ids[0] or False
-        if not project:
-            project_vals = {
-                'allow_timesheets': True,
-                'user_id': self.manager_id.id,
-            }
-            if self.sale_order_id:
-                project_vals.update({
-                    'name': self.sale_order_id.name,
-                    'partner_id': self.sale_order_id.partner_id.id,
-                    'sale_order_id': self.sale_order_id.id,
-                })
-            else:
-                project_vals.update({
-                    'name': f"Business Trip: {self.name}",
-                    'partner_id': self.user_id.partner_id.id,
-                })
-            project = self.env['project.project'].create(project_vals)
-
-        task = self._create_business_trip_task(project, organizer_id)
+        projects = self._get_business_trip_projects()
+        tasks = self._create_business_trip_tasks(projects, organizer_id)
 
         vals = {
             'manager_max_budget': manager_max_budget,
             'organizer_id': organizer_id,
             'trip_status': 'pending_organization',
             'manager_approval_date': fields.Datetime.now(),
-            'business_trip_project_id': project.id,
-            'business_trip_task_id': task.id,
         }
         if manager_comments:
             vals['manager_comments'] = manager_comments
         if internal_notes:
             vals['internal_manager_organizer_notes'] = internal_notes
 
-        self.write(vals)
-        self._add_stakeholders_as_followers(project, task, organizer_id)
+        # The project and task differ per trip, so each trip is written once with all its values
+        for trip in self:
+            trip.write(dict(vals, business_trip_project_id=projects[trip.id].id, business_trip_task_id=tasks[trip.id].id))
+        self._add_stakeholders_as_followers(projects, tasks, organizer_id)
         
         # Notification logic would go here
         
         return True
 
-    def _create_business_trip_task(self, project, organizer_id):
-        """Creates the main task for the business trip project."""
+    def _get_business_trip_pool_key(self, pooling):
+        """
+        Key of the project pool of the trip for the given pooling strategy
+        (see BUSINESS_TRIP_PROJECT_POOLING), or False when the trip goes to the
+        project of its sales order.
+        """
         self.ensure_one()
-        assignee_ids = [organizer_id, self.user_id.id]
-        if self.manager_id:
-            assignee_ids.append(self.manager_id.id)
-        
-        task_name = f'Business Trip: {self.name}'
-        
-        task = self.env['project.task'].create({
-            'name': task_name,
-            'project_id': project.id,
-            'user_ids': [(6, 0, list(set(assignee_ids)))],
-            'planned_hours': 1,
-        })
-        return task
+        if pooling == 'month':
+            return f"month:{fields.Date.context_today(self).strftime('%Y-%m')}"
+        if pooling == 'employee':
+            return f"employee:{self.user_id.id}"
+        if self.sale_order_id:
+            return False
+        return 'shared'
 
-    def _add_stakeholders_as_followers(self, project, task, organizer_id):
-        """Adds the employee, manager, and organizer as followers to project and task."""
+    def _prepare_business_trip_pool_project_vals(self, pool_key):
         self.ensure_one()
-        partners = self.user_id.partner_id | self.manager_id.partner_id | self.env['res.users'].browse(organizer_id).partner_id
-        if project:
-            project.message_subscribe(partner_ids=partners.ids)
-        if task:
-            task.message_subscribe(partner_ids=partners.ids) 
+        if pool_key.startswith('employee:'):
+            name = f"Business Trips: {self.user_id.name}"
+        elif pool_key.startswith('month:'):
+            name = f"Business Trips: {pool_key.split(':', 1)[1]}"
+        else:
+            name = "Business Trip Organization"
+        return {
+            'name': name,
+            'allow_timesheets': True,
+            'user_id': self.manager_id.id,
+            # Pools are shared between employees, who only see their own tasks
+            'privacy_visibility': 'followers',
+            'business_trip_pool_key': pool_key,
+        }
 
-    def action_organizer_confirm_planning(self):
-        """Organizer confirms planning is complete and notifies the employee."""
+    def _create_business_trip_pool_project(self, pool_key):
+        """
+        Creates the project of pool_key. Another trip approved at the same time
+        may create it first (business_trip_pool_key is unique): the insert runs
+        in a savepoint and the pool is searched again on a unique violation.
+        """
         self.ensure_one()
-        if self.trip_status not in ['pending_organization']:
-            raise UserError("Planning can only be confirmed when trip is 'Pending Organization'.")
-        if self.env.user.id != self.organizer_id.id and not self.env.user.has_group('base.group_system'):
-            raise UserError("Only the assigned trip organizer or an administrator can confirm the planning.")
-
-        if not self.organizer_trip_plan_details and not self.structured_plan_items_json:
-            raise UserError("Please provide trip plan details before confirming.")
+        Project = self.env['project.project']
+        try:
+            with self.env.cr.savepoint():
+                return Project.create(self._prepare_business_trip_pool_project_vals(pool_key))
+        except psycopg2.errors.UniqueViolation:
+            project = Project.search([('business_trip_pool_key', '=', pool_key)], limit=1)
+            if not project:
+                # Committed after this transaction started, so not visible to it yet
+                raise UserError(_("The project of these business trips was just created by another user. Please try again."))
+            return project
+
+    def _get_business_trip_projects(self):
+        """
+        Returns {trip id: project} for the trips of self, following the project
+        pooling setting, so that the number of projects stays bounded:
+        - sale_order: the project of the sales order, created once per sales
+          order; trips without one share a single project,
+        - employee: one project per employee,
+        - month: one project per month of approval.
+        Existing pools are found with one search.
+        """
+        pooling = self.env['ir.config_parameter'].sudo().get_param(PROJECT_POOLING_PARAM) or DEFAULT_PROJECT_POOLING
+        Project = self.env['project.project']
+        projects = {}
+        trips_by_pool_key = {}
+        trips_by_sale_order = {}
+        for trip in self:
+            pool_key = trip._get_business_trip_pool_key(pooling)
+            if pool_key:
+                trips_by_pool_key.setdefault(pool_key, self.browse())
+                trips_by_pool_key[pool_key] |= trip
+            else:
+                trips_by_sale_order.setdefault(trip.sale_order_id, self.browse())
+                trips_by_sale_order[trip.sale_order_id] |= trip
+
+        # Projects of the sales orders
+        sale_orders_without_project = []
+        for sale_order, trips in trips_by_sale_order.items():
+            if sale_order.project_ids:
+                projects.update(dict.fromkeys(trips.ids, sale_order.project_ids[0]))
+            else:
+                sale_orders_without_project.append(sale_order)
+        if sale_orders_without_project:
+            new_projects = Project.create([{
+                'name': sale_order.name,
+                'allow_timesheets': True,
+                'user_id': trips_by_sale_order[sale_order][0].manager_id.id,
+                'partner_id': sale_order.partner_id.id,
+                'sale_order_id': sale_order.id,
+            } for sale_order in sale_orders_without_project])
+            for sale_order, project in zip(sale_orders_without_project, new_projects):
+                projects.update(dict.fromkeys(trips_by_sale_order[sale_order].ids, project))
+
+        # Pooled projects
+        if trips_by_pool_key:
+            pool_projects = {project.business_trip_pool_key: project
+                             for project in Project.search([('business_trip_pool_key', 'in', list(trips_by_pool_key))])}
+            default_project = self.env.ref('custom_business_trip_management.default_trip_organization_project', raise_if_not_found=False)
+            if 'shared' in trips_by_pool_key and 'shared' not in pool_projects and default_project:
+                # Databases installed before the key was set on the default project
+                default_project.business_trip_pool_key = 'shared'
+                pool_projects['shared'] = default_project
+            for pool_key in trips_by_pool_key:
+                if pool_key not in pool_projects:
+                    pool_projects[pool_key] = trips_by_pool_key[pool_key][0]._create_business_trip_pool_project(pool_key)
+            for pool_key, trips in trips_by_pool_key.items():
+                projects.update(dict.fromkeys(trips.ids, pool_projects[pool_key]))
+
+        return projects
+
+    def _create_business_trip_tasks(self, projects, organizer_id):
+        """Creates the main task of every trip in its project, in one call. Returns {trip id: task}."""
+        vals_list = []
+        for trip in self:
+            assignee_ids = [organizer_id, trip.user_id.id]
+            if trip.manager_id:
+                assignee_ids.append(trip.manager_id.id)
+            vals_list.append({
+                'name': f'Business Trip: {trip.name}',
+                'project_id': projects[trip.id].id,
+                'user_ids': [(6, 0, list(set(assignee_ids)))],
+                'planned_hours': 1,
+            })
+        tasks = self.env['project.task'].create(vals_list)
+        return dict(zip(self.ids, tasks))
+
+    def _add_stakeholders_as_followers(self, projects, tasks, organizer_id):
+        """
+        Adds the employee, manager and organizer as followers of the tasks, and
+        the manager and organizer as followers of the sales order projects.
+        Pooled projects (business_trip_pool_key set) hold the trips of several
+        teams, so nobody follows them: each stakeholder only sees the tasks of
+        the trips they follow. Records getting the same followers are
+        subscribed in one call.
+        """
+        organizer_partner = self.env['res.users'].browse(organizer_id).partner_id
+        project_followers = {}
+        task_followers = {}
+        for trip in self:
+            project = projects[trip.id]
+            if not project.business_trip_pool_key:
+                project_followers[project] = project_followers.get(project, organizer_partner) | trip.manager_id.partner_id
+            partners = trip.user_id.partner_id | trip.manager_id.partner_id | organizer_partner
+            task_followers.setdefault(partners, self.env['project.task'])
+            task_followers[partners] |= tasks[trip.id]
+
+        projects_by_partners = {}
+        for project, partners in project_followers.items():
+            projects_by_partners.setdefault(partners, self.env['project.project'])
+            projects_by_partners[partners] |= project
+        for partners, grouped_projects in projects_by_partners.items():
+            grouped_projects.message_subscribe(partner_ids=partners.ids)
+        for partners, grouped_tasks in task_followers.items():
+            grouped_tasks.message_subscribe(partner_ids=partners.ids)
+
+    def _check_organizer_confirm_planning(self):
+        """Returns the (trip, message) pairs of the trips whose planning cannot be confirmed."""
+        is_admin = 'system' in self.env.user._get_business_trip_roles()
+        errors = []
+        for trip in self:
+            if trip.trip_status not in ['pending_organization']:
+                errors.append((trip, "Planning can only be confirmed when trip is 'Pending Organization'."))
+            elif self.env.user.id != trip.organizer_id.id and not is_admin:
+                errors.append((trip, "Only the assigned trip organizer or an administrator can confirm the planning."))
+            elif not trip.organizer_trip_plan_details and not trip.structured_plan_items_json:
+                errors.append((trip, "Please provide trip plan details before confirming."))
+            elif trip.organizer_planned_cost <= 0:
+                errors.append((trip, "Please set a planned cost greater than zero before confirming."))
+        return errors
 
-        if self.organizer_planned_cost <= 0:
-            raise UserError("Please set a planned cost greater than zero before confirming.")
+    def action_organizer_confirm_planning(self):
+        """Organizer confirms planning is complete and notifies the employee."""
+        self._raise_workflow_errors(self._check_organizer_confirm_planning())
+        return self._organizer_confirm_planning()
 
+    def _organizer_confirm_planning(self):
+        now = fields.Datetime.now()
         self.write({
             'trip_status': 'awaiting_trip_start',
-            'organizer_submission_date': fields.Datetime.now(),
-            'plan_approval_date': fields.Datetime.now(), 
+            'organizer_submission_date': now,
+            'plan_approval_date': now,
         })
 
         # Notification logic would go here
         
         return True 
 
+    def _check_start_trip(self):
+        """Returns the (trip, message) pairs of the trips that cannot be started."""
+        errors = []
+        for trip in self:
+            if trip.trip_status != 'awaiting_trip_start':
+                errors.append((trip, "You can only start a trip that is awaiting travel."))
+            elif trip.user_id.id != self.env.user.id:
+                errors.append((trip, "Only the employee assigned to the trip can start it."))
+        return errors
+
     def action_start_trip(self):
         """Action for employee to mark the beginning of their travel."""
-        self.ensure_one()
-        if self.trip_status != 'awaiting_trip_start':
-            raise UserError("You can only start a trip that is awaiting travel.")
-        if self.user_id.id != self.env.user.id:
-            raise UserError("Only the employee assigned to the trip can start it.")
-        
+        self._raise_workflow_errors(self._check_start_trip())
+        return self._start_trip()
+
+    def _start_trip(self):
         self.write({
             'trip_status': 'in_progress',
             'actual_start_date': fields.Datetime.now()
         })
-        self.message_post(body="The business trip has officially started.")
+        self._message_log_batch(bodies={trip.id: "The business trip has officially started." for trip in self})
         return True
 
+    def _check_end_trip(self):
+        """Returns the (trip, message) pairs of the trips that cannot be ended."""
+        errors = []
+        for trip in self:
+            if trip.trip_status != 'in_progress':
+                errors.append((trip, "You can only end a trip that is currently in progress."))
+            elif trip.user_id.id != self.env.user.id:
+                errors.append((trip, "Only the employee assigned to the trip can end it."))
+        return errors
+
     def action_end_trip(self):
         """Action for employee to mark the end of their travel."""
-        self.ensure_one()
-        if self.trip_status != 'in_progress':
-            raise UserError("You can only end a trip that is currently in progress.")
-        if self.user_id.id != self.env.user.id:
-            raise UserError("Only the employee assigned to the trip can end it.")
-            
+        self._raise_workflow_errors(self._check_end_trip())
+        return self._end_trip()
+
+    def _end_trip(self):
         self.write({
             'trip_status': 'completed_waiting_expense',
             'actual_end_date': fields.Datetime.now()
         })
-        self.message_post(body="The business trip has ended. Please submit your expenses.")
-        return True 
\ No newline at end of file
+        self._message_log_batch(bodies={trip.id: "The business trip has ended. Please submit your expenses." for trip in self})
+        return True
+
+    def _raise_workflow_errors(self, errors, exception_class=UserError):
+        """
+        Raises the (trip, message) pairs collected by a _check_* method, if any,
+        so a transition applies to all the selected trips or to none.
+        """
+        if not errors:
+            return
+        if len(self) == 1:
+            raise exception_class(errors[0][1])
+        raise exception_class("The action cannot be applied to the following trips:\n" +
+                              "\n".join(f"- {trip.name}: {message}" for trip, message in errors))
+
+    def action_batch_workflow_step(self):
+        """
+        Moves every selected trip to its next workflow step, according to its
+        status (see BATCH_WORKFLOW_STEPS). All the trips are validated before
+        any of them is changed; trips in a status without a batch step are
+        ignored. Bound to the business trip list view.
+        """
+        trips_by_step = {}
+        for trip in self:
+            step = BATCH_WORKFLOW_STEPS.get(trip.trip_status)
+            if step:
+                trips_by_step[step] = trips_by_step.get(step, self.browse()) | trip
+
+        errors = []
+        for (check_method, transition_method), trips in trips_by_step.items():
+            errors += getattr(trips, check_method)()
+        self._raise_workflow_errors(errors)
+
+        for (check_method, transition_method), trips in trips_by_step.items():
+            getattr(trips, transition_method)()
+        _logger.info(f"Batch workflow step applied to {sum(len(trips) for trips in trips_by_step.values())} business trips by {self.env.user.name}.")
+        return True
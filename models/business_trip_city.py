@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api, tools
+from odoo.exceptions import UserError
+import csv
+import io
+import logging
+import os
+import unicodedata
+import zipfile
+from psycopg2.extras import execute_values
+
+_logger = logging.getLogger(__name__)
+
+# Path of the Geonames dump (e.g. cities15000.zip or cities15000.txt) imported into the gazetteer
+GAZETTEER_PATH_PARAM = 'custom_business_trip_management.gazetteer_path'
+# Rows upserted per statement while importing a dump
+GAZETTEER_IMPORT_BATCH_SIZE = 5000
+GAZETTEER_AUTOCOMPLETE_LIMIT = 15
+
+# Columns of the Geonames 'geoname' table dumps (tab separated, no header)
+GEONAMES_COLUMNS = {
+    'geonameid': 0,
+    'name': 1,
+    'asciiname': 2,
+    'feature_class': 6,
+    'feature_code': 7,
+    'country_code': 8,
+    'population': 14,
+}
+
+
+def _normalize_city_name(name):
+    """Lower-cased, accent-free form of a city name, used for prefix matching."""
+    decomposed = unicodedata.normalize('NFKD', name or '')
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold().strip()
+
+
+class BusinessTripCity(models.Model):
+    """
+    Local copy of the Geonames populated places, answering the destination
+    autocomplete without calling the Geonames web service.
+    """
+    _name = 'business.trip.city'
+    _description = 'Business Trip Gazetteer City'
+    _order = 'population desc, name'
+
+    name = fields.Char(string='Name', required=True)
+    search_name = fields.Char(string='Search Name', required=True)
+    geoname_id = fields.Integer(string='Geonames ID', required=True)
+    country_code = fields.Char(string='Country Code', size=2)
+    country_id = fields.Many2one('res.country', string='Country')
+    feature_code = fields.Char(string='Feature Code')
+    population = fields.Integer(string='Population')
+
+    _sql_constraints = [
+        ('geoname_id_unique', 'unique(geoname_id)', 'A city with this Geonames ID already exists.'),
+    ]
+
+    def init(self):
+        # Prefix lookups (search_name LIKE 'mil%') regardless of the database collation
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS business_trip_city_search_name_prefix_index
+                ON business_trip_city (search_name text_pattern_ops, population DESC)
+        """)
+
+    @tools.ormcache()
+    def _has_gazetteer(self):
+        """Tells whether a gazetteer was imported. Cleared by _import_geonames_dump."""
+        self.env.cr.execute("SELECT 1 FROM business_trip_city LIMIT 1")
+        return bool(self.env.cr.fetchone())
+
+    @api.model
+    def _autocomplete(self, search_term, limit=GAZETTEER_AUTOCOMPLETE_LIMIT):
+        """
+        Returns the cities whose name starts with search_term, as the
+        [{'value': <geonames id>, 'label': 'Name, Country'}] list the destination
+        autocomplete expects. Exact matches come first, then the most populated.
+        """
+        prefix = _normalize_city_name(search_term)
+        if not prefix:
+            return []
+        self.env.cr.execute("""
+            SELECT geoname_id, name, country_id
+              FROM business_trip_city
+             WHERE search_name LIKE %s
+          ORDER BY search_name = %s DESC, population DESC, name
+             LIMIT %s
+        """, (prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%', prefix, limit))
+        rows = self.env.cr.fetchall()
+        countries = self.env['res.country'].browse({row[2] for row in rows if row[2]})
+        country_names = {country.id: country.name for country in countries}
+        return [
+            {
+                'value': str(geoname_id),
+                'label': ", ".join(filter(None, [name, country_names.get(country_id)])),
+            }
+            for geoname_id, name, country_id in rows
+        ]
+
+    @api.model
+    def _import_geonames_dump(self, path=None):
+        """
+        Imports (or refreshes) the gazetteer from a Geonames dump, a .txt file or
+        the .zip Geonames publishes it in. Only populated places (feature class P)
+        are kept. The file is streamed and upserted by batches on the Geonames ID.
+        Returns the number of imported cities.
+        """
+        path = path or self.env['ir.config_parameter'].sudo().get_param(GAZETTEER_PATH_PARAM)
+        if not path or not os.path.isfile(path):
+            raise UserError(f"Geonames dump file not found: {path or '(not configured)'}")
+
+        country_ids = {country['code'].upper(): country['id']
+                       for country in self.env['res.country'].search_read([], ['code']) if country['code']}
+
+        imported = 0
+        with self._open_geonames_dump(path) as dump:
+            batch = []
+            for row in csv.reader(dump, delimiter='\t', quoting=csv.QUOTE_NONE):
+                if len(row) <= GEONAMES_COLUMNS['population'] or row[GEONAMES_COLUMNS['feature_class']] != 'P':
+                    continue
+                name = row[GEONAMES_COLUMNS['name']]
+                country_code = row[GEONAMES_COLUMNS['country_code']].upper()
+                batch.append((
+                    int(row[GEONAMES_COLUMNS['geonameid']]),
+                    name,
+                    _normalize_city_name(row[GEONAMES_COLUMNS['asciiname']] or name),
+                    country_code or None,
+                    country_ids.get(country_code),
+                    row[GEONAMES_COLUMNS['feature_code']] or None,
+                    int(row[GEONAMES_COLUMNS['population']] or 0),
+                ))
+                if len(batch) >= GAZETTEER_IMPORT_BATCH_SIZE:
+                    imported += self._upsert_cities(batch)
+                    batch = []
+            if batch:
+                imported += self._upsert_cities(batch)
+
+        self.invalidate_cache()
+        self.clear_caches()
+        _logger.info(f"GAZETTEER: Imported {imported} cities from {path}.")
+        return imported
+
+    def _open_geonames_dump(self, path):
+        if zipfile.is_zipfile(path):
+            archive = zipfile.ZipFile(path)
+            members = [member for member in archive.namelist() if member.endswith('.txt') and not member.startswith('readme')]
+            if not members:
+                raise UserError(f"No Geonames dump found in {path}")
+            return io.TextIOWrapper(archive.open(members[0]), encoding='utf-8', newline='')
+        return open(path, encoding='utf-8', newline='')
+
+    def _upsert_cities(self, rows):
+        execute_values(self.env.cr._obj, """
+            INSERT INTO business_trip_city (geoname_id, name, search_name, country_code, country_id, feature_code, population)
+                 VALUES %s
+            ON CONFLICT (geoname_id) DO UPDATE
+                    SET name = EXCLUDED.name,
+                        search_name = EXCLUDED.search_name,
+                        country_code = EXCLUDED.country_code,
+                        country_id = EXCLUDED.country_id,
+                        feature_code = EXCLUDED.feature_code,
+                        population = EXCLUDED.population
+        """, rows, page_size=len(rows))
+        return len(rows)
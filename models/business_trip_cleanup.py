@@ -1,25 +1,37 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api, _
+from odoo import models, fields
+import json
 import logging
+import time
 from datetime import datetime, timedelta
 
 _logger = logging.getLogger(__name__)
 
+# ir.config_parameter holding the metrics of the last orphaned attachments cleanup
+CLEANUP_METRICS_PARAM = 'custom_business_trip_management.cleanup_metrics'
+
 class BusinessTripCleanup(models.AbstractModel):
     _name = 'business.trip.cleanup'
     _description = 'Automated Cleanup for Business Trip Attachments'
 
-    def _cron_cleanup_orphaned_attachments(self, older_than_hours=24):
+    def _cron_cleanup_orphaned_attachments(self, older_than_hours=24, batch_size=500, time_budget=240):
         """
         Finds and deletes unlinked ir.attachment records created by the
         business trip upload controller that are older than a given time.
+
+        Attachments are deleted in batches of batch_size, oldest first, with a
+        commit after every batch so locks are held briefly and an interrupted run
+        keeps what it already deleted. When the time budget (in seconds) is
+        exhausted the job re-triggers itself and returns. The counters of the run
+        are logged and kept in the CLEANUP_METRICS_PARAM config parameter.
         """
         _logger.info("Starting orphaned business trip attachments cleanup cron job...")
-        
+
         # Define the cutoff time
         cutoff_date = datetime.now() - timedelta(hours=older_than_hours)
-        
-        # Define the domain to find orphaned attachments:
+
+        # Define the domain to find orphaned attachments (served by the
+        # ir_attachment (res_model, res_id, create_date) index):
         # - Created for our specific model
         # - Not linked to any record (res_id is 0)
         # - Older than our cutoff date
@@ -28,18 +40,67 @@ class BusinessTripCleanup(models.AbstractModel):
             ('res_id', '=', 0),
             ('create_date', '<', fields.Datetime.to_string(cutoff_date))
         ]
-        
-        orphaned_attachments = self.env['ir.attachment'].search(domain)
-        
-        if orphaned_attachments:
+
+        started_at = time.monotonic()
+        metrics = {'deleted': 0, 'bytes_released': 0, 'batches': 0, 'errors': 0, 'completed': False}
+        Attachment = self.env['ir.attachment']
+        # Batches that failed are skipped, so a bad record cannot block the queue
+        failed_ids = []
+        while True:
+            orphaned_attachments = Attachment.search(domain + [('id', 'not in', failed_ids)], order='create_date, id', limit=batch_size)
+            if not orphaned_attachments:
+                metrics['completed'] = True
+                break
+
             count = len(orphaned_attachments)
-            _logger.info(f"Found {count} orphaned attachments to delete for business trip module.")
+            stored_sizes = {(attachment.store_fname or f'db:{attachment.id}'): attachment.file_size for attachment in orphaned_attachments}
             try:
-                orphaned_attachments.unlink()
-                _logger.info(f"Successfully deleted {count} orphaned attachments.")
+                with self.env.cr.savepoint():
+                    orphaned_attachments.unlink()
+                    released = self._get_released_bytes(stored_sizes)
+                metrics['deleted'] += count
+                metrics['bytes_released'] += released
             except Exception as e:
+                metrics['errors'] += count
+                failed_ids += orphaned_attachments.ids
                 _logger.error(f"Error during orphaned attachment deletion: {e}", exc_info=True)
+            metrics['batches'] += 1
+            self.env.cr.commit()
+
+            if time.monotonic() - started_at > time_budget:
+                _logger.info(f"Cleanup time budget exhausted after {metrics['deleted']} orphaned attachments, rescheduling.")
+                self.env.ref('custom_business_trip_management.ir_cron_cleanup_business_trip_attachments')._trigger()
+                break
+
+        if metrics['completed']:
+            # Chunked uploads that were never finalized, and their spooled files
+            self.env['business.trip.upload']._gc_expired_uploads(older_than_hours)
+
+        metrics['duration'] = round(time.monotonic() - started_at, 3)
+        metrics['date'] = fields.Datetime.to_string(fields.Datetime.now())
+        self.env['ir.config_parameter'].sudo().set_param(CLEANUP_METRICS_PARAM, json.dumps(metrics))
+        self.env.cr.commit()
+
+        if metrics['deleted'] or metrics['errors']:
+            _logger.info(f"Orphaned attachments cleanup: deleted {metrics['deleted']} attachments "
+                         f"({metrics['bytes_released']} bytes released) in {metrics['batches']} batches, "
+                         f"{metrics['errors']} errors, {metrics['duration']}s.")
         else:
             _logger.info("No orphaned business trip attachments found to delete.")
-            
-        return True 
\ No newline at end of file
+
+        return True
+
+    def _get_released_bytes(self, stored_sizes):
+        """
+        Returns the number of bytes released by deleting attachments, given the
+        size of each of their stored files ({store_fname: file_size}, content
+        stored in the database having a 'db:<id>' key). Business trip uploads
+        share their stored files, so a file still referenced by another
+        attachment releases nothing.
+        """
+        store_fnames = tuple(key for key in stored_sizes if not key.startswith('db:'))
+        still_referenced = set()
+        if store_fnames:
+            self.env.cr.execute("SELECT DISTINCT store_fname FROM ir_attachment WHERE store_fname IN %s", [store_fnames])
+            still_referenced = {row[0] for row in self.env.cr.fetchall()}
+        return sum(size or 0 for key, size in stored_sizes.items() if key not in still_referenced)
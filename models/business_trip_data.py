@@ -3,11 +3,365 @@
 from odoo import models, fields, api, _
 from datetime import datetime, date, timedelta
 from odoo.exceptions import ValidationError, UserError
+import binascii
 import logging
 import json
 
 _logger = logging.getLogger(__name__)
 
+# ---------------------------------------------------------------------------
+# Declarative Form.io submission -> business.trip.data mapping
+# ---------------------------------------------------------------------------
+# Every value is looked up at the submission root first, then in the nested
+# 'data' object. Value types: 'raw' (kept as is), 'bool', 'int', 'float', 'date'.
+
+# Always extracted: (field, root key, nested key, value type, default value)
+SUBMISSION_FIELDS = [
+    ('first_name', 'first_name', 'first_name', 'raw', ""),
+    ('last_name', 'last_name', 'last_name', 'raw', ""),
+    ('approving_colleague_name', 'approving_colleague_name', 'approving_colleague_name', 'raw', ""),
+    ('trip_duration_type', 'trip_duration_type', 'trip_duration_type', 'raw', None),
+    ('trip_type', 'trip_type', 'trip_type', 'raw', None),
+    ('destination', 'trip_destination_portal_query_params', 'trip_destination_portal_query_params', 'raw', ""),
+    ('travel_start_date', 'trip_start_date', 'trip_start_date', 'date', None),
+    ('travel_end_date', 'trip_end_date', 'trip_end_date', 'date', None),
+    ('accommodation_needed', 'accommodation_needed', 'accommodation_needed', 'raw', None),
+    ('manual_travel_duration', 'manual_travel_duration', 'manual_travel_duration', 'float', 0.0),
+    ('expected_cost', 'expected_cost', 'expected_cost', 'float', 0.0),
+]
+
+# Conditional groups: (condition field, expected value, fields, cleared values).
+# The fields, given as (field, root key, nested key, value type), are extracted only
+# when vals[condition field] == expected value; otherwise the cleared values are set.
+SUBMISSION_PRE_TRANSPORT_GROUPS = [
+    ('accommodation_needed', 'yes', [
+        ('accommodation_number_of_people', 'number_of_people', 'number_of_people', 'int'),
+        ('accommodation_residence_city', 'residence_city', 'residence_city', 'raw'),
+        ('accommodation_check_in_date', 'check_in_date', 'check_in_date', 'date'),
+        ('accommodation_check_out_date', 'check_out_date', 'check_out_date', 'date'),
+        ('accommodation_points_of_interest', 'points_of_interest', 'points_of_interest', 'raw'),
+        ('accommodation_need_24h_reception', 'need_24h_reception', 'need_24h_reception', 'raw'),
+    ], {
+        'accommodation_number_of_people': 0,
+        'accommodation_residence_city': "",
+        'accommodation_check_in_date': None,
+        'accommodation_check_out_date': None,
+        'accommodation_points_of_interest': "",
+        'accommodation_need_24h_reception': "",
+    }),
+]
+
+# Transport detail groups, applied once the use_* flags are known
+SUBMISSION_TRANSPORT_GROUPS = [
+    ('use_rental_car', True, [
+        ('rental_car_pickup_date', 'pickup_date', 'pickup_date', 'date'),
+        ('rental_car_pickup_flexible', 'pickup_flexible', 'pickup_flexible', 'bool'),
+        ('rental_car_pickup_point', 'pickup_point', 'pickup_point', 'raw'),
+        ('rental_car_dropoff_point', 'dropoff_point', 'dropoff_point', 'raw'),
+        ('rental_car_dropoff_date', 'dropoff_date', 'dropoff_date', 'date'),
+        ('rental_car_dropoff_flexible', 'dropoff_flexible', 'dropoff_flexible', 'bool'),
+        ('rental_car_credit_card', 'credit_card_available', 'credit_card_available', 'raw'),
+        ('rental_car_type', 'rental_type', 'rental_type', 'raw'),
+        ('rental_car_kilometer_limit', 'kilometer_limit', 'kilometer_limit', 'int'),
+        ('rental_car_unlimited_km', 'unlimited_km', 'unlimited_km', 'bool'),
+        ('rental_car_preferences', 'car_additional_preferences', 'car_additional_preferences', 'raw'),
+    ], {
+        'rental_car_pickup_date': None,
+        'rental_car_pickup_flexible': False,
+        'rental_car_pickup_point': None,
+        'rental_car_dropoff_point': None,
+        'rental_car_dropoff_date': None,
+        'rental_car_dropoff_flexible': False,
+        'rental_car_credit_card': None,
+        'rental_car_type': None,
+        'rental_car_drivers_license': None,
+        'rental_car_drivers_license_filename': None,
+        'rental_car_kilometer_limit': 0,
+        'rental_car_unlimited_km': False,
+        'rental_car_preferences': "",
+    }),
+    ('use_return_rental_car', True, [
+        ('return_rental_car_pickup_date', 'return_rental_car_pickup_date', 'return_rental_car_pickup_date', 'date'),
+        ('return_rental_car_pickup_flexible', 'return_rental_car_pickup_flexible', 'return_rental_car_pickup_flexible', 'bool'),
+        ('return_rental_car_pickup_point', 'return_rental_car_pickup_point', 'return_rental_car_pickup_point', 'raw'),
+        ('return_rental_car_dropoff_point', 'return_rental_car_dropoff_point', 'return_rental_car_dropoff_point', 'raw'),
+        ('return_rental_car_dropoff_date', 'return_rental_car_dropoff_date', 'return_rental_car_dropoff_date', 'date'),
+        ('return_rental_car_dropoff_flexible', 'return_rental_car_dropoff_flexible', 'return_rental_car_dropoff_flexible', 'bool'),
+        ('return_rental_car_credit_card', 'return_rental_car_credit_card', 'return_rental_car_credit_card', 'raw'),
+        ('return_rental_car_type', 'return_rental_car_type', 'return_rental_car_type', 'raw'),
+        ('return_rental_car_kilometer_limit', 'return_rental_car_kilometer_limit', 'return_rental_car_kilometer_limit', 'int'),
+        ('return_rental_car_unlimited_km', 'return_rental_car_unlimited_km', 'return_rental_car_unlimited_km', 'bool'),
+        ('return_rental_car_preferences', 'return_rental_car_preferences', 'return_rental_car_preferences', 'raw'),
+    ], {
+        'return_rental_car_pickup_date': None,
+        'return_rental_car_pickup_flexible': False,
+        'return_rental_car_pickup_point': None,
+        'return_rental_car_dropoff_point': None,
+        'return_rental_car_dropoff_date': None,
+        'return_rental_car_dropoff_flexible': False,
+        'return_rental_car_credit_card': None,
+        'return_rental_car_type': None,
+        'return_rental_car_drivers_license': None,
+        'return_rental_car_drivers_license_filename': None,
+        'return_rental_car_kilometer_limit': 0,
+        'return_rental_car_unlimited_km': False,
+        'return_rental_car_preferences': "",
+    }),
+    ('use_train', True, [
+        # The form may use a shared key at the root and a train specific one in 'data'
+        ('train_departure_city', 'departure_city', 'departure_city_train', 'raw'),
+        ('train_departure_station', 'departure_station', 'departure_station_train', 'raw'),
+        ('train_arrival_station', 'arrival_station', 'arrival_station_train', 'raw'),
+        ('train_departure_date', 'departure_date_train', 'departure_date_train', 'date'),
+        ('train_departure_flexible', 'departure_flexible_train', 'departure_flexible_train', 'bool'),
+        ('train_arrival_date', 'arrival_date', 'arrival_date_train', 'date'),
+        ('train_arrival_flexible', 'arrival_flexible_train', 'arrival_flexible_train', 'bool'),
+    ], {
+        'train_departure_city': None,
+        'train_departure_station': None,
+        'train_arrival_station': None,
+        'train_departure_date': None,
+        'train_departure_flexible': False,
+        'train_arrival_date': None,
+        'train_arrival_flexible': False,
+    }),
+    ('use_return_train', True, [
+        ('return_train_departure_city', 'return_train_departure_city', 'return_train_departure_city', 'raw'),
+        ('return_train_departure_station', 'return_train_departure_station', 'return_train_departure_station', 'raw'),
+        ('return_train_arrival_station', 'return_train_arrival_station', 'return_train_arrival_station', 'raw'),
+        ('return_train_departure_date', 'return_train_departure_date', 'return_train_departure_date', 'date'),
+        ('return_train_departure_flexible', 'return_train_departure_flexible', 'return_train_departure_flexible', 'bool'),
+        ('return_train_arrival_date', 'return_train_arrival_date', 'return_train_arrival_date', 'date'),
+        ('return_train_arrival_flexible', 'return_train_arrival_flexible', 'return_train_arrival_flexible', 'bool'),
+    ], {
+        'return_train_departure_city': None,
+        'return_train_departure_station': None,
+        'return_train_arrival_station': None,
+        'return_train_departure_date': None,
+        'return_train_departure_flexible': False,
+        'return_train_arrival_date': None,
+        'return_train_arrival_flexible': False,
+    }),
+    ('use_airplane', True, [
+        ('airplane_departure_airport', 'departure_airport', 'departure_airport', 'raw'),
+        ('airplane_departure_date', 'departure_date_airplane', 'departure_date_airplane', 'date'),
+        ('airplane_departure_flexible', 'departure_flexible_airplane', 'departure_flexible_airplane', 'bool'),
+        ('airplane_arrival_airport', 'arrival_airport', 'arrival_airport', 'raw'),
+        ('airplane_arrival_date', 'arrival_date_airplane', 'arrival_date_airplane', 'date'),
+        ('airplane_arrival_flexible', 'arrival_flexible_airplane', 'arrival_flexible_airplane', 'bool'),
+        ('airplane_baggage_type', 'baggage', 'baggage', 'raw'),
+        ('airplane_preferences', 'airplane_additional_preferences', 'airplane_additional_preferences', 'raw'),
+    ], {
+        'airplane_departure_airport': None,
+        'airplane_departure_date': None,
+        'airplane_arrival_airport': None,
+        'airplane_arrival_date': None,
+        'airplane_arrival_flexible': False,
+        'airplane_baggage_type': None,
+        'airplane_preferences': "",
+    }),
+    ('use_return_airplane', True, [
+        ('return_airplane_departure_airport', 'return_departure_airport', 'return_departure_airport', 'raw'),
+        ('return_airplane_departure_date', 'return_departure_date', 'return_departure_date', 'date'),
+        ('return_airplane_departure_flexible', 'return_departure_flexible', 'return_departure_flexible', 'bool'),
+        ('return_airplane_destination_airport', 'return_destination_airport', 'return_destination_airport', 'raw'),
+        ('return_airplane_destination_date', 'return_destination_date', 'return_destination_date', 'date'),
+        ('return_airplane_destination_flexible', 'return_destination_flexible', 'return_destination_flexible', 'bool'),
+        ('return_airplane_baggage_type', 'return_baggage', 'return_baggage', 'raw'),
+        ('return_airplane_preferences', 'return_other_details', 'return_other_details', 'raw'),
+    ], {
+        'return_airplane_departure_airport': None,
+        'return_airplane_departure_date': None,
+        'return_airplane_destination_airport': None,
+        'return_airplane_destination_date': None,
+        'return_airplane_destination_flexible': False,
+        'return_airplane_baggage_type': None,
+        'return_airplane_preferences': "",
+    }),
+    ('use_bus', True, [
+        ('bus_departure_city', 'bus_departure_city', 'bus_departure_city', 'raw'),
+        ('bus_departure_terminal', 'bus_departure_terminal', 'bus_departure_terminal', 'raw'),
+        ('bus_arrival_terminal', 'bus_arrival_terminal', 'bus_arrival_terminal', 'raw'),
+        ('bus_departure_date', 'bus_departure_date', 'bus_departure_date', 'date'),
+        ('bus_departure_flexible', 'bus_departure_flexible', 'bus_departure_flexible', 'bool'),
+        ('bus_arrival_date', 'bus_arrival_date', 'bus_arrival_date', 'date'),
+        ('bus_arrival_flexible', 'bus_arrival_flexible', 'bus_arrival_flexible', 'bool'),
+    ], {
+        'bus_departure_city': None,
+        'bus_departure_terminal': None,
+        'bus_arrival_terminal': None,
+        'bus_departure_date': None,
+        'bus_departure_flexible': False,
+        'bus_arrival_date': None,
+        'bus_arrival_flexible': False,
+    }),
+    ('use_return_bus', True, [
+        ('return_bus_departure_city', 'return_bus_departure_city', 'return_bus_departure_city', 'raw'),
+        ('return_bus_departure_station', 'return_bus_departure_station', 'return_bus_departure_station', 'raw'),
+        ('return_bus_arrival_station', 'return_bus_arrival_station', 'return_bus_arrival_station', 'raw'),
+        ('return_bus_departure_date', 'return_bus_departure_date', 'return_bus_departure_date', 'date'),
+        ('return_bus_departure_flexible', 'return_bus_departure_flexible', 'return_bus_departure_flexible', 'bool'),
+        ('return_bus_arrival_date', 'return_bus_arrival_date', 'return_bus_arrival_date', 'date'),
+        ('return_bus_arrival_flexible', 'return_bus_arrival_flexible', 'return_bus_arrival_flexible', 'bool'),
+    ], {
+        'return_bus_departure_city': None,
+        'return_bus_departure_station': None,
+        'return_bus_arrival_station': None,
+        'return_bus_departure_date': None,
+        'return_bus_departure_flexible': False,
+        'return_bus_arrival_date': None,
+        'return_bus_arrival_flexible': False,
+    }),
+]
+
+
+def _to_bool(raw_value):
+    # Handles "true", "false", true, false, 1, 0, "on", "off", "yes", "no"
+    if isinstance(raw_value, str):
+        val_lower = raw_value.lower()
+        if val_lower in ("true", "on", "yes", "1"):
+            return True
+        if val_lower in ("false", "off", "no", "0"):
+            return False
+    return bool(raw_value)
+
+
+def _to_date(raw_value):
+    # Supports "MM/DD/YYYY" and "YYYY-MM-DD" strings and date objects
+    if isinstance(raw_value, date):
+        return raw_value
+    if not isinstance(raw_value, str):
+        raise TypeError(f"expected a date string, got {type(raw_value).__name__}")
+    try:
+        return datetime.strptime(raw_value, '%m/%d/%Y').date()
+    except ValueError:
+        return datetime.strptime(raw_value, '%Y-%m-%d').date()
+
+
+_SUBMISSION_CONVERTERS = {
+    'raw': None,
+    'bool': _to_bool,
+    'int': int,
+    'float': float,
+    'date': _to_date,
+}
+
+
+def _lookup_submission_value(data_root, nested_data, root_key, nested_key):
+    """Returns the non-empty value of root_key at the root, else of nested_key in 'data', else None."""
+    value = data_root.get(root_key)
+    if value is not None and value != '':
+        return value
+    if nested_data:
+        value = nested_data.get(nested_key)
+        if value is not None and value != '':
+            return value
+    return None
+
+
+def _compile_submission_fields(field_specs, default_value=None):
+    """Resolves the value type of each spec to its converter: (field, root key, nested key, converter, default)."""
+    return tuple(
+        (spec[0], spec[1], spec[2], _SUBMISSION_CONVERTERS[spec[3]], spec[4] if len(spec) > 4 else default_value)
+        for spec in field_specs
+    )
+
+
+def _compile_submission_groups(group_specs):
+    return tuple(
+        (condition_field, expected_value, _compile_submission_fields(field_specs), dict(cleared_vals))
+        for condition_field, expected_value, field_specs, cleared_vals in group_specs
+    )
+
+
+def _extract_submission_fields(data_root, nested_data, compiled_fields, vals):
+    """Fills vals from the submission using compiled field specs and returns it."""
+    for field_name, root_key, nested_key, converter, default_value in compiled_fields:
+        raw_value = _lookup_submission_value(data_root, nested_data, root_key, nested_key)
+        if raw_value is None:
+            vals[field_name] = default_value
+        elif converter is None:
+            vals[field_name] = raw_value
+        else:
+            try:
+                vals[field_name] = converter(raw_value)
+            except (ValueError, TypeError) as e:
+                _logger.warning(f"BTD_PROCESS_EXTRACT: Could not parse value '{raw_value}' for field '{root_key}'. Error: {e}. Using default value: {default_value}")
+                vals[field_name] = default_value
+    return vals
+
+
+def _apply_submission_groups(data_root, nested_data, compiled_groups, vals):
+    """Extracts or clears each conditional group depending on the values already in vals."""
+    for condition_field, expected_value, compiled_fields, cleared_vals in compiled_groups:
+        if vals.get(condition_field) == expected_value:
+            _extract_submission_fields(data_root, nested_data, compiled_fields, vals)
+        else:
+            vals.update(cleared_vals)
+    return vals
+
+
+# Compiled once when the module is loaded, shared by every extraction
+_COMPILED_SUBMISSION_FIELDS = _compile_submission_fields(SUBMISSION_FIELDS)
+_COMPILED_PRE_TRANSPORT_GROUPS = _compile_submission_groups(SUBMISSION_PRE_TRANSPORT_GROUPS)
+_COMPILED_TRANSPORT_GROUPS = _compile_submission_groups(SUBMISSION_TRANSPORT_GROUPS)
+
+# Number of base64 characters decoded at a time (a multiple of 4)
+BASE64_DECODE_CHUNK_SIZE = 4 * 16384
+
+
+def _decode_base64_payload(payload):
+    """
+    Decodes a base64 string or a 'data:<mime>;base64,<data>' URL slice by slice,
+    so the (possibly multi-MB) base64 text is never split or copied as a whole.
+    """
+    start = payload.find(',', 0, 256) + 1 if payload.startswith('data:') else 0
+    return b''.join(
+        binascii.a2b_base64(payload[offset:offset + BASE64_DECODE_CHUNK_SIZE])
+        for offset in range(start, len(payload), BASE64_DECODE_CHUNK_SIZE)
+    )
+
+
+def _get_file_reference(file_info):
+    """
+    Returns (payload, attachment_id) for a Form.io file dict: the base64 data URL
+    or string it carries, or the id of the attachment it was already stored in.
+    """
+    if file_info.get('attachment_id'):
+        return None, file_info['attachment_id']
+    url = file_info.get('url')
+    if isinstance(url, str) and url.startswith('data:'):
+        return url, None
+    return file_info.get('base64') or None, None
+
+
+def _link_binary_attachment(record, field_name, source):
+    """
+    Makes the attachment=True binary field_name of record use the content of the
+    source attachment. Filestore content is shared (same store_fname), not copied.
+    """
+    Attachment = record.env['ir.attachment'].sudo()
+    Attachment.search([
+        ('res_model', '=', record._name),
+        ('res_field', '=', field_name),
+        ('res_id', '=', record.id),
+    ]).unlink()
+    attachment_vals = {
+        'name': field_name,
+        'res_model': record._name,
+        'res_field': field_name,
+        'res_id': record.id,
+        'type': 'binary',
+    }
+    if source.store_fname:
+        attachment_vals['mimetype'] = source.mimetype
+        Attachment.create(attachment_vals)._business_trip_write_store(source.store_fname, source.file_size, source.checksum)
+    else:
+        attachment_vals['raw'] = source.raw
+        Attachment.create(attachment_vals)
+    record.invalidate_cache([field_name], record.ids)
+
+
 class BusinessTripData(models.Model):
     _name = 'business.trip.data'
     _description = 'Business Trip Form Data'
@@ -230,6 +584,45 @@ class BusinessTripData(models.Model):
     def process_submission_data(self, submission_data):
         _logger.info(f"BTD_PROCESS: Starting process_submission_data for BusinessTripData ID: {self.id}, Form ID: {self.form_id.id if self.form_id else 'N/A'}")
 
+        pending_files = []
+        vals = self._prepare_submission_vals(submission_data, pending_files)
+        if vals is False:
+            return False
+
+        # Clear existing persons before adding new ones to avoid duplicates on re-submission
+        submission_modified = self._reset_accompanying_persons(pending_files)
+
+        _logger.info(f"BTD_PROCESS: Final vals before writing: {vals}")
+        try:
+            # Disable tracking for automated field updates to avoid individual log entries
+            self.with_context(tracking_disable=True).write(vals)
+            if self._store_submission_files(pending_files):
+                submission_modified = True
+            if submission_modified and self.form_id:
+                # Keep the raw base64 out of the stored submission, files now link to their attachments
+                self.form_id.write({'submission_data': json.dumps(submission_data)})
+            _logger.info(f"BTD_PROCESS: Successfully updated BusinessTripData record {self.id}.")
+
+        except Exception as e:
+            _logger.error(f"BTD_PROCESS: Error updating BusinessTripData record {self.id}: {e}", exc_info=True)
+            raise
+
+        _logger.info("BTD_PROCESS: process_submission_data completed successfully.")
+        return True
+
+    def _prepare_submission_vals(self, submission_data, pending_files=None):
+        """
+        Extracts the business.trip.data values from a Form.io submission without
+        writing them. Returns the vals dict, or False when the submission carries
+        no meaningful data. Used by process_submission_data and by the bulk
+        re-processing job, which writes the vals of many records at once.
+
+        Uploaded files (identity documents, driver's licenses) are not put in vals
+        as base64: they are appended to pending_files and must be stored with
+        _store_submission_files once the vals are written.
+        """
+        if pending_files is None:
+            pending_files = []
         if not submission_data or not isinstance(submission_data, dict):
             _logger.warning(f"BTD_PROCESS: No submission data provided or not a dict for BTD ID: {self.id}. Type: {type(submission_data)}")
             return False
@@ -246,60 +639,9 @@ class BusinessTripData(models.Model):
                          f"Assuming initial call during creation. Data: {submission_data}")
             return False
         
-        vals = {}
-        # The entire submission_data is the root
-         # Get the nested 'data' object, if it exists
-
-        _logger.info(f"BTD_PROCESS: Root keys: {list(data_root.keys())}")
-        if 'data' in data_root:
-            _logger.info(f"BTD_PROCESS: Nested 'data' keys: {list(nested_data.keys())}")
-        else:
-            _logger.info("BTD_PROCESS: No nested 'data' key in submission_data.")
-
-        # Personal Information - Prioritize root, then nested 'data'
-        vals['first_name'] = self._extract_field_value(data_root, nested_data, 'first_name', 'first_name', default_value="")
-        vals['last_name'] = self._extract_field_value(data_root, nested_data, 'last_name', 'last_name', default_value="")
-        vals['approving_colleague_name'] = self._extract_field_value(data_root, nested_data, 'approving_colleague_name', 'approving_colleague_name', default_value="")
-
-        # Trip approval and type fields - Prioritize root, then nested 'data'
-        vals['trip_duration_type'] = self._extract_field_value(data_root, nested_data, 'trip_duration_type', 'trip_duration_type')
-        vals['trip_type'] = self._extract_field_value(data_root, nested_data, 'trip_type', 'trip_type')
-        
-        # Basic Trip Information - Now extracting from Form.io submission
-        _logger.info("BTD_PROCESS: Extracting destination and travel dates from Form.io submission data.")
-        
-        # Destination - using the new field key from form
-        vals['destination'] = self._extract_field_value(data_root, nested_data, 'trip_destination_portal_query_params', 'trip_destination_portal_query_params', default_value="")
-        
-        # Purpose - No longer extracted directly from Form.io, it's computed.
-        # vals['purpose'] = self._extract_field_value(data_root, nested_data, 'trip_purpose', 'trip_purpose', default_value="") # MODIFIED: Commented out/Removed
-        
-        # Travel dates - using the new field keys from form
-        vals['travel_start_date'] = self._extract_field_value(data_root, nested_data, 'trip_start_date', 'trip_start_date', is_date=True)
-        vals['travel_end_date'] = self._extract_field_value(data_root, nested_data, 'trip_end_date', 'trip_end_date', is_date=True)
-        
-        # Accommodation fields - Prioritize root, then nested 'data'
-        vals['accommodation_needed'] = self._extract_field_value(data_root, nested_data, 'accommodation_needed', 'accommodation_needed')
-        # Use the extracted value for the condition directly
-        accommodation_is_needed = vals['accommodation_needed'] == 'yes'
-
-        if accommodation_is_needed:
-            _logger.info(f"BTD_PROCESS: Accommodation is needed. Extracting details based on extracted value.")
-            vals['accommodation_number_of_people'] = self._extract_field_value(data_root, nested_data, 'number_of_people', 'number_of_people', is_integer=True) # Corrected key from form
-            vals['accommodation_residence_city'] = self._extract_field_value(data_root, nested_data, 'residence_city', 'residence_city') # Corrected key from form
-            vals['accommodation_check_in_date'] = self._extract_field_value(data_root, nested_data, 'check_in_date', 'check_in_date', is_date=True) # Corrected key from form
-            vals['accommodation_check_out_date'] = self._extract_field_value(data_root, nested_data, 'check_out_date', 'check_out_date', is_date=True) # Corrected key from form
-            vals['accommodation_points_of_interest'] = self._extract_field_value(data_root, nested_data, 'points_of_interest', 'points_of_interest') # Corrected key from form
-            vals['accommodation_need_24h_reception'] = self._extract_field_value(data_root, nested_data, 'need_24h_reception', 'need_24h_reception') # Corrected key from form
-        else:
-            _logger.info(f"BTD_PROCESS: Accommodation is NOT needed or value is '{vals.get('accommodation_needed')}'. Skipping accommodation detail extraction.")
-            # Clear accommodation details if accommodation_needed is 'no' or not set
-            vals['accommodation_number_of_people'] = 0
-            vals['accommodation_residence_city'] = ""
-            vals['accommodation_check_in_date'] = None
-            vals['accommodation_check_out_date'] = None
-            vals['accommodation_points_of_interest'] = ""
-            vals['accommodation_need_24h_reception'] = ""
+        # Plain and conditional fields come from the compiled SUBMISSION_FIELDS mapping
+        vals = _extract_submission_fields(data_root, nested_data, _COMPILED_SUBMISSION_FIELDS, {})
+        _apply_submission_groups(data_root, nested_data, _COMPILED_PRE_TRANSPORT_GROUPS, vals)
 
         # Accompanying Persons
         # Check for different possible structures:
@@ -318,8 +660,6 @@ class BusinessTripData(models.Model):
                 _logger.info(f"BTD_PROCESS: Found accompanying persons data under nested key 'data.{key}'. Count: {len(accompanying_persons_data)}")
                 break
         
-        # Clear existing persons before adding new ones to avoid duplicates on re-submission
-        self.accompanying_person_ids.unlink()
         persons_to_create = []
         
         if accompanying_persons_data:
@@ -333,31 +673,23 @@ class BusinessTripData(models.Model):
                 doc_data_field = person_data.get('accompanying_identity_document_acc') # This is the form.io file field name
                 doc_filename_field = person_data.get('accompanying_identity_document_acc_filename') # This is the derived filename field
 
-                # If the file field itself contains a list of file info dicts (common for Form.io file components)
-                doc_base64 = None
-                doc_filename = None
+                if isinstance(doc_data_field, str) and doc_data_field.startswith('data:'): # Direct base64 string
+                    # Wrap it (without copying) as a Form.io file dict, using the separate filename field
+                    doc_data_field = person_data['accompanying_identity_document_acc'] = [
+                        {'storage': 'base64', 'url': doc_data_field, 'name': doc_filename_field}]
 
-                if isinstance(doc_data_field, list) and doc_data_field:
-                    # Take the first file if multiple are somehow uploaded to a single component instance
-                    file_info = doc_data_field[0]
-                    if isinstance(file_info, dict):
-                        doc_base64 = file_info.get('storage') == 'base64' and file_info.get('base64', '').split(',')[-1]
-                        doc_filename = file_info.get('name')
-                elif isinstance(doc_data_field, str) and doc_data_field.startswith('data:'): # Direct base64 string
-                     doc_base64 = doc_data_field.split(',')[-1]
-                     doc_filename = doc_filename_field # Use the separate filename field if main field is direct base64
+                # The file field contains a list of file info dicts (common for Form.io file components);
+                # take the first file if multiple are somehow uploaded to a single component instance
+                file_info = doc_data_field[0] if isinstance(doc_data_field, list) and doc_data_field else None
 
                 if full_name:
                     person_vals = {
                         'full_name': full_name,
                     }
-                    if doc_base64 and doc_filename:
-                        try:
-                            person_vals['identity_document'] = doc_base64
-                            person_vals['identity_document_filename'] = doc_filename
-                            _logger.info(f"BTD_PROCESS: Prepared accompanying person '{full_name}' with document '{doc_filename}'.")
-                        except Exception as e:
-                             _logger.error(f"BTD_PROCESS: Error decoding base64 for accompanying person '{full_name}', document '{doc_filename}': {e}")
+                    doc_filename = file_info.get('name') if isinstance(file_info, dict) else None
+                    if doc_filename and self._queue_submission_file(pending_files, file_info, 'identity_document', person_index=len(persons_to_create)):
+                        person_vals['identity_document_filename'] = doc_filename
+                        _logger.info(f"BTD_PROCESS: Prepared accompanying person '{full_name}' with document '{doc_filename}'.")
                     else:
                         _logger.info(f"BTD_PROCESS: Prepared accompanying person '{full_name}' without document (data missing or not base64).")
                     
@@ -370,51 +702,31 @@ class BusinessTripData(models.Model):
             if number_of_people and number_of_people > 1:  # More than 1 person means there are accompanying persons
                 _logger.info(f"BTD_PROCESS: Found {number_of_people} people in trip, creating {number_of_people - 1} accompanying persons")
                 
-                # Process accompanying document if exists
-                doc_base64 = None
+                # Process accompanying document if exists (take the first file if multiple are somehow uploaded)
+                file_info = None
                 doc_filename = None
-                
-                if isinstance(accompanying_doc, list) and accompanying_doc:
-                    # Take the first file if multiple are somehow uploaded
+                if isinstance(accompanying_doc, list) and accompanying_doc and isinstance(accompanying_doc[0], dict):
                     file_info = accompanying_doc[0]
-                    if isinstance(file_info, dict):
-                        # Handle both storage types: base64 stored in 'url' field or separate 'base64' field
-                        if file_info.get('storage') == 'base64' and file_info.get('url'):
-                            # Extract base64 data from data URL
-                            url_data = file_info.get('url', '')
-                            if url_data.startswith('data:'):
-                                doc_base64 = url_data.split(',')[-1]
-                            else:
-                                doc_base64 = file_info.get('base64')
-                        else:
-                            doc_base64 = file_info.get('base64')
-                        doc_filename = file_info.get('originalName') or file_info.get('name')
-                        _logger.info(f"BTD_PROCESS: Found accompanying document: {doc_filename}, storage: {file_info.get('storage')}, has_base64: {bool(doc_base64)}, url_length: {len(file_info.get('url', ''))}")
+                    doc_filename = file_info.get('originalName') or file_info.get('name')
                 
                 # Extract accompanying person's name from JSON
                 # In the JSON structure, full_name appears to be the accompanying person's name
                 # while first_name and last_name are for the main traveler
                 accompanying_full_name = self._extract_field_value(data_root, nested_data, 'full_name', 'full_name')
-                _logger.info(f"BTD_PROCESS: Extracted accompanying person full_name: '{accompanying_full_name}'")
                 
                 # Create accompanying persons (number_of_people - 1, excluding the main traveler)
                 for i in range(number_of_people - 1):
                     # Use the extracted name if available, otherwise use a default name
                     person_name = accompanying_full_name if accompanying_full_name else f'Accompanying Person {i + 1}'
-                    _logger.info(f"BTD_PROCESS: Creating accompanying person {i + 1} with name: '{person_name}'")
                     
                     person_vals = {
                         'full_name': person_name,
                     }
                     
                     # Add document to the first accompanying person if available
-                    if i == 0 and doc_base64 and doc_filename:
-                        try:
-                            person_vals['identity_document'] = doc_base64
-                            person_vals['identity_document_filename'] = doc_filename
-                            _logger.info(f"BTD_PROCESS: Added document '{doc_filename}' to accompanying person '{person_name}'")
-                        except Exception as e:
-                            _logger.error(f"BTD_PROCESS: Error processing document for accompanying person '{person_name}': {e}")
+                    if i == 0 and doc_filename and self._queue_submission_file(pending_files, file_info, 'identity_document', person_index=len(persons_to_create)):
+                        person_vals['identity_document_filename'] = doc_filename
+                        _logger.info(f"BTD_PROCESS: Added document '{doc_filename}' to accompanying person '{person_name}'")
                     
                     persons_to_create.append((0, 0, person_vals))
                     
@@ -534,266 +846,21 @@ class BusinessTripData(models.Model):
                 vals['use_return_bus'] = False
                 vals['return_transport_means_json'] = "{}"
 
-        # Rental Car Information - Prioritize root, then nested 'data'
-        if vals.get('use_rental_car'):
-            _logger.info("BTD_PROCESS: Rental car is selected. Extracting details.")
-            vals.update({
-                'rental_car_pickup_date': self._extract_field_value(data_root, nested_data, 'pickup_date', 'pickup_date', is_date=True),
-                'rental_car_pickup_flexible': self._extract_field_value(data_root, nested_data, 'pickup_flexible', 'pickup_flexible', is_boolean=True),
-                'rental_car_pickup_point': self._extract_field_value(data_root, nested_data, 'pickup_point', 'pickup_point'),
-                'rental_car_dropoff_point': self._extract_field_value(data_root, nested_data, 'dropoff_point', 'dropoff_point'),
-                'rental_car_dropoff_date': self._extract_field_value(data_root, nested_data, 'dropoff_date', 'dropoff_date', is_date=True),
-                'rental_car_dropoff_flexible': self._extract_field_value(data_root, nested_data, 'dropoff_flexible', 'dropoff_flexible', is_boolean=True),
-                'rental_car_credit_card': self._extract_field_value(data_root, nested_data, 'credit_card_available', 'credit_card_available'),
-                'rental_car_type': self._extract_field_value(data_root, nested_data, 'rental_type', 'rental_type'),
-                'rental_car_kilometer_limit': self._extract_field_value(data_root, nested_data, 'kilometer_limit', 'kilometer_limit', is_integer=True),
-                'rental_car_unlimited_km': self._extract_field_value(data_root, nested_data, 'unlimited_km', 'unlimited_km', is_boolean=True),
-                'rental_car_preferences': self._extract_field_value(data_root, nested_data, 'car_additional_preferences', 'car_additional_preferences'),
-            })
+        # Transport detail groups depend on the use_* flags extracted above
+        _apply_submission_groups(data_root, nested_data, _COMPILED_TRANSPORT_GROUPS, vals)
 
-            # Handle driver's license file upload for rental car
-            # The form uses 'drivers_license_file' as per the component JSON provided by the user
-            license_data = self._extract_field_value(data_root, nested_data, 'drivers_license_file', 'drivers_license_file')
-            if not license_data:
-                # Fallback for other possible naming conventions
-                _logger.info("BTD_PROCESS: 'drivers_license_file' not found, trying fallback 'drivers_license'.")
-                license_data = self._extract_field_value(data_root, nested_data, 'drivers_license', 'drivers_license')
-            if not license_data:
-                 # Fallback for older form versions
-                _logger.info("BTD_PROCESS: 'drivers_license' not found, trying fallback 'rental_car_drivers_license'.")
-                license_data = self._extract_field_value(data_root, nested_data, 'rental_car_drivers_license', 'rental_car_drivers_license')
-
-            if license_data and isinstance(license_data, list) and license_data[0]:
-                file_info = license_data[0]
-                if isinstance(file_info, dict) and file_info.get('storage') == 'base64':
-                    base64_data = None
-                    # The base64 data can be in 'base64' key or in 'url' key for formio
-                    if file_info.get('url') and file_info['url'].startswith('data:'):
-                        base64_data = file_info['url'].split(',')[-1]
-                    elif file_info.get('base64'):
-                        base64_data = file_info['base64'].split(',')[-1]
-                    
-                    if base64_data:
-                        vals['rental_car_drivers_license'] = base64_data
-                        vals['rental_car_drivers_license_filename'] = file_info.get('originalName') or file_info.get('name')
-                        _logger.info(f"BTD_PROCESS: Successfully extracted rental car drivers license: {vals['rental_car_drivers_license_filename']}")
-                    else:
-                        _logger.warning(f"BTD_PROCESS: Rental car license data found, but no base64 string in 'url' or 'base64' keys: {file_info}")
-                else:
-                    _logger.warning(f"BTD_PROCESS: Rental car license data found but not in expected format (dict with storage='base64'): {file_info}")
-        else:
-            _logger.info("BTD_PROCESS: Rental car is not selected. Skipping rental car detail extraction.")
-            # Clear rental car fields if use_rental_car is False
-            vals['rental_car_pickup_date'] = None
-            vals['rental_car_pickup_flexible'] = False
-            vals['rental_car_pickup_point'] = None
-            vals['rental_car_dropoff_point'] = None
-            vals['rental_car_dropoff_date'] = None
-            vals['rental_car_dropoff_flexible'] = False
-            vals['rental_car_credit_card'] = None
-            vals['rental_car_type'] = None
-            vals['rental_car_drivers_license'] = None
-            vals['rental_car_drivers_license_filename'] = None
-            vals['rental_car_kilometer_limit'] = 0
-            vals['rental_car_unlimited_km'] = False
-            vals['rental_car_preferences'] = ""
-
-        # Return Rental Car Information - Prioritize root, then nested 'data'
-        if vals.get('use_return_rental_car'): # Only process if return rental car is selected
-            _logger.info(f"BTD_PROCESS: Return rental car is selected. Extracting details.")
-            vals['return_rental_car_pickup_date'] = self._extract_field_value(data_root, nested_data, 'return_rental_car_pickup_date', 'return_rental_car_pickup_date', is_date=True)
-            vals['return_rental_car_pickup_flexible'] = self._extract_field_value(data_root, nested_data, 'return_rental_car_pickup_flexible', 'return_rental_car_pickup_flexible', is_boolean=True)
-            vals['return_rental_car_pickup_point'] = self._extract_field_value(data_root, nested_data, 'return_rental_car_pickup_point', 'return_rental_car_pickup_point')
-            vals['return_rental_car_dropoff_point'] = self._extract_field_value(data_root, nested_data, 'return_rental_car_dropoff_point', 'return_rental_car_dropoff_point')
-            vals['return_rental_car_dropoff_date'] = self._extract_field_value(data_root, nested_data, 'return_rental_car_dropoff_date', 'return_rental_car_dropoff_date', is_date=True)
-            vals['return_rental_car_dropoff_flexible'] = self._extract_field_value(data_root, nested_data, 'return_rental_car_dropoff_flexible', 'return_rental_car_dropoff_flexible', is_boolean=True)
-            vals['return_rental_car_credit_card'] = self._extract_field_value(data_root, nested_data, 'return_rental_car_credit_card', 'return_rental_car_credit_card')
-            vals['return_rental_car_type'] = self._extract_field_value(data_root, nested_data, 'return_rental_car_type', 'return_rental_car_type')
-            
-            # Handle driver's license file upload for return rental car
-            return_license_data = self._extract_field_value(data_root, nested_data, 'return_rental_car_drivers_license', 'return_rental_car_drivers_license')
-            
-            if return_license_data and isinstance(return_license_data, list) and return_license_data[0]:
-                file_info = return_license_data[0]
-                if isinstance(file_info, dict) and file_info.get('storage') == 'base64':
-                    base64_data = None
-                    if file_info.get('url') and file_info['url'].startswith('data:'):
-                        base64_data = file_info['url'].split(',')[-1]
-                    elif file_info.get('base64'):
-                        base64_data = file_info['base64'].split(',')[-1]
-
-                    if base64_data:
-                        vals['return_rental_car_drivers_license'] = base64_data
-                        vals['return_rental_car_drivers_license_filename'] = file_info.get('originalName') or file_info.get('name')
-                        _logger.info(f"BTD_PROCESS: Successfully extracted return rental car drivers license: {vals['return_rental_car_drivers_license_filename']}")
-                    else:
-                        _logger.warning(f"BTD_PROCESS: Return rental car license data found, but no base64 string in 'url' or 'base64' keys: {file_info}")
-                else:
-                    _logger.warning(f"BTD_PROCESS: Return rental car license data found but not in expected format (dict with storage='base64'): {file_info}")
-
-            vals['return_rental_car_kilometer_limit'] = self._extract_field_value(data_root, nested_data, 'return_rental_car_kilometer_limit', 'return_rental_car_kilometer_limit', is_integer=True)
-            vals['return_rental_car_unlimited_km'] = self._extract_field_value(data_root, nested_data, 'return_rental_car_unlimited_km', 'return_rental_car_unlimited_km', is_boolean=True)
-            vals['return_rental_car_preferences'] = self._extract_field_value(data_root, nested_data, 'return_rental_car_preferences', 'return_rental_car_preferences')
-        else:
-            _logger.info("BTD_PROCESS: Return rental car is not selected. Skipping return rental car detail extraction.")
-            # Clear return rental car fields if use_return_rental_car is False
-            vals['return_rental_car_pickup_date'] = None
-            vals['return_rental_car_pickup_flexible'] = False
-            vals['return_rental_car_pickup_point'] = None
-            vals['return_rental_car_dropoff_point'] = None
-            vals['return_rental_car_dropoff_date'] = None
-            vals['return_rental_car_dropoff_flexible'] = False
-            vals['return_rental_car_credit_card'] = None
-            vals['return_rental_car_type'] = None
-            vals['return_rental_car_drivers_license'] = None
-            vals['return_rental_car_drivers_license_filename'] = None
-            vals['return_rental_car_kilometer_limit'] = 0
-            vals['return_rental_car_unlimited_km'] = False
-            vals['return_rental_car_preferences'] = ""
-
-        # Train Information - Prioritize root, then nested 'data'
-        if vals.get('use_train'): # Only process if train is selected
-            _logger.info(f"BTD_PROCESS: Train is selected. Extracting details.")
-            vals['train_departure_city'] = self._extract_field_value(data_root, nested_data, 'departure_city', 'departure_city_train') # Form might use departure_city for multiple, or a specific one like departure_city_train
-            vals['train_departure_station'] = self._extract_field_value(data_root, nested_data, 'departure_station', 'departure_station_train')
-            vals['train_arrival_station'] = self._extract_field_value(data_root, nested_data, 'arrival_station', 'arrival_station_train')
-            vals['train_departure_date'] = self._extract_field_value(data_root, nested_data, 'departure_date_train', 'departure_date_train', is_date=True)
-            vals['train_departure_flexible'] = self._extract_field_value(data_root, nested_data, 'departure_flexible_train', 'departure_flexible_train', is_boolean=True)
-            vals['train_arrival_date'] = self._extract_field_value(data_root, nested_data, 'arrival_date', 'arrival_date_train', is_date=True) # Form might use arrival_date for multiple
-            vals['train_arrival_flexible'] = self._extract_field_value(data_root, nested_data, 'arrival_flexible_train', 'arrival_flexible_train', is_boolean=True)
-        else:
-            _logger.info("BTD_PROCESS: Train is not selected. Skipping train detail extraction.")
-            # Clear train fields if use_train is False
-            vals['train_departure_city'] = None
-            vals['train_departure_station'] = None
-            vals['train_arrival_station'] = None
-            vals['train_departure_date'] = None
-            vals['train_departure_flexible'] = False
-            vals['train_arrival_date'] = None
-            vals['train_arrival_flexible'] = False
-
-        # Return Train Information - Prioritize root, then nested 'data'
-        if vals.get('use_return_train'): # Only process if return train is selected
-            _logger.info(f"BTD_PROCESS: Return train is selected. Extracting details.")
-            vals['return_train_departure_city'] = self._extract_field_value(data_root, nested_data, 'return_train_departure_city', 'return_train_departure_city')
-            vals['return_train_departure_station'] = self._extract_field_value(data_root, nested_data, 'return_train_departure_station', 'return_train_departure_station')
-            vals['return_train_arrival_station'] = self._extract_field_value(data_root, nested_data, 'return_train_arrival_station', 'return_train_arrival_station')
-            vals['return_train_departure_date'] = self._extract_field_value(data_root, nested_data, 'return_train_departure_date', 'return_train_departure_date', is_date=True)
-            vals['return_train_departure_flexible'] = self._extract_field_value(data_root, nested_data, 'return_train_departure_flexible', 'return_train_departure_flexible', is_boolean=True)
-            vals['return_train_arrival_date'] = self._extract_field_value(data_root, nested_data, 'return_train_arrival_date', 'return_train_arrival_date', is_date=True)
-            vals['return_train_arrival_flexible'] = self._extract_field_value(data_root, nested_data, 'return_train_arrival_flexible', 'return_train_arrival_flexible', is_boolean=True)
-        else:
-            _logger.info("BTD_PROCESS: Return train is not selected. Skipping return train detail extraction.")
-            # Clear return train fields if use_return_train is False
-            vals['return_train_departure_city'] = None
-            vals['return_train_departure_station'] = None
-            vals['return_train_arrival_station'] = None
-            vals['return_train_departure_date'] = None
-            vals['return_train_departure_flexible'] = False
-            vals['return_train_arrival_date'] = None
-            vals['return_train_arrival_flexible'] = False
-
-        # Airplane Information - Prioritize root, then nested 'data'
-        if vals.get('use_airplane'): # Only process if airplane is selected
-            _logger.info(f"BTD_PROCESS: Airplane is selected. Extracting details.")
-            vals['airplane_departure_airport'] = self._extract_field_value(data_root, nested_data, 'departure_airport', 'departure_airport') 
-            vals['airplane_departure_date'] = self._extract_field_value(data_root, nested_data, 'departure_date_airplane', 'departure_date_airplane', is_date=True) 
-            vals['airplane_departure_flexible'] = self._extract_field_value(data_root, nested_data, 'departure_flexible_airplane', 'departure_flexible_airplane', is_boolean=True)
-            vals['airplane_arrival_airport'] = self._extract_field_value(data_root, nested_data, 'arrival_airport', 'arrival_airport')
-            vals['airplane_arrival_date'] = self._extract_field_value(data_root, nested_data, 'arrival_date_airplane', 'arrival_date_airplane', is_date=True)
-            vals['airplane_arrival_flexible'] = self._extract_field_value(data_root, nested_data, 'arrival_flexible_airplane', 'arrival_flexible_airplane', is_boolean=True)
-            vals['airplane_baggage_type'] = self._extract_field_value(data_root, nested_data, 'baggage', 'baggage')
-            vals['airplane_preferences'] = self._extract_field_value(data_root, nested_data, 'airplane_additional_preferences', 'airplane_additional_preferences')
-        else:
-            _logger.info("BTD_PROCESS: Airplane is not selected. Skipping airplane detail extraction.")
-            # Clear airplane fields if use_airplane is False
-            vals['airplane_departure_airport'] = None
-            vals['airplane_departure_date'] = None
-            vals['airplane_arrival_airport'] = None
-            vals['airplane_arrival_date'] = None
-            vals['airplane_arrival_flexible'] = False
-            vals['airplane_baggage_type'] = None
-            vals['airplane_preferences'] = ""
-
-        # Return Airplane Information - Prioritize root, then nested 'data'
-        if vals.get('use_return_airplane'): # Only process if return airplane is selected
-            _logger.info(f"BTD_PROCESS: Return airplane is selected. Extracting details.")
-            vals['return_airplane_departure_airport'] = self._extract_field_value(data_root, nested_data, 'return_departure_airport', 'return_departure_airport')
-            vals['return_airplane_departure_date'] = self._extract_field_value(data_root, nested_data, 'return_departure_date', 'return_departure_date', is_date=True) # Form key 'return_departure_date'
-            vals['return_airplane_departure_flexible'] = self._extract_field_value(data_root, nested_data, 'return_departure_flexible', 'return_departure_flexible', is_boolean=True) # Added
-            vals['return_airplane_destination_airport'] = self._extract_field_value(data_root, nested_data, 'return_destination_airport', 'return_destination_airport')
-            vals['return_airplane_destination_date'] = self._extract_field_value(data_root, nested_data, 'return_destination_date', 'return_destination_date', is_date=True)
-            vals['return_airplane_destination_flexible'] = self._extract_field_value(data_root, nested_data, 'return_destination_flexible', 'return_destination_flexible', is_boolean=True)
-            vals['return_airplane_baggage_type'] = self._extract_field_value(data_root, nested_data, 'return_baggage', 'return_baggage')
-            vals['return_airplane_preferences'] = self._extract_field_value(data_root, nested_data, 'return_other_details', 'return_other_details')
-        else:
-            _logger.info("BTD_PROCESS: Return airplane is not selected. Skipping return airplane detail extraction.")
-            # Clear return airplane fields if use_return_airplane is False
-            vals['return_airplane_departure_airport'] = None
-            vals['return_airplane_departure_date'] = None
-            vals['return_airplane_destination_airport'] = None
-            vals['return_airplane_destination_date'] = None
-            vals['return_airplane_destination_flexible'] = False
-            vals['return_airplane_baggage_type'] = None
-            vals['return_airplane_preferences'] = ""
-
-        # Bus Information - Prioritize root, then nested 'data'
-        if vals.get('use_bus'): # Only process if bus is selected
-            _logger.info(f"BTD_PROCESS: Bus is selected. Extracting details.")
-            vals['bus_departure_city'] = self._extract_field_value(data_root, nested_data, 'bus_departure_city', 'bus_departure_city')
-            vals['bus_departure_terminal'] = self._extract_field_value(data_root, nested_data, 'bus_departure_terminal', 'bus_departure_terminal')
-            vals['bus_arrival_terminal'] = self._extract_field_value(data_root, nested_data, 'bus_arrival_terminal', 'bus_arrival_terminal')
-            vals['bus_departure_date'] = self._extract_field_value(data_root, nested_data, 'bus_departure_date', 'bus_departure_date', is_date=True)
-            vals['bus_departure_flexible'] = self._extract_field_value(data_root, nested_data, 'bus_departure_flexible', 'bus_departure_flexible', is_boolean=True)
-            vals['bus_arrival_date'] = self._extract_field_value(data_root, nested_data, 'bus_arrival_date', 'bus_arrival_date', is_date=True)
-            vals['bus_arrival_flexible'] = self._extract_field_value(data_root, nested_data, 'bus_arrival_flexible', 'bus_arrival_flexible', is_boolean=True)
-        else:
-            _logger.info("BTD_PROCESS: Bus is not selected. Skipping bus detail extraction.")
-            # Clear bus fields if use_bus is False
-            vals['bus_departure_city'] = None
-            vals['bus_departure_terminal'] = None
-            vals['bus_arrival_terminal'] = None
-            vals['bus_departure_date'] = None
-            vals['bus_departure_flexible'] = False
-            vals['bus_arrival_date'] = None
-            vals['bus_arrival_flexible'] = False
-
-        # Return Bus Information - Prioritize root, then nested 'data'
-        if vals.get('use_return_bus'): # Only process if return bus is selected
-            _logger.info(f"BTD_PROCESS: Return bus is selected. Extracting details.")
-            vals['return_bus_departure_city'] = self._extract_field_value(data_root, nested_data, 'return_bus_departure_city', 'return_bus_departure_city')
-            vals['return_bus_departure_station'] = self._extract_field_value(data_root, nested_data, 'return_bus_departure_station', 'return_bus_departure_station') # Corrected from terminal
-            vals['return_bus_arrival_station'] = self._extract_field_value(data_root, nested_data, 'return_bus_arrival_station', 'return_bus_arrival_station')
-            vals['return_bus_departure_date'] = self._extract_field_value(data_root, nested_data, 'return_bus_departure_date', 'return_bus_departure_date', is_date=True)
-            vals['return_bus_departure_flexible'] = self._extract_field_value(data_root, nested_data, 'return_bus_departure_flexible', 'return_bus_departure_flexible', is_boolean=True)
-            vals['return_bus_arrival_date'] = self._extract_field_value(data_root, nested_data, 'return_bus_arrival_date', 'return_bus_arrival_date', is_date=True)
-            vals['return_bus_arrival_flexible'] = self._extract_field_value(data_root, nested_data, 'return_bus_arrival_flexible', 'return_bus_arrival_flexible', is_boolean=True)
-        else:
-            _logger.info("BTD_PROCESS: Return bus is not selected. Skipping return bus detail extraction.")
-            # Clear return bus fields if use_return_bus is False
-            vals['return_bus_departure_city'] = None
-            vals['return_bus_departure_station'] = None
-            vals['return_bus_arrival_station'] = None
-            vals['return_bus_departure_date'] = None
-            vals['return_bus_departure_flexible'] = False
-            vals['return_bus_arrival_date'] = None
-            vals['return_bus_arrival_flexible'] = False
-
-        # Manual Travel Duration
-        manual_travel_duration_val = self._extract_field_value(data_root, nested_data, 'manual_travel_duration', 'manual_travel_duration')
-        if manual_travel_duration_val is not None:
-                vals['manual_travel_duration'] = float(manual_travel_duration_val)
-        else:
-            _logger.warning("BTD_PROCESS: Manual travel duration not found in submission data. Using default value.")
-            vals['manual_travel_duration'] = 0.0
-
-        # Expected Cost
-        expected_cost_val = self._extract_field_value(data_root, nested_data, 'expected_cost', 'expected_cost')
-        if expected_cost_val is not None:
-                vals['expected_cost'] = float(expected_cost_val)
-        else:
-            _logger.warning("BTD_PROCESS: Expected cost not found in submission data. Using default value.")
-            vals['expected_cost'] = 0.0
+        # Driver's license uploads are file components, handled outside the mapping
+        if vals.get('use_rental_car'):
+            # The form uses 'drivers_license_file'; the other keys are older naming conventions
+            license_data = None
+            for license_key in ('drivers_license_file', 'drivers_license', 'rental_car_drivers_license'):
+                license_data = _lookup_submission_value(data_root, nested_data, license_key, license_key)
+                if license_data:
+                    break
+            self._extract_license_file(license_data, 'rental_car_drivers_license', vals, pending_files)
+        if vals.get('use_return_rental_car'):
+            return_license_data = _lookup_submission_value(data_root, nested_data, 'return_rental_car_drivers_license', 'return_rental_car_drivers_license')
+            self._extract_license_file(return_license_data, 'return_rental_car_drivers_license', vals, pending_files)
 
         # Currency
         currency_id_val_str = self._extract_field_value(data_root, nested_data, 'currency', 'currency')
@@ -814,78 +881,145 @@ class BusinessTripData(models.Model):
             _logger.warning("BTD_PROCESS: Currency not found in submission data. Using default currency.")
             vals['currency_id'] = self.env.company.currency_id.id
 
-        _logger.info(f"BTD_PROCESS: Final vals before writing: {vals}")
-        try:
-            # Disable tracking for automated field updates to avoid individual log entries
-            self.with_context(tracking_disable=True).write(vals)
-            _logger.info(f"BTD_PROCESS: Successfully updated BusinessTripData record {self.id}.")
+        return vals
 
-        except Exception as e:
-            _logger.error(f"BTD_PROCESS: Error updating BusinessTripData record {self.id}: {e}", exc_info=True)
-            raise
+    def _extract_license_file(self, license_data, field_name, vals, pending_files):
+        """
+        Queues the first base64 file of a Form.io file component for field_name
+        and sets its '_filename' companion in vals.
+        """
+        if not (license_data and isinstance(license_data, list) and license_data[0]):
+            return
+        file_info = license_data[0]
+        if not (isinstance(file_info, dict) and (file_info.get('storage') == 'base64' or file_info.get('attachment_id'))):
+            _logger.warning(f"BTD_PROCESS: {field_name} data found but not in expected format (dict with storage='base64'): {list(file_info) if isinstance(file_info, dict) else file_info}")
+            return
 
-        _logger.info("BTD_PROCESS: process_submission_data completed successfully.")
+        if self._queue_submission_file(pending_files, file_info, field_name):
+            vals[f'{field_name}_filename'] = file_info.get('originalName') or file_info.get('name')
+        else:
+            _logger.warning(f"BTD_PROCESS: {field_name} data found, but no base64 string in 'url' or 'base64' keys: {list(file_info)}")
+
+    def _queue_submission_file(self, pending_files, file_info, field_name, person_index=None):
+        """
+        Queues the file carried by a Form.io file dict to be stored in field_name,
+        on this record or, with person_index, on the n-th accompanying person
+        created from the vals. Returns False when the dict holds no file.
+        """
+        payload, attachment_id = _get_file_reference(file_info)
+        if not (payload or attachment_id):
+            return False
+        pending_files.append({
+            'field': field_name,
+            'file_info': file_info,
+            'person_index': person_index,
+        })
         return True
 
+    def _reset_accompanying_persons(self, pending_files):
+        """
+        Deletes the accompanying persons before they are re-created from the vals.
+
+        A queued identity document whose attachment no longer exists would be lost
+        with its person: the document stored on the current person at the same
+        index is moved to this record instead, and the Form.io file dict is pointed
+        to it. Returns True when the submission was modified.
+        """
+        self.ensure_one()
+        Attachment = self.env['ir.attachment'].sudo()
+        persons = self.accompanying_person_ids.sorted('id')
+        submission_modified = False
+        for pending in pending_files:
+            index = pending['person_index']
+            if index is None or index >= len(persons):
+                continue
+            payload, attachment_id = _get_file_reference(pending['file_info'])
+            if payload or Attachment.browse(attachment_id).exists():
+                continue
+            document = Attachment.search([
+                ('res_model', '=', persons._name),
+                ('res_field', '=', pending['field']),
+                ('res_id', '=', persons[index].id),
+            ], limit=1)
+            if not document:
+                continue
+            document.write({
+                'name': pending['file_info'].get('originalName') or pending['file_info'].get('name') or pending['field'],
+                'res_model': self._name,
+                'res_field': False,
+                'res_id': self.id,
+            })
+            pending['file_info'].update({'storage': 'url', 'url': f'/web/content/{document.id}', 'attachment_id': document.id})
+            submission_modified = True
+        persons.unlink()
+        return submission_modified
+
+    def _store_submission_files(self, pending_files):
+        """
+        Stores the files queued by _prepare_submission_vals, after the vals were written.
+
+        Each base64 payload is decoded slice by slice into one ir.attachment kept on
+        this record, and the binary field's attachment shares its stored file. The
+        Form.io file dict is then rewritten in place to point to that attachment, so
+        the submission no longer carries the base64 and re-processing it reuses the
+        stored file. An orphaned attachment referenced by the dict (uploaded through
+        the controller) is attached to this record, so the cleanup job keeps it.
+        When the referenced attachment no longer exists, the binary field is left
+        as it is. Returns True when the submission was modified.
+        """
+        self.ensure_one()
+        Attachment = self.env['ir.attachment'].sudo()
+        persons = self.accompanying_person_ids.sorted('id')
+        submission_modified = False
+        for pending in pending_files:
+            file_info = pending['file_info']
+            payload, attachment_id = _get_file_reference(file_info)
+            source = Attachment.browse(attachment_id).exists() if attachment_id else Attachment
+            if source and source.res_model == self._name and not source.res_id and not source.res_field:
+                source.write({'res_id': self.id})
+            if not source:
+                if not payload:
+                    _logger.warning(f"BTD_PROCESS: Attachment {attachment_id} referenced by the submission no longer exists, {pending['field']} kept as it is.")
+                    continue
+                source = Attachment.create({
+                    'name': file_info.get('originalName') or file_info.get('name') or pending['field'],
+                    'res_model': self._name,
+                    'res_id': self.id,
+                    'raw': _decode_base64_payload(payload),
+                })
+                file_info.pop('base64', None)
+                file_info.update({'storage': 'url', 'url': f'/web/content/{source.id}', 'attachment_id': source.id})
+                submission_modified = True
+
+            target = persons[pending['person_index']] if pending['person_index'] is not None else self
+            _link_binary_attachment(target, pending['field'], source)
+        return submission_modified
+
     def _extract_field_value(self, data_root, nested_data, root_key, nested_key, is_boolean=False, is_integer=False, is_float=False, is_date=False, default_value=None):
         """
         Helper to extract value: checks root first for the full key, then the nested 'data' object
         for the partial key. This supports both flat and nested structures.
+        Uses the same converters as the compiled SUBMISSION_FIELDS mapping.
         """
-        raw_value = default_value
-        source = "default"
-
-        # 1. Prioritize root-level key (e.g., 'rental_car_pickup_date')
-        if root_key in data_root and data_root[root_key] is not None and data_root[root_key] != '':
-            raw_value = data_root[root_key]
-            source = f"root ('{root_key}')"
-        # 2. Fallback to nested key inside 'data' object (e.g., 'data.rental_car.pickup_date')
-        elif nested_data and nested_key in nested_data and nested_data[nested_key] is not None and nested_data[nested_key] != '':
-            raw_value = nested_data[nested_key]
-            source = f"nested ('data.{nested_key}')"
-
-        if raw_value is None or raw_value == '':
-             _logger.info(f"BTD_PROCESS_EXTRACT: Field '{root_key}' (or 'data.{nested_key}') not found or empty. Returning default: {default_value}")
-             return default_value
+        raw_value = _lookup_submission_value(data_root, nested_data, root_key, nested_key)
+        if raw_value is None:
+            return default_value
+
+        if is_boolean:
+            converter = _SUBMISSION_CONVERTERS['bool']
+        elif is_integer:
+            converter = _SUBMISSION_CONVERTERS['int']
+        elif is_float:
+            converter = _SUBMISSION_CONVERTERS['float']
+        elif is_date:
+            converter = _SUBMISSION_CONVERTERS['date']
+        else:
+            return raw_value
 
         try:
-            if is_boolean:
-                # Handles "true", "false", true, false, 1, 0, "on", "off"
-                if isinstance(raw_value, str):
-                    val_lower = raw_value.lower()
-                    if val_lower in ["true", "on", "yes", "1"]: return True
-                    if val_lower in ["false", "off", "no", "0"]: return False
-                return bool(raw_value) # Fallback to standard bool conversion
-            elif is_integer:
-                return int(raw_value)
-            elif is_float:
-                return float(raw_value)
-            elif is_date:
-                # Attempt to parse date from common formats
-                if isinstance(raw_value, str):
-                    # Handle "MM/DD/YYYY" and "YYYY-MM-DD"
-                    parsed_date = None
-                    try:
-                        parsed_date = datetime.strptime(raw_value, '%m/%d/%Y').date()
-                    except ValueError:
-                        try:
-                            parsed_date = datetime.strptime(raw_value, '%Y-%m-%d').date()
-                        except ValueError:
-                            _logger.warning(f"BTD_PROCESS_EXTRACT: Could not parse date '{raw_value}' for key '{root_key}'. Supported formats: MM/DD/YYYY, YYYY-MM-DD.")
-                            return default_value
-                    _logger.info(f"BTD_PROCESS_EXTRACT: Field '{root_key}' from {source} with raw value '{raw_value}' parsed to date: {parsed_date}")
-                    return parsed_date
-                elif isinstance(raw_value, date): # Already a date object
-                     _logger.info(f"BTD_PROCESS_EXTRACT: Field '{root_key}' from {source} with raw value '{raw_value}' is already date type.")
-                     return raw_value
-                else:
-                    _logger.warning(f"BTD_PROCESS_EXTRACT: Date field '{root_key}' from {source} is not a string or date object: {raw_value} (type: {type(raw_value)}).")
-                    return default_value
-            else: # String or other
-                _logger.info(f"BTD_PROCESS_EXTRACT: Field '{root_key}' from {source} with raw value '{raw_value}' extracted as string/original type.")
-                return raw_value
+            return converter(raw_value)
         except (ValueError, TypeError) as e:
-            _logger.warning(f"BTD_PROCESS_EXTRACT: Could not parse value '{raw_value}' for field '{root_key}' from source '{source}'. Error: {e}. Using default value: {default_value}")
+            _logger.warning(f"BTD_PROCESS_EXTRACT: Could not parse value '{raw_value}' for field '{root_key}'. Error: {e}. Using default value: {default_value}")
             return default_value
 
     @api.model_create_multi
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api, tools
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Selections shared by the persistent plan lines and the planning wizard items
+PLAN_ITEM_TYPES = [
+    ('transport_air', 'Air Travel'),
+    ('transport_train', 'Train Travel'),
+    ('transport_bus', 'Bus Travel'),
+    ('transport_car', 'Car Rental'),
+    ('transport_taxi', 'Taxi/Local Transport'),
+    ('transport_other', 'Other Transportation'),
+    ('accommodation', 'Accommodation'),
+    ('accommodation_airbnb', 'Airbnb/Rental'),
+    ('meals', 'Meals'),
+    ('meals_per_diem', 'Per Diem Allowance'),
+    ('visa_fee', 'Visa Fee'),
+    ('conference', 'Conference/Event Fee'),
+    ('parking', 'Parking'),
+    ('insurance', 'Travel Insurance'),
+    ('internet', 'Internet/Communication'),
+    ('translation', 'Translation Services'),
+    ('entertainment', 'Entertainment/Activities'),
+    ('shopping', 'Shopping Allowance'),
+    ('currency_exchange', 'Currency Exchange Fee'),
+    ('other', 'Other'),
+    ('custom', 'Custom Item'),
+]
+
+PLAN_DIRECTIONS = [
+    ('outbound', 'Outbound'),
+    ('inbound', 'Return'),
+    ('local', 'Local'),
+    ('transit', 'Transit/Connection'),
+    ('round_trip', 'Round Trip'),
+    ('na', 'N/A')
+]
+
+PLAN_TRAVEL_CLASSES = [
+    ('economy', 'Economy'),
+    ('business', 'Business'),
+    ('first', 'First Class'),
+    ('premium', 'Premium Economy'),
+    ('standard', 'Standard'),
+    ('other', 'Other')
+]
+
+PLAN_ACCOMMODATION_TYPES = [
+    ('hotel', 'Hotel'),
+    ('airbnb', 'Airbnb/Vacation Rental'),
+    ('corporate', 'Corporate Housing'),
+    ('hostel', 'Hostel'),
+    ('guesthouse', 'Guesthouse'),
+    ('relatives', 'Relatives/Friends'),
+    ('other', 'Other')
+]
+
+PLAN_COST_STATUSES = [
+    ('estimated', 'Estimated'),
+    ('quoted', 'Quoted'),
+    ('confirmed', 'Confirmed'),
+    ('paid', 'Paid'),
+    ('to_reimburse', 'To Reimburse')
+]
+
+PLAN_PAYMENT_METHODS = [
+    ('company', 'Company Paid'),
+    ('employee', 'Employee Paid (Reimbursable)'),
+    ('cash_advance', 'Cash Advance'),
+    ('per_diem', 'Per Diem'),
+    ('company_card', 'Company Card')
+]
+
+# Keys of an item in business.trip.structured_plan_items_json, which are also
+# the field names of business.trip.plan.line and business.trip.plan.line.item
+PLAN_ITEM_KEYS = [
+    'item_type', 'custom_type', 'direction', 'description', 'item_date',
+    'from_location', 'to_location', 'carrier', 'reference_number',
+    'departure_time', 'arrival_time', 'travel_class', 'nights', 'accommodation_type',
+    'cost', 'cost_status', 'is_reimbursable', 'payment_method', 'notes', 'item_data_json',
+]
+
+
+class BusinessTripPlanLine(models.Model):
+    """
+    One item of the organizer plan of a business trip.
+
+    The lines are kept in sync with business.trip.structured_plan_items_json,
+    which stays the format the planning wizard exchanges, so plans can be
+    searched and their costs aggregated (read_group, SQL) across trips.
+    """
+    _name = 'business.trip.plan.line'
+    _description = 'Business Trip Plan Line'
+    _order = 'trip_id, sequence, item_date, id'
+
+    trip_id = fields.Many2one('business.trip', string='Business Trip', required=True, ondelete='cascade', index=True)
+    sequence = fields.Integer(string='Sequence', default=10)
+    item_type = fields.Selection(PLAN_ITEM_TYPES, string='Item Type', required=True, index=True)
+    custom_type = fields.Char(string='Custom Item Type')
+    direction = fields.Selection(PLAN_DIRECTIONS, string='Direction', default='na')
+    description = fields.Char(string='Description')
+    item_date = fields.Date(string='Date', index=True)
+    from_location = fields.Char(string='From')
+    to_location = fields.Char(string='To')
+    carrier = fields.Char(string='Carrier/Provider', index=True)
+    reference_number = fields.Char(string='Reference/Booking Number')
+    departure_time = fields.Float(string='Departure Time')
+    arrival_time = fields.Float(string='Arrival Time')
+    travel_class = fields.Selection(PLAN_TRAVEL_CLASSES, string='Travel Class')
+    nights = fields.Integer(string='Nights')
+    accommodation_type = fields.Selection(PLAN_ACCOMMODATION_TYPES, string='Accommodation Type')
+    cost = fields.Monetary(string='Cost', currency_field='currency_id')
+    currency_id = fields.Many2one('res.currency', string='Currency', related='trip_id.currency_id', store=True, readonly=True)
+    cost_status = fields.Selection(PLAN_COST_STATUSES, string='Cost Status', default='estimated')
+    is_reimbursable = fields.Boolean(string='Reimbursable', default=True)
+    payment_method = fields.Selection(PLAN_PAYMENT_METHODS, string='Payment Method', default='company')
+    notes = fields.Text(string='Notes')
+    # Type-specific details of the wizard widgets (flight number, room type...)
+    item_data_json = fields.Text(string='Item Details (JSON)')
+
+    def init(self):
+        # Spend per item type over a period ("air travel this quarter")
+        tools.create_index(self._cr, 'business_trip_plan_line_item_type_item_date_index',
+                           self._table, ['item_type', 'item_date'])
+
+    @api.model
+    def _prepare_line_vals(self, trip, item, sequence=10):
+        """Converts an item of structured_plan_items_json into plan line vals."""
+        item_type = item.get('item_type')
+        custom_type = item.get('custom_type')
+        if item_type not in dict(PLAN_ITEM_TYPES):
+            # Types removed from the selection are kept as custom items
+            item_type, custom_type = 'custom', custom_type or item_type
+        return {
+            'trip_id': trip.id,
+            'sequence': sequence,
+            'item_type': item_type,
+            'custom_type': custom_type,
+            'direction': item.get('direction') if item.get('direction') in dict(PLAN_DIRECTIONS) else 'na',
+            'description': item.get('description'),
+            'item_date': fields.Date.to_date(item.get('item_date')) if item.get('item_date') else False,
+            'from_location': item.get('from_location'),
+            'to_location': item.get('to_location'),
+            'carrier': item.get('carrier'),
+            'reference_number': item.get('reference_number'),
+            'departure_time': float(item.get('departure_time') or 0.0),
+            'arrival_time': float(item.get('arrival_time') or 0.0),
+            'travel_class': item.get('travel_class') if item.get('travel_class') in dict(PLAN_TRAVEL_CLASSES) else False,
+            'nights': int(item.get('nights') or 0),
+            'accommodation_type': item.get('accommodation_type') if item.get('accommodation_type') in dict(PLAN_ACCOMMODATION_TYPES) else False,
+            'cost': float(item.get('cost') or 0.0),
+            'cost_status': item.get('cost_status') if item.get('cost_status') in dict(PLAN_COST_STATUSES) else 'estimated',
+            'is_reimbursable': item.get('is_reimbursable', True),
+            'payment_method': item.get('payment_method') if item.get('payment_method') in dict(PLAN_PAYMENT_METHODS) else 'company',
+            'notes': item.get('notes'),
+            'item_data_json': item.get('item_data_json'),
+        }
+
+    def _prepare_wizard_item_vals(self):
+        """Values of a business.trip.plan.line.item of the planning wizard for this line."""
+        self.ensure_one()
+        return {key: self[key] for key in PLAN_ITEM_KEYS}
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Uploads per hour allowed when neither the user nor its groups set a limit
+UPLOAD_RATE_LIMIT_PARAM = 'custom_business_trip_management.upload_rate_limit'
+DEFAULT_UPLOAD_RATE_LIMIT = 50
+UPLOAD_RATE_PERIOD = 3600
+
+class BusinessTripRateLimit(models.Model):
+    """
+    Token buckets shared by all workers, one row per key.
+
+    A bucket holds up to capacity tokens and refills continuously at
+    capacity / period tokens per second. The refill is computed from the time
+    elapsed since the last update, so taking a token is a single upsert,
+    whatever the number of past events.
+    """
+    _name = 'business.trip.rate.limit'
+    _description = 'Business Trip Rate Limit Bucket'
+    _log_access = False
+
+    key = fields.Char(string='Key', required=True)
+    tokens = fields.Float(string='Tokens')
+    updated_at = fields.Datetime(string='Updated At')
+
+    _sql_constraints = [
+        ('key_unique', 'unique(key)', 'A rate limit bucket already exists for this key.'),
+    ]
+
+    @api.model
+    def _take(self, key, capacity, period=UPLOAD_RATE_PERIOD):
+        """
+        Takes one token from the bucket key, creating it full if needed, when
+        it holds at least one. Checking and taking is one conditional upsert,
+        which locks the row, so concurrent requests cannot overdraw the bucket.
+        The lock is held until commit: call it in a short transaction of its own.
+        Returns the tokens left, or None when the bucket is empty.
+        """
+        if capacity < 1:
+            return None
+        self.env.cr.execute("""
+            INSERT INTO business_trip_rate_limit (key, tokens, updated_at)
+                 VALUES (%(key)s, %(capacity)s - 1, now() AT TIME ZONE 'UTC')
+            ON CONFLICT (key) DO UPDATE
+                    SET tokens = LEAST(%(capacity)s, business_trip_rate_limit.tokens
+                                       + EXTRACT(EPOCH FROM (EXCLUDED.updated_at - business_trip_rate_limit.updated_at)) * %(rate)s) - 1,
+                        updated_at = EXCLUDED.updated_at
+                  WHERE LEAST(%(capacity)s, business_trip_rate_limit.tokens
+                              + EXTRACT(EPOCH FROM (EXCLUDED.updated_at - business_trip_rate_limit.updated_at)) * %(rate)s) >= 1
+              RETURNING tokens
+        """, {'key': key, 'capacity': capacity, 'rate': capacity / period})
+        row = self.env.cr.fetchone()
+        return row[0] if row else None
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+from odoo import models, api
+import json
+import logging
+import time
+
+_logger = logging.getLogger(__name__)
+
+# ir.config_parameter holding the checkpoint and counters of the queued re-processing job.
+# The parameter only exists while a job is pending.
+REPROCESS_STATE_PARAM = 'custom_business_trip_management.reprocess_state'
+
+class BusinessTripReprocess(models.AbstractModel):
+    _name = 'business.trip.reprocess'
+    _description = 'Bulk Re-processing of Business Trip Submission Data'
+
+    def _get_reprocess_domain(self):
+        return [('submission_data', '!=', False), ('state', '=', 'COMPLETE')]
+
+    def _get_reprocess_state(self):
+        raw_state = self.env['ir.config_parameter'].sudo().get_param(REPROCESS_STATE_PARAM)
+        return json.loads(raw_state) if raw_state else {}
+
+    def _set_reprocess_state(self, state):
+        # set_param with a falsy value removes the parameter, marking the job as done
+        self.env['ir.config_parameter'].sudo().set_param(REPROCESS_STATE_PARAM, json.dumps(state) if state else False)
+
+    @api.model
+    def enqueue_reprocess(self):
+        """
+        Queues the re-processing of every completed form and wakes up the cron job.
+        If a job is already pending, it is left untouched and its state is returned.
+        """
+        state = self._get_reprocess_state()
+        if state:
+            _logger.info(f"REPROCESS: Job already queued, {state['processed']}/{state['total']} forms processed so far.")
+            return state
+
+        total = self.env['formio.form'].search_count(self._get_reprocess_domain())
+        state = {'last_form_id': 0, 'processed': 0, 'errors': 0, 'total': total}
+        self._set_reprocess_state(state)
+        self.env.ref('custom_business_trip_management.ir_cron_reprocess_submission_data')._trigger()
+        _logger.info(f"REPROCESS: Queued re-processing of {total} forms.")
+        return state
+
+    def _cron_reprocess_submission_data(self, batch_size=200, time_budget=240):
+        """
+        Re-processes the submission data of the queued forms in chunks of batch_size,
+        ordered by id. The checkpoint and counters are committed after every chunk,
+        so an interrupted run resumes where it stopped. When the time budget (in
+        seconds) is exhausted the job re-triggers itself and returns.
+        """
+        state = self._get_reprocess_state()
+        if not state:
+            return True
+
+        started_at = time.monotonic()
+        Form = self.env['formio.form']
+        while True:
+            forms = Form.search(self._get_reprocess_domain() + [('id', '>', state['last_form_id'])], order='id', limit=batch_size)
+            if not forms:
+                _logger.info(f"REPROCESS: Re-processing complete. Processed: {state['processed']}, Errors: {state['errors']}")
+                self._set_reprocess_state(False)
+                self.env.cr.commit()
+                return True
+
+            processed, errors = self._reprocess_forms(forms)
+            state['processed'] += processed
+            state['errors'] += errors
+            state['last_form_id'] = forms[-1].id
+            self._set_reprocess_state(state)
+            self.env.cr.commit()
+            _logger.info(f"REPROCESS: Progress {state['processed'] + state['errors']}/{state['total']} forms "
+                         f"({state['errors']} errors), checkpoint at form {state['last_form_id']}.")
+
+            if time.monotonic() - started_at > time_budget:
+                self.env.ref('custom_business_trip_management.ir_cron_reprocess_submission_data')._trigger()
+                return True
+
+    def _reprocess_forms(self, forms):
+        """
+        Re-extracts the submission data of forms into their business.trip.data records.
+        Trip data is resolved with one query and missing records are created in one call.
+        The extracted vals differ per form, so each record is written on its own, in a
+        savepoint so a failing record does not abort the chunk.
+        Returns a (processed, errors) tuple.
+        """
+        TripData = self.env['business.trip.data'].with_context(tracking_disable=True)
+        trip_data_by_form = forms._get_trip_data_by_form()
+        forms_without_data = forms.filtered(lambda form: form.id not in trip_data_by_form)
+        if forms_without_data:
+            new_trip_data = TripData.create([{'form_id': form.id} for form in forms_without_data])
+            for trip_data in new_trip_data:
+                trip_data_by_form[trip_data.form_id.id] = trip_data
+
+        errors = 0
+        for form in forms:
+            trip_data = trip_data_by_form[form.id]
+            pending_files = []
+            try:
+                with self.env.cr.savepoint():
+                    submission = json.loads(form.submission_data)
+                    vals = trip_data._prepare_submission_vals(submission, pending_files)
+                    if vals is False:
+                        continue
+                    # Same reset as process_submission_data before re-creating the persons
+                    submission_modified = trip_data._reset_accompanying_persons(pending_files)
+                    trip_data.with_context(tracking_disable=True).write(vals)
+                    if trip_data._store_submission_files(pending_files):
+                        submission_modified = True
+                    if submission_modified:
+                        form.write({'submission_data': json.dumps(submission)})
+            except Exception as e:
+                errors += 1
+                _logger.error(f"REPROCESS: Error re-processing form {form.id}: {e}", exc_info=True)
+
+        return len(forms) - errors, errors
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api, tools
+from odoo.exceptions import UserError
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+from datetime import timedelta
+from .ir_attachment import _hash_file
+
+_logger = logging.getLogger(__name__)
+
+# Upload size cap in MB, set from the Business Trip settings
+UPLOAD_MAX_SIZE_PARAM = 'custom_business_trip_management.upload_max_size_mb'
+DEFAULT_UPLOAD_MAX_SIZE_MB = 10
+# Largest chunk accepted by one request of the chunked upload protocol
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Number of bytes read from the request stream at a time
+UPLOAD_READ_BLOCK_SIZE = 64 * 1024
+# Digest a client must send to prove it holds content already stored: HMAC of the
+# whole file keyed with a nonce of the session
+PROOF_ALGORITHM = 'hmac-sha256'
+
+class BusinessTripUpload(models.Model):
+    _name = 'business.trip.upload'
+    _description = 'Business Trip Upload Session'
+
+    name = fields.Char(string='Filename', required=True)
+    token = fields.Char(string='Upload Token', required=True, readonly=True, index=True, copy=False,
+                        default=lambda self: secrets.token_hex(16))
+    user_id = fields.Many2one('res.users', string='User', required=True, index=True, ondelete='cascade',
+                              default=lambda self: self.env.user)
+    total_size = fields.Integer(string='Total Size')
+    received_size = fields.Integer(string='Received Size', default=0)
+    mimetype = fields.Char(string='Detected MIME Type')
+    sha256 = fields.Char(string='SHA-256')
+    checksum = fields.Char(string='Checksum (SHA-1)')
+    # Known content: the client proves it holds the file by sending an HMAC of it keyed
+    # with a one-time nonce instead of the whole file (the SHA-256 alone would give its
+    # content away). A nonce is issued whether or not the content is known.
+    source_attachment_id = fields.Many2one('ir.attachment', string='Known Content', ondelete='set null')
+    proof_nonce = fields.Char(string='Proof Nonce', copy=False)
+    content_proven = fields.Boolean(string='Content Proven', default=False)
+
+    _sql_constraints = [
+        ('token_unique', 'unique(token)', 'The upload token must be unique.'),
+    ]
+
+    @api.model
+    def _get_max_upload_size(self):
+        """Returns the upload size cap in bytes."""
+        max_size_mb = self.env['ir.config_parameter'].sudo().get_param(UPLOAD_MAX_SIZE_PARAM)
+        try:
+            max_size_mb = int(max_size_mb) if max_size_mb else DEFAULT_UPLOAD_MAX_SIZE_MB
+        except ValueError:
+            max_size_mb = DEFAULT_UPLOAD_MAX_SIZE_MB
+        return max(max_size_mb, 1) * 1024 * 1024
+
+    @api.model
+    def _get_spool_dir(self):
+        spool_dir = os.path.join(tools.config['data_dir'], 'business_trip_uploads', self.env.cr.dbname)
+        os.makedirs(spool_dir, exist_ok=True)
+        return spool_dir
+
+    def _get_spool_path(self):
+        self.ensure_one()
+        return os.path.join(self._get_spool_dir(), f'{self.token}.part')
+
+    def write_chunk(self, offset, stream, length, chunk_sha256=None):
+        """
+        Writes length bytes read from stream at offset of the spooled file.
+
+        Chunks must be sent in order: offset may not be past the received size, and
+        a chunk re-sent at an earlier offset (a retry after a dropped connection)
+        overwrites what followed it. The chunk is read by blocks and hashed while it
+        is written; when chunk_sha256 is given and does not match, the chunk is
+        discarded. Returns the new received size.
+        """
+        self.ensure_one()
+        if offset < 0 or offset > self.received_size:
+            raise UserError(f"Unexpected chunk offset {offset}, {self.received_size} bytes received so far.")
+        if length <= 0 or length > UPLOAD_CHUNK_SIZE:
+            raise UserError(f"Chunks must contain between 1 and {UPLOAD_CHUNK_SIZE} bytes.")
+        if offset + length > self.total_size:
+            raise UserError("Chunk goes past the announced file size.")
+
+        spool_path = self._get_spool_path()
+        sha256 = hashlib.sha256()
+        written = 0
+        with open(spool_path, 'r+b' if os.path.exists(spool_path) else 'wb') as spool:
+            spool.seek(offset)
+            while written < length:
+                block = stream.read(min(UPLOAD_READ_BLOCK_SIZE, length - written))
+                if not block:
+                    break
+                sha256.update(block)
+                spool.write(block)
+                written += len(block)
+            spool.truncate()
+
+        if written != length:
+            raise UserError(f"Incomplete chunk: {written} of {length} bytes received.")
+        if chunk_sha256 and sha256.hexdigest() != chunk_sha256.lower():
+            raise UserError("Chunk checksum mismatch.")
+        self.received_size = offset + written
+        return self.received_size
+
+    def spool_stream(self, stream, head=b''):
+        """
+        Spools a whole file stream (single request upload) by blocks, head being
+        the bytes already read from it. The SHA-256 and the filestore checksum are
+        computed while the stream is read, so the file is not read again.
+        The total size is the number of bytes read; reading stops with a UserError
+        once the upload size cap is exceeded.
+        """
+        self.ensure_one()
+        max_size = self._get_max_upload_size()
+        sha256 = hashlib.sha256()
+        sha1 = hashlib.sha1()
+        written = 0
+        with open(self._get_spool_path(), 'wb') as spool:
+            block = head or stream.read(UPLOAD_READ_BLOCK_SIZE)
+            while block:
+                written += len(block)
+                if written > max_size:
+                    raise UserError("File is too large.")
+                sha256.update(block)
+                sha1.update(block)
+                spool.write(block)
+                block = stream.read(UPLOAD_READ_BLOCK_SIZE)
+        self.write({
+            'total_size': written,
+            'received_size': written,
+            'sha256': sha256.hexdigest(),
+            'checksum': sha1.hexdigest(),
+        })
+        return written
+
+    def read_prefix(self, size):
+        """Returns the first size bytes of the spooled file."""
+        self.ensure_one()
+        with open(self._get_spool_path(), 'rb') as spool:
+            return spool.read(size)
+
+    def compute_digests(self):
+        """
+        Hashes a chunked upload once it is complete. Hash states cannot be carried
+        from one request to the next, so the spooled file is read once by blocks for
+        both the SHA-256 and the filestore checksum. A SHA-256 announced by the client
+        when opening the session must match. Returns the SHA-256.
+        """
+        self.ensure_one()
+        file_size, checksum, sha256 = _hash_file(self._get_spool_path(), 'sha1', 'sha256')
+        if file_size != self.total_size:
+            raise UserError(f"Upload incomplete: {file_size} of {self.total_size} bytes received.")
+        if self.sha256 and self.sha256.lower() != sha256:
+            raise UserError("File checksum mismatch.")
+        self.write({'sha256': sha256, 'checksum': checksum})
+        return sha256
+
+    def _request_content_proof(self, source):
+        """
+        Issues the one-time nonce the client must key the HMAC of its file with,
+        and links the session to the already stored content of source, if any.
+        The challenge is the same whether or not source is set, so the response
+        does not tell the client whether the content is known. Returns it as a dict.
+        """
+        self.ensure_one()
+        self.write({
+            'source_attachment_id': source.id,
+            'proof_nonce': secrets.token_hex(32),
+        })
+        return {'algorithm': PROOF_ALGORITHM, 'nonce': self.proof_nonce}
+
+    def check_content_proof(self, stream, length):
+        """
+        Compares the HMAC sent by the client with the HMAC of the stored content,
+        keyed with the session nonce. The stored file is read by blocks. On success
+        the upload is complete without any chunk: its attachment will share the
+        stored file. Returns whether the proof is valid.
+        """
+        self.ensure_one()
+        nonce = self.proof_nonce
+        # One proof attempt per session
+        self.proof_nonce = False
+        # Hex digest of the HMAC-SHA256
+        if not nonce or length != 64:
+            return False
+        received = stream.read(length).decode('ascii', 'replace').lower()
+        source = self.source_attachment_id.sudo()
+        if not source:
+            return False
+        expected = hmac.new(nonce.encode(), digestmod=hashlib.sha256)
+        with open(source._full_path(source.store_fname), 'rb') as stored_file:
+            for block in iter(lambda: stored_file.read(UPLOAD_READ_BLOCK_SIZE), b''):
+                expected.update(block)
+        if not hmac.compare_digest(received, expected.hexdigest()):
+            return False
+        self.write({
+            'content_proven': True,
+            'received_size': self.total_size,
+            'mimetype': self.mimetype or source.mimetype,
+            'checksum': source.checksum,
+        })
+        return True
+
+    def create_attachment(self, vals):
+        """
+        Creates the ir.attachment of a complete, hashed upload from its spooled file,
+        or sharing the stored content the client proved it holds, as the uploading
+        user, and closes the session.
+        """
+        self.ensure_one()
+        if self.received_size != self.total_size:
+            raise UserError(f"Upload incomplete: {self.received_size} of {self.total_size} bytes received.")
+        Attachment = self.env['ir.attachment'].with_user(self.user_id)
+        if self.content_proven and self.source_attachment_id:
+            attachment = Attachment._business_trip_create_shared(
+                dict(vals, name=vals.get('name') or self.name), self.source_attachment_id.sudo())
+            self.unlink()
+            return attachment
+        if not self.checksum:
+            self.compute_digests()
+        vals = dict(vals, name=vals.get('name') or self.name, business_trip_sha256=self.sha256)
+        attachment = Attachment._business_trip_create_from_spool(
+            vals, self._get_spool_path(), checksum=self.checksum, file_size=self.total_size)
+        self.unlink()
+        return attachment
+
+    def unlink(self):
+        spool_paths = [upload._get_spool_path() for upload in self]
+        res = super(BusinessTripUpload, self).unlink()
+        for spool_path in spool_paths:
+            try:
+                os.unlink(spool_path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                _logger.warning(f"Could not remove upload spool file {spool_path}: {e}")
+        return res
+
+    @api.model
+    def _gc_expired_uploads(self, older_than_hours=24):
+        """Removes the upload sessions (and spooled files) left unfinished."""
+        cutoff_date = fields.Datetime.now() - timedelta(hours=older_than_hours)
+        expired_uploads = self.sudo().search([('write_date', '<', cutoff_date)])
+        if expired_uploads:
+            _logger.info(f"Removing {len(expired_uploads)} expired business trip upload sessions.")
+            expired_uploads.unlink()
+        return True
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from odoo import models, api, tools
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# ir.config_parameter pinning the builder used for new business trip forms.
+# Holds a builder id (set from the settings) or an XML id.
+BUSINESS_TRIP_BUILDER_PARAM = 'custom_business_trip_management.business_trip_builder'
+BUSINESS_TRIP_BUILDER_NAME = 'Business Trip Form'
+
+class FormioBuilder(models.Model):
+    _inherit = 'formio.builder'
+
+    @api.model
+    def _get_business_trip_builder(self):
+        """
+        Returns the formio.builder used to create business trip forms (possibly empty).
+
+        Resolution order:
+        1. the builder pinned in the BUSINESS_TRIP_BUILDER_PARAM config parameter,
+        2. the CURRENT version of the builder named BUSINESS_TRIP_BUILDER_NAME,
+        3. the CURRENT builder of the sale.order model.
+        Pinning a builder makes switching to a new form version an explicit setting.
+        The result is cached per registry and invalidated when builders are written.
+        """
+        return self.browse(self.sudo()._get_business_trip_builder_id())
+
+    @tools.ormcache()
+    def _get_business_trip_builder_id(self):
+        pinned = self.env['ir.config_parameter'].sudo().get_param(BUSINESS_TRIP_BUILDER_PARAM)
+        if pinned:
+            if pinned.isdigit():
+                builder = self.browse(int(pinned)).exists()
+            else:
+                builder = self.env.ref(pinned, raise_if_not_found=False)
+            if builder and builder._name == self._name:
+                return builder.id
+            _logger.warning(f"Business trip builder '{pinned}' set in {BUSINESS_TRIP_BUILDER_PARAM} not found, falling back to lookup.")
+
+        builder = self.search([('name', '=', BUSINESS_TRIP_BUILDER_NAME), ('state', '=', 'CURRENT')], limit=1)
+        if not builder:
+            builder = self.search([('state', '=', 'CURRENT'), ('res_model_id.model', '=', 'sale.order')], limit=1)
+        return builder.id or False
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super(FormioBuilder, self).create(vals_list)
+        self.clear_caches()
+        return records
+
+    def write(self, vals):
+        res = super(FormioBuilder, self).write(vals)
+        self.clear_caches()
+        return res
+
+    def unlink(self):
+        res = super(FormioBuilder, self).unlink()
+        self.clear_caches()
+        return res
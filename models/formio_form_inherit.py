@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from datetime import datetime, date, timedelta
 from odoo.exceptions import ValidationError, UserError
 from dateutil.relativedelta import relativedelta
@@ -16,6 +16,48 @@ from odoo.osv import expression
 from odoo.tools.safe_eval import safe_eval
 
 _logger = logging.getLogger(__name__)
+
+# Display categories of the organizer plan tab, and the plan item types shown in each
+PLAN_DISPLAY_CATEGORIES = ('flight', 'hotel', 'train', 'car_rental', 'other')
+PLAN_ITEM_TYPE_CATEGORIES = {
+    'transport_air': 'flight',
+    'transport_train': 'train',
+    'transport_car': 'car_rental',
+    'transport_taxi': 'car_rental',
+    'accommodation': 'hotel',
+    'accommodation_airbnb': 'hotel',
+}
+# Statusbar phase shown for each business.trip trip_status (unlisted statuses show no phase)
+TRIP_STATUS_PHASE1 = {
+    'draft': 'draft',
+    'submitted': 'submitted',
+    'pending_organization': 'pending_organization',
+    'organization_done': 'organization_done',
+    'rejected': 'rejected',
+    'cancelled': 'cancelled',
+    # Special case for 'returned' status - show it explicitly when active
+    'returned': 'returned',
+    # When in phase two, keep showing 'organization_done' in phase one
+    'awaiting_trip_start': 'organization_done',
+    'in_progress': 'organization_done',
+    'completed_waiting_expense': 'organization_done',
+    'expense_submitted': 'organization_done',
+    'expense_returned': 'organization_done',
+    'completed': 'organization_done',
+}
+TRIP_STATUS_PHASE2 = {
+    'awaiting_trip_start': 'awaiting_trip_start',
+    'completed_waiting_expense': 'completed_waiting_expense',
+    'expense_submitted': 'expense_submitted',
+    'completed': 'completed',
+    # When in progress, show only in_progress (hide awaiting_trip_start)
+    'in_progress': 'in_progress',
+    # Only show expense_returned when it's the actual current status
+    'expense_returned': 'expense_returned',
+    # When organization is complete, show phase 2 with awaiting_trip_start as the initial status
+    'organization_done': 'awaiting_trip_start',
+}
+
 # Set logging level to INFO for this module to ensure all our custom logs are visible
 logging.getLogger('odoo.addons.custom_business_trip_management.models.formio_form_inherit').setLevel(logging.INFO)
 
@@ -33,11 +75,39 @@ class FormioForm(models.Model):
     def _filter_new_records(self):
         return self.filtered(lambda r: r.id and isinstance(r.id, int))
 
+    def _get_trip_data_by_form(self):
+        """
+        Resolves the business.trip.data record of every saved form in self
+        with a single query and returns a dict {form_id: business.trip.data}.
+
+        All returned records share one prefetch set, so reading a field on one
+        of them loads it for the whole batch. Computes that need the trip data
+        of their forms should use this instead of searching per record.
+        """
+        form_ids = [form_id for form_id in self.ids if isinstance(form_id, int)]
+        trip_data_by_form = {}
+        if not form_ids:
+            return trip_data_by_form
+
+        # Keep the lowest id per form, like the former search(..., limit=1)
+        # and the stored columns of _compute_trip_data_columns
+        trip_data_records = self.env['business.trip.data'].search([('form_id', 'in', form_ids)], order='id')
+        for trip_data in trip_data_records:
+            trip_data_by_form.setdefault(trip_data.form_id.id, trip_data)
+        return trip_data_by_form
+
     # Personal information fields are now stored in business.trip.data model
     # We keep only UI-specific and business logic fields in this model
     # --- The following fields are being moved to business.trip model ---
     # trip_status, user_id, manager_id, manager_comments, etc.
 
+    # Stored copies of the business.trip workflow columns the record rules and the
+    # status grouping of the views filter on. The role columns are only indexed
+    # through the (role, trip_status) composite indexes of init.
+    trip_status = fields.Selection(related='business_trip_id.trip_status', store=True, index=True, readonly=False)
+    manager_id = fields.Many2one(related='business_trip_id.manager_id', store=True, readonly=False)
+    organizer_id = fields.Many2one(related='business_trip_id.organizer_id', store=True, readonly=False)
+
     display_state = fields.Char(string='Display State', compute='_compute_display_fields')
 
     # Approvers and dates
@@ -100,39 +170,71 @@ class FormioForm(models.Model):
     actual_start_date_display = fields.Char(string="Actual Start Date (Display)", compute='_compute_actual_duration_and_dates_display', store=False)
     actual_end_date_display = fields.Char(string="Actual End Date (Display)", compute='_compute_actual_duration_and_dates_display', store=False)
 
-    # Transportation fields
-    use_rental_car = fields.Boolean(string='Use Rental Car', related='business_trip_id.business_trip_data_id.use_rental_car', readonly=True, store=False)
-    use_company_car = fields.Boolean(string='Use Company Car', related='business_trip_id.business_trip_data_id.use_company_car', readonly=True, store=False)
-    use_personal_car = fields.Boolean(string='Use Personal Car', related='business_trip_id.business_trip_data_id.use_personal_car', readonly=True, store=False)
-    use_train = fields.Boolean(string='Use Train', related='business_trip_id.business_trip_data_id.use_train', readonly=True, store=False)
-    use_airplane = fields.Boolean(string='Use Airplane', related='business_trip_id.business_trip_data_id.use_airplane', readonly=True, store=False)
-    use_bus = fields.Boolean(string='Use Bus', related='business_trip_id.business_trip_data_id.use_bus', readonly=True, store=False)
+    # Reverse link used to denormalize trip columns onto the form
+    business_trip_data_ids = fields.One2many('business.trip.data', 'form_id', string='Business Trip Data Records')
+
+    # Transportation fields (stored projection of business.trip.data, see _compute_trip_data_columns)
+    use_rental_car = fields.Boolean(string='Use Rental Car', compute='_compute_trip_data_columns', store=True, readonly=True)
+    use_company_car = fields.Boolean(string='Use Company Car', compute='_compute_trip_data_columns', store=True, readonly=True)
+    use_personal_car = fields.Boolean(string='Use Personal Car', compute='_compute_trip_data_columns', store=True, readonly=True)
+    use_train = fields.Boolean(string='Use Train', compute='_compute_trip_data_columns', store=True, readonly=True)
+    use_airplane = fields.Boolean(string='Use Airplane', compute='_compute_trip_data_columns', store=True, readonly=True)
+    use_bus = fields.Boolean(string='Use Bus', compute='_compute_trip_data_columns', store=True, readonly=True)
 
     # Return transportation fields
-    use_return_rental_car = fields.Boolean(string='Use Return Rental Car', related='business_trip_id.business_trip_data_id.use_return_rental_car', readonly=True, store=False)
-    use_return_company_car = fields.Boolean(string='Use Return Company Car', related='business_trip_id.business_trip_data_id.use_return_company_car', readonly=True, store=False)
-    use_return_personal_car = fields.Boolean(string='Use Return Personal Car', related='business_trip_id.business_trip_data_id.use_return_personal_car', readonly=True, store=False)
-    use_return_train = fields.Boolean(string='Use Return Train', related='business_trip_id.business_trip_data_id.use_return_train', readonly=True, store=False)
-    use_return_airplane = fields.Boolean(string='Use Return Airplane', related='business_trip_id.business_trip_data_id.use_return_airplane', readonly=True, store=False)
-    use_return_bus = fields.Boolean(string='Use Return Bus', related='business_trip_id.business_trip_data_id.use_return_bus', readonly=True, store=False)
-
-
-    # Related fields to business.trip.data - for display purposes
-    destination = fields.Char(string='Destination', related='business_trip_id.business_trip_data_id.destination', readonly=True, store=False)
-    purpose = fields.Char(string='Purpose', related='business_trip_id.business_trip_data_id.purpose', store=False, readonly=True)
-    travel_start_date = fields.Date(string='Start Date', related='business_trip_id.business_trip_data_id.travel_start_date', readonly=True, store=False)
-    travel_end_date = fields.Date(string='End Date', related='business_trip_id.business_trip_data_id.travel_end_date', readonly=True, store=False)
+    use_return_rental_car = fields.Boolean(string='Use Return Rental Car', compute='_compute_trip_data_columns', store=True, readonly=True)
+    use_return_company_car = fields.Boolean(string='Use Return Company Car', compute='_compute_trip_data_columns', store=True, readonly=True)
+    use_return_personal_car = fields.Boolean(string='Use Return Personal Car', compute='_compute_trip_data_columns', store=True, readonly=True)
+    use_return_train = fields.Boolean(string='Use Return Train', compute='_compute_trip_data_columns', store=True, readonly=True)
+    use_return_airplane = fields.Boolean(string='Use Return Airplane', compute='_compute_trip_data_columns', store=True, readonly=True)
+    use_return_bus = fields.Boolean(string='Use Return Bus', compute='_compute_trip_data_columns', store=True, readonly=True)
+
+
+    # Stored, indexed copies of business.trip.data columns so list/search views can sort, group and filter in SQL
+    destination = fields.Char(string='Destination', compute='_compute_trip_data_columns', store=True, index=True, readonly=True)
+    purpose = fields.Char(string='Purpose', compute='_compute_trip_data_columns', store=True, index=True, readonly=True)
+    travel_start_date = fields.Date(string='Start Date', compute='_compute_trip_data_columns', store=True, index=True, readonly=True)
+    travel_end_date = fields.Date(string='End Date', compute='_compute_trip_data_columns', store=True, index=True, readonly=True)
     trip_type = fields.Selection([
         ('one_way', 'One-way Trip'),
         ('two_way', 'Round Trip')
     ], string='Trip Type', compute='_compute_trip_related_fields', store=False)
 
+    # business.trip.data columns mirrored on formio.form by _compute_trip_data_columns
+    _TRIP_DATA_COLUMNS = (
+        'destination', 'purpose', 'travel_start_date', 'travel_end_date',
+        'use_rental_car', 'use_company_car', 'use_personal_car', 'use_train', 'use_airplane', 'use_bus',
+        'use_return_rental_car', 'use_return_company_car', 'use_return_personal_car',
+        'use_return_train', 'use_return_airplane', 'use_return_bus',
+    )
+
+    @api.depends(*['business_trip_data_ids.%s' % column for column in _TRIP_DATA_COLUMNS])
+    def _compute_trip_data_columns(self):
+        """Copy the trip columns of the linked business.trip.data onto the form.
+        Recomputed by the ORM whenever one of these columns changes on business.trip.data.
+        A form with several data records uses the lowest id, as _get_trip_data_by_form does."""
+        for record in self:
+            trip_data = record.business_trip_data_ids.sorted('id')[:1]
+            for column in self._TRIP_DATA_COLUMNS:
+                record[column] = trip_data[column] if trip_data else False
+
+    def init(self):
+        super(FormioForm, self).init()
+        # Composite index for "trips to <city> between <dates>" searches in the list views
+        tools.create_index(self._cr, 'formio_form_destination_travel_start_date_index',
+                           self._table, ['destination', 'travel_start_date'])
+        # Record rules: [('trip_status', '!=', False), ('<role>_id', '=', user.id)]
+        for role_column in ('user_id', 'manager_id', 'organizer_id'):
+            tools.create_index(self._cr, f'formio_form_{role_column}_trip_status_index',
+                               self._table, [role_column, 'trip_status'])
+
     @api.depends('business_trip_data_id.trip_type')
     def _compute_trip_related_fields(self):
         """Compute trip_type from business.trip.data model"""
+        trip_data_by_form = self._get_trip_data_by_form()
         for record in self._filter_new_records():
             # Find linked business.trip.data record
-            trip_data = self.env['business.trip.data'].search([('form_id', '=', record.id)], limit=1)
+            trip_data = trip_data_by_form.get(record.id)
 
             if trip_data:
                 # Map trip_type from business.trip.data to formio.form
@@ -193,11 +295,11 @@ class FormioForm(models.Model):
         ('organization_done', 'Organization Completed'),
         ('rejected', 'Rejected'),
         ('cancelled', 'Cancelled'),
-    ], string='Trip Status (Phase 1)', compute='_compute_trip_status_phases', store=False)
+    ], string='Trip Status (Phase 1)', compute='_compute_trip_status_phases', store=True, index=True)
 
     # Exception statuses for phase one
-    is_returned = fields.Boolean(string='Is Returned', compute='_compute_exceptional_statuses', store=False)
-    is_rejected = fields.Boolean(string='Is Rejected', compute='_compute_exceptional_statuses', store=False)
+    is_returned = fields.Boolean(string='Is Returned', compute='_compute_exceptional_statuses', store=True, index=True)
+    is_rejected = fields.Boolean(string='Is Rejected', compute='_compute_exceptional_statuses', store=True, index=True)
 
     trip_status_phase2 = fields.Selection([
         ('awaiting_trip_start', 'Awaiting Trip Start'),
@@ -206,10 +308,10 @@ class FormioForm(models.Model):
         ('expense_submitted', 'Expenses Under Review'),
         ('expense_returned', 'Expenses Returned for Revision'),
         ('completed', 'TRAVEL PROCESS COMPLETED'),
-    ], string='Trip Status (Phase 2)', compute='_compute_trip_status_phases', store=False)
+    ], string='Trip Status (Phase 2)', compute='_compute_trip_status_phases', store=True, index=True)
 
     # Exception status for phase two
-    is_expense_returned = fields.Boolean(string='Is Expense Returned', compute='_compute_exceptional_statuses', store=False)
+    is_expense_returned = fields.Boolean(string='Is Expense Returned', compute='_compute_exceptional_statuses', store=True, index=True)
 
     # New computed field for role display
     my_role = fields.Char(
@@ -350,9 +452,10 @@ class FormioForm(models.Model):
         Note: This method should only be called after submission_data has been processed
         and transport_means_json is available in business.trip.data.
         """
+        trip_data_by_form = self._get_trip_data_by_form()
         for record in self._filter_new_records():
             # Find linked business.trip.data record
-            trip_data = self.env['business.trip.data'].search([('form_id', '=', record.id)], limit=1) # type: ignore
+            trip_data = trip_data_by_form.get(record.id) # type: ignore
             if not trip_data:
                 _logger.warning(f"No business.trip.data record found for form {record.id}, cannot process transport data") # type: ignore
                 continue
@@ -630,12 +733,13 @@ class FormioForm(models.Model):
     @api.depends('business_trip_id', 'business_trip_id.user_id', 'business_trip_id.manager_id', 'business_trip_id.organizer_id')
     @api.depends_context('uid')
     def _compute_user_roles(self):
+        user = self.env.user
+        roles = user._get_business_trip_roles()
         for record in self:
             if record.business_trip_id:
                 # Delegate to the business_trip model's compute method logic
-                user = self.env.user
                 bt = record.business_trip_id
-                is_system_admin = user.has_group('base.group_system')
+                is_system_admin = 'system' in roles
 
                 if is_system_admin:
                     record.is_manager = True
@@ -646,15 +750,15 @@ class FormioForm(models.Model):
 
                 record.is_manager = (bt.manager_id and user.id == bt.manager_id.id)
                 record.is_organizer = (bt.organizer_id and user.id == bt.organizer_id.id)
-                is_finance_user = user.has_group('account.group_account_manager')
+                is_finance_user = 'finance' in roles
                 record.is_finance = record.is_organizer or is_finance_user
-                is_in_organizer_group = user.has_group('custom_business_trip_management.group_business_trip_organizer')
+                is_in_organizer_group = 'organizer' in roles
                 record.can_see_costs = record.is_manager or record.is_organizer or is_in_organizer_group
             else:
                 record.is_manager = False
                 record.is_finance = False
                 record.is_organizer = False
-                record.can_see_costs = self.env.user.has_group('base.group_system') or self.env.user.has_group('custom_business_trip_management.group_business_trip_organizer')
+                record.can_see_costs = 'system' in roles or 'organizer' in roles
 
     @api.depends('business_trip_data_id.manual_travel_duration',
                  'business_trip_data_id.travel_start_date',
@@ -662,12 +766,13 @@ class FormioForm(models.Model):
                  'business_trip_data_id') # Ensure compute is triggered if BTD link changes
     def _compute_travel_dates(self):
         _logger.info("FORMIO_FORM_INHERIT: Starting _compute_travel_dates (PLANNED) calculation...")
+        trip_data_by_form = self._get_trip_data_by_form()
         for record in self:
             record.travel_duration = 0.0  # Initialize with a default
 
             btd = None
             if record.id: # If the record has an ID, it might exist in the database
-                btd = self.env['business.trip.data'].search([('form_id', '=', record.id)], limit=1)
+                btd = trip_data_by_form.get(record.id)
 
             if not btd and record.business_trip_data_id: # Fallback to the M2O field if search yields nothing but M2O is set
                 btd = record.business_trip_data_id
@@ -922,11 +1027,11 @@ class FormioForm(models.Model):
     def _compute_can_undo_expense_approval_action(self):
         # Get the setting from the environment's company once
         undo_limit_days = self.env.company.undo_expense_approval_days_limit
+        # User must be a system admin (or a specific manager/finance group if defined differently and more granularly)
+        is_approver = 'system' in self.env.user._get_business_trip_roles()
 
         for record in self:
             can_undo = False
-            # User must be a system admin (or a specific manager/finance group if defined differently and more granularly)
-            is_approver = self.env.user.has_group('base.group_system')
 
             if record.business_trip_id and record.business_trip_id.trip_status == 'completed' and is_approver:
                 if record.business_trip_id.expense_approval_date:
@@ -1214,59 +1319,16 @@ class FormioForm(models.Model):
         }
   
 
-    @api.depends('business_trip_id.trip_status')
+    @api.depends('trip_status')
     def _compute_trip_status_phases(self):
         """
-        Calculate phase-based statuses based on trip_status
-        This method must ensure that all statuses, including exception statuses,
-        are properly displayed in their respective phases.
+        Calculate phase-based statuses based on trip_status (see TRIP_STATUS_PHASE1
+        and TRIP_STATUS_PHASE2). Exception statuses are displayed in their
+        respective phases. Stored, so the statusbars are grouped and filtered in SQL.
         """
-        _logger.info("Computing trip status phases")
         for rec in self:
-            # Log information
-            trip_status = rec.business_trip_id.trip_status if rec.business_trip_id else False
-            _logger.info(f"Form ID: {rec.id}, Current trip_status: {trip_status}")
-
-            # Phase one - normal and exception stages
-            if trip_status in ['draft', 'submitted', 'pending_organization', 'organization_done', 'rejected', 'cancelled']:
-                # Standard behavior for normal states
-                rec.trip_status_phase1 = trip_status
-                _logger.info(f"Setting trip_status_phase1 to {trip_status}")
-            elif trip_status == 'returned':
-                # Special case for 'returned' status - show it explicitly when active
-                rec.trip_status_phase1 = 'returned'
-                _logger.info(f"Setting trip_status_phase1 to returned for returned status")
-            else:
-                # When in phase two, keep showing 'organization_done' in phase one
-                if trip_status in ['awaiting_trip_start', 'in_progress', 'completed_waiting_expense', 'expense_submitted', 'expense_returned', 'completed']:
-                    rec.trip_status_phase1 = 'organization_done'
-                    _logger.info(f"Setting trip_status_phase1 to organization_done while in phase two status: {trip_status}")
-                else:
-                    rec.trip_status_phase1 = False
-                    _logger.info(f"Setting trip_status_phase1 to False for status: {trip_status}")
-
-            # Phase two - normal stages
-            if trip_status in ['awaiting_trip_start', 'completed_waiting_expense', 'expense_submitted', 'completed']:
-                rec.trip_status_phase2 = trip_status
-                _logger.info(f"Setting trip_status_phase2 to {trip_status}")
-            elif trip_status == 'in_progress':
-                # When in progress, show only in_progress (hide awaiting_trip_start)
-                rec.trip_status_phase2 = 'in_progress'
-                _logger.info(f"Setting trip_status_phase2 to in_progress for in_progress status")
-            elif trip_status == 'expense_returned':
-                # Only show expense_returned when it's the actual current status
-                rec.trip_status_phase2 = 'expense_returned'
-                _logger.info(f"Setting trip_status_phase2 to expense_returned for expense_returned status")
-            elif trip_status == 'organization_done':
-                # When organization is complete, show phase 2 with awaiting_trip_start as the initial status
-                rec.trip_status_phase2 = 'awaiting_trip_start'
-                _logger.info(f"Setting trip_status_phase2 to awaiting_trip_start for organization_done status")
-            else:
-                rec.trip_status_phase2 = False
-                _logger.info(f"Setting trip_status_phase2 to False for status: {trip_status}")
-
-            # Additional debug information
-            _logger.info(f"Final phase status - Phase1: {rec.trip_status_phase1}, Phase2: {rec.trip_status_phase2}")
+            rec.trip_status_phase1 = TRIP_STATUS_PHASE1.get(rec.trip_status, False)
+            rec.trip_status_phase2 = TRIP_STATUS_PHASE2.get(rec.trip_status, False)
 
     def action_open_organizer_plan_wizard(self):
         """Open wizard for organizer to edit trip plan details"""
@@ -1396,21 +1458,16 @@ class FormioForm(models.Model):
 
         return True
 
-    @api.depends('business_trip_id.trip_status')
+    @api.depends('trip_status')
     def _compute_exceptional_statuses(self):
         """Calculate exception statuses for display in the status bar"""
         for rec in self:
-            trip_status = rec.business_trip_id.trip_status if rec.business_trip_id else False
             # Phase one
-            rec.is_returned = (trip_status == 'returned')
-            rec.is_rejected = (trip_status == 'rejected')
+            rec.is_returned = (rec.trip_status == 'returned')
+            rec.is_rejected = (rec.trip_status == 'rejected')
 
             # Phase two
-            rec.is_expense_returned = (trip_status == 'expense_returned')
-
-            # Add log for debugging
-            if trip_status == 'expense_returned':
-                _logger.info(f"Computing exceptional statuses for form {rec.id}: trip_status = {trip_status}, is_expense_returned set to True")
+            rec.is_expense_returned = (rec.trip_status == 'expense_returned')
 
     def post_confidential_message(self, message, recipient_ids=None, attachment_ids=None):
         """Send confidential message in chatter that is only visible to specific recipients"""
@@ -1565,11 +1622,12 @@ class FormioForm(models.Model):
                  'business_trip_data_id.travel_end_date')
     def _compute_has_trip_details(self):
         _logger.info(f"FORMIO_FORM_INHERIT: Starting _compute_has_trip_details for {len(self)} records.")
+        trip_data_by_form = self._get_trip_data_by_form()
         for record in self:
             record.has_trip_details = False # Default to False
             btd = None
             if record.id:
-                btd = self.env['business.trip.data'].search([('form_id', '=', record.id)], limit=1)
+                btd = trip_data_by_form.get(record.id)
 
             if not btd and record.business_trip_data_id: # Fallback to the M2O field if search yields nothing but M2O is set
                 btd = record.business_trip_data_id
@@ -1701,51 +1759,17 @@ class FormioForm(models.Model):
         """
         Fix and update submission data extraction for all forms.
         This can be called from a server action to re-process all form data.
+        The work is queued to the re-processing cron job (business.trip.reprocess),
+        which runs it in resumable batches instead of blocking the request.
         """
-        forms = self.search([('submission_data', '!=', False), ('state', '=', 'COMPLETE')])
-        total_forms = len(forms)
-        _logger.info(f"Re-processing submission data for {total_forms} existing forms")
-
-        processed = 0
-        errors = 0
-
-        for form in forms:
-            try:
-                _logger.info(f"Processing form {form.id} with title: {form.title}")
-
-                # Find or create business.trip.data record for this form
-                trip_data = self.env['business.trip.data'].search([('form_id', '=', form.id)], limit=1)
-                if not trip_data:
-                    _logger.info(f"Creating new business.trip.data record for form {form.id}")
-                    trip_data = self.env['business.trip.data'].create({
-                        'form_id': form.id,
-                    })
-
-                # Process submission data to extract values
-                if form.submission_data:
-                    submission_data = json.loads(form.submission_data)
-                    result = trip_data.process_submission_data(submission_data)
-
-                    if result:
-                        _logger.info(f"Successfully extracted data to business.trip.data record {trip_data.id} for form {form.id}")
-                    else:
-                        _logger.warning(f"Failed to extract data to business.trip.data record {trip_data.id} for form {form.id}")
-
-                # Note: form_data_display fields are now computed automatically via related fields
-
-                processed += 1
-                _logger.info(f"Successfully re-processed form {form.id} ({processed}/{total_forms})")
-            except Exception as e:
-                errors += 1
-                _logger.error(f"Error re-processing form {form.id}: {e}", exc_info=True)
-
-        _logger.info(f"Re-processing complete. Processed: {processed}, Errors: {errors}")
+        state = self.env['business.trip.reprocess'].enqueue_reprocess()
         return {
             'type': 'ir.actions.client',
             'tag': 'display_notification',
             'params': {
-                'title': _('Re-processing complete'),
-                'message': _('%s forms processed, %s errors') % (processed, errors),
+                'title': _('Re-processing queued'),
+                'message': _('%s of %s forms processed so far, %s errors. The remaining forms are processed in the background.') % (
+                    state['processed'], state['total'], state['errors']),
                 'sticky': False,
             }
         }
@@ -1841,6 +1865,7 @@ class FormioForm(models.Model):
     )
     def _compute_transportation_display_data(self):
         _logger.info("COMPUTE_TRANSPORT_DISPLAY: Starting computation for transportation display data.")
+        trip_data_by_form = self._get_trip_data_by_form()
         for record in self:
             current_has_any_transportation = False
             current_has_any_return_transportation = False
@@ -1848,7 +1873,7 @@ class FormioForm(models.Model):
             trip_data = record.business_trip_data_id # Prioritize direct link
             if not trip_data and record.id: # Fallback to search if direct link is empty
                 _logger.info(f"COMPUTE_TRANSPORT_DISPLAY: BTD not directly linked for form {record.id}. Searching...")
-                trip_data = self.env['business.trip.data'].search([('form_id', '=', record.id)], limit=1)
+                trip_data = trip_data_by_form.get(record.id)
                 if trip_data:
                     _logger.info(f"COMPUTE_TRANSPORT_DISPLAY: Found BTD {trip_data.id} for form {record.id} via search.")
                 else:
@@ -1989,8 +2014,9 @@ class FormioForm(models.Model):
                  'business_trip_data_id.travel_end_date')
     def _compute_travel_dates_display(self):
         """Compute a display-friendly string showing travel dates from business.trip.data"""
+        trip_data_by_form = self._get_trip_data_by_form()
         for record in self:
-            trip_data = self.env['business.trip.data'].search([('form_id', '=', record.id)], limit=1)
+            trip_data = trip_data_by_form.get(record.id)
 
             if not trip_data or not trip_data.travel_start_date:
                 record.travel_dates_display = ""
@@ -2044,9 +2070,10 @@ class FormioForm(models.Model):
     )
     def _compute_accommodation_fields(self):
         """Compute accommodation-related fields from business.trip.data model"""
+        trip_data_by_form = self._get_trip_data_by_form()
         for record in self:
             # Find linked business.trip.data record
-            trip_data = self.env['business.trip.data'].search([('form_id', '=', record.id)], limit=1)
+            trip_data = trip_data_by_form.get(record.id)
 
             if trip_data:
                 record.accommodation_residence_city = trip_data.accommodation_residence_city
@@ -2531,61 +2558,94 @@ class FormioForm(models.Model):
 
         return True
 
-    @api.depends('business_trip_id.structured_plan_items_json')
+    @api.depends('business_trip_id.structured_plan_hash')
     def _compute_organizer_plan_html(self):
         for record in self:
             if not record.business_trip_id or not record.business_trip_id.structured_plan_items_json:
                 record.organizer_plan_html = '<div class="alert alert-info" role="alert">No structured plan details available.</div>'
                 continue
+            # The table lists every key of the items, it does not depend on cost visibility
+            fragments = record._get_organizer_plan_fragments(record.business_trip_id, False)
+            record.organizer_plan_html = fragments['plan_html']
 
-            try:
-                plan_items = json.loads(record.business_trip_id.structured_plan_items_json)
-                if not isinstance(plan_items, list):
-                    raise ValueError("JSON data is not a list of items.")
-            except (json.JSONDecodeError, ValueError) as e:
-                _logger.error(f"Could not parse structured_plan_items_json for form {record.id}: {e}")
-                record.organizer_plan_html = f'<div class="alert alert-danger" role="alert">Error displaying plan details. Invalid data format.</div>'
-                continue
+    def _get_organizer_plan_fragments(self, trip, show_cost):
+        """
+        Returns the rendered organizer plan of trip for the given cost visibility
+        (see _render_organizer_plan_fragments). The fragments are stored on the
+        trip with the hash of the plan they were rendered from
+        (business.trip.structured_plan_fragments_json), so they are rendered once
+        per plan version, in the transaction that writes the plan. They are only
+        rendered here when the stored ones do not match the current plan.
+        """
+        if trip.structured_plan_fragments_json:
+            stored = json.loads(trip.structured_plan_fragments_json)
+            if stored.get('hash') == trip.structured_plan_hash:
+                return stored['with_cost' if show_cost else 'without_cost']
+        return self._render_organizer_plan_fragments(trip.structured_plan_items_json, show_cost)
 
-            html = '<div class="o_organizer_plan_view">'
-            
-            item_categories = {
-                'flight': [], 'hotel': [], 'train': [], 'car_rental': [], 'other': []
-            }
+    @api.model
+    def _render_organizer_plan_fragments(self, plan_json, show_cost):
+        """
+        Renders the organizer plan of a business trip for the given cost
+        visibility. Returns a dict with the table of organizer_plan_html
+        ('plan_html') and the item blocks of each display category
+        ('<category>_html', empty when the category has no item).
+        """
+        fragments = {f'{category}_html': '' for category in PLAN_DISPLAY_CATEGORIES}
+        try:
+            plan_items = json.loads(plan_json)
+            if not isinstance(plan_items, list):
+                raise ValueError("JSON data is not a list of items.")
+        except (json.JSONDecodeError, ValueError, TypeError) as e:
+            _logger.error(f"Could not parse structured_plan_items_json: {e}")
+            fragments['plan_html'] = '<div class="alert alert-danger" role="alert">Error displaying plan details. Invalid data format.</div>'
+            return fragments
+
+        fragments['plan_html'] = self._render_organizer_plan_table(plan_items)
+
+        categorized_items = {category: [] for category in PLAN_DISPLAY_CATEGORIES}
+        for item in plan_items:
+            categorized_items[PLAN_ITEM_TYPE_CATEGORIES.get(item.get('item_type', ''), 'other')].append(item)
+        for category, items in categorized_items.items():
+            if items:
+                fragments[f'{category}_html'] = "".join(self._generate_item_html(item, show_cost=show_cost) for item in items)
+        return fragments
+
+    def _render_organizer_plan_table(self, plan_items):
+        html = ['<div class="o_organizer_plan_view">']
+
+        item_categories = {
+            'flight': [], 'hotel': [], 'train': [], 'car_rental': [], 'other': []
+        }
 
-            for item in plan_items:
-                category = item.get('type', 'other')
-                if category in item_categories:
-                    item_categories[category].append(item)
-                else:
-                    item_categories['other'].append(item)
-
-            for category, items in item_categories.items():
-                if items:
-                    html += f'<h4><i class="fa fa-fw {self._get_icon_for_category(category)} mr-2"/>{category.replace("_", " ").title()}</h4>'
-                    html += '<table class="table table-sm o_main_table">'
-                    
-                    # Create headers based on the first item
-                    headers = list(items[0].keys())
-                    html += '<thead><tr>'
-                    for header in headers:
-                        if header != 'type':
-                             html += f'<th>{header.replace("_", " ").title()}</th>'
-                    html += '</tr></thead>'
-
-                    html += '<tbody>'
-                    for item in items:
-                        html += '<tr>'
-                        for header in headers:
-                            if header != 'type':
-                                value = item.get(header, '')
-                                html += f'<td>{html_sanitize(str(value))}</td>'
-                        html += '</tr>'
-                    html += '</tbody>'
-                    html += '</table>'
-
-            html += '</div>'
-            record.organizer_plan_html = html
+        for item in plan_items:
+            category = item.get('type', 'other')
+            if category in item_categories:
+                item_categories[category].append(item)
+            else:
+                item_categories['other'].append(item)
+
+        for category, items in item_categories.items():
+            if items:
+                html.append(f'<h4><i class="fa fa-fw {self._get_icon_for_category(category)} mr-2"/>{category.replace("_", " ").title()}</h4>')
+                html.append('<table class="table table-sm o_main_table">')
+
+                # Create headers based on the first item
+                headers = [header for header in items[0].keys() if header != 'type']
+                html.append('<thead><tr>')
+                html.extend(f'<th>{header.replace("_", " ").title()}</th>' for header in headers)
+                html.append('</tr></thead>')
+
+                html.append('<tbody>')
+                for item in items:
+                    html.append('<tr>')
+                    html.extend(f'<td>{html_sanitize(str(item.get(header, "")))}</td>' for header in headers)
+                    html.append('</tr>')
+                html.append('</tbody>')
+                html.append('</table>')
+
+        html.append('</div>')
+        return ''.join(html)
 
     def _get_icon_for_category(self, category):
         icon_map = {
@@ -2597,67 +2657,24 @@ class FormioForm(models.Model):
         }
         return icon_map.get(category, 'fa-info-circle')
 
-    @api.depends('business_trip_id.structured_plan_items_json')
+    @api.depends('business_trip_id.structured_plan_hash', 'business_trip_id.manager_id', 'business_trip_id.organizer_id')
+    @api.depends_context('uid')
     def _compute_organizer_plan_display_fields(self):
         """
         Computes structured HTML blocks for the organizer's plan items,
         categorized for display in the form view, mimicking the style of other tabs.
+        The blocks come from the fragments stored per plan version (_get_organizer_plan_fragments).
         """
         for record in self:
-            # Initialize all fields to default values
-            record.organizer_plan_has_flight = False
-            record.organizer_plan_flight_html = ''
-            record.organizer_plan_has_hotel = False
-            record.organizer_plan_hotel_html = ''
-            record.organizer_plan_has_train = False
-            record.organizer_plan_train_html = ''
-            record.organizer_plan_has_car_rental = False
-            record.organizer_plan_car_rental_html = ''
-            record.organizer_plan_has_other = False
-            record.organizer_plan_other_html = ''
-
-            if not record.business_trip_id:
-                continue
-                
-            plan_items_str = record.business_trip_id.structured_plan_items_json
-            if not plan_items_str or plan_items_str == '[]':
-                continue
-
-            try:
-                plan_items = json.loads(plan_items_str)
-                if not isinstance(plan_items, list):
-                    _logger.warning(f"structured_plan_items_json is not a list for form {record._origin.id}")
-                    continue
-
-                categorized_items = {
-                    'flight': [], 'hotel': [], 'train': [], 'car_rental': [], 'other': []
-                }
-                for item in plan_items:
-                    item_type = item.get('item_type', '')
-                    # Map item_type to category
-                    if item_type == 'transport_air':
-                        category = 'flight'
-                    elif item_type in ['transport_train']:
-                        category = 'train'
-                    elif item_type in ['transport_car', 'transport_taxi']:
-                        category = 'car_rental'
-                    elif item_type in ['accommodation', 'accommodation_airbnb']:
-                        category = 'hotel'
-                    else:
-                        category = 'other'
-                    
-                    if category in categorized_items:
-                        categorized_items[category].append(item)
-
-                for category, items in categorized_items.items():
-                    if items:
-                        record[f'organizer_plan_has_{category}'] = True
-                        html_blocks = [self._generate_item_html(item) for item in items]
-                        record[f'organizer_plan_{category}_html'] = "".join(html_blocks)
-
-            except (json.JSONDecodeError, TypeError):
-                _logger.warning(f"Could not parse structured_plan_items_json for form {record._origin.id}")
-                continue
+            trip = record.business_trip_id
+            plan_items_str = trip.structured_plan_items_json if trip else False
+            fragments = {}
+            if plan_items_str and plan_items_str != '[]':
+                fragments = record._get_organizer_plan_fragments(trip, record._should_show_cost_info())
+            for category in PLAN_DISPLAY_CATEGORIES:
+                category_html = fragments.get(f'{category}_html', '')
+                record[f'organizer_plan_has_{category}'] = bool(category_html)
+                record[f'organizer_plan_{category}_html'] = category_html
 
     def _render_plan_item_field(self, label, value):
         """Helper to render a single key-value pair for the plan item HTML."""
@@ -2675,7 +2692,7 @@ class FormioForm(models.Model):
             </tr>
         """)
 
-    def _generate_item_html(self, item):
+    def _generate_item_html(self, item, show_cost=None):
         """Generates an HTML block for a single plan item, styled like Request Form Data tab."""
         from markupsafe import Markup
         
@@ -2683,7 +2700,8 @@ class FormioForm(models.Model):
         description = item.get('description', 'Item')
         
         # Check if user should see cost information
-        show_cost = self._should_show_cost_info()
+        if show_cost is None:
+            show_cost = self._should_show_cost_info()
         
         # Generate clean HTML similar to Request Form Data
         html = f'<div style="margin-bottom: 1rem;">'
@@ -2757,16 +2775,10 @@ class FormioForm(models.Model):
     def _should_show_cost_info(self):
         """Check if the current user should see cost information."""
         self.ensure_one()
-        user = self.env.user
-        # System administrators always have access
-        if user.has_group('base.group_system'):
-            return True
-        # Managers and organizers should see cost information
-        is_manager = (self.manager_id and user.id == self.manager_id.id)
-        is_organizer = (self.organizer_id and user.id == self.organizer_id.id)
-        # Also allow users in organizer group
-        is_in_organizer_group = user.has_group('custom_business_trip_management.group_business_trip_organizer')
-        return is_manager or is_organizer or is_in_organizer_group
+        # Managers and organizers of the trip, organizer group members and system administrators
+        if self.business_trip_id:
+            return self.business_trip_id.can_see_costs
+        return 'system' in self.env.user._get_business_trip_roles()
 
     def action_reprocess_data(self):
         """
@@ -0,0 +1,25 @@
+from odoo import models, api
+
+# Employee fields the business trip manager resolution of res.users depends on
+MANAGER_HIERARCHY_FIELDS = {'user_id', 'parent_id', 'active', 'name'}
+
+class HrEmployee(models.Model):
+    _inherit = 'hr.employee'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        employees = super().create(vals_list)
+        self.clear_caches()
+        return employees
+
+    def write(self, vals):
+        res = super().write(vals)
+        if MANAGER_HIERARCHY_FIELDS.intersection(vals):
+            # Cached by res.users._get_business_trip_manager_id
+            self.clear_caches()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.clear_caches()
+        return res
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api, tools
+import hashlib
+import logging
+import os
+import shutil
+
+_logger = logging.getLogger(__name__)
+
+# Number of bytes read at a time when hashing or copying a spooled file
+SPOOL_READ_BLOCK_SIZE = 64 * 1024
+
+
+def _hash_file(path, *algorithms):
+    """
+    Hashes the file at path by blocks with every given hashlib algorithm in a
+    single read. Returns (size, hexdigest per algorithm...).
+    """
+    hashers = [hashlib.new(algorithm) for algorithm in algorithms]
+    size = 0
+    with open(path, 'rb') as spooled_file:
+        for block in iter(lambda: spooled_file.read(SPOOL_READ_BLOCK_SIZE), b''):
+            for hasher in hashers:
+                hasher.update(block)
+            size += len(block)
+    return (size,) + tuple(hasher.hexdigest() for hasher in hashers)
+
+class IrAttachment(models.Model):
+    _inherit = 'ir.attachment'
+
+    # SHA-256 of the content of business trip uploads, used to detect re-uploads.
+    # (checksum is the sha1 the filestore is addressed by.)
+    business_trip_sha256 = fields.Char(string='SHA-256', index=True, readonly=True, copy=False)
+
+    def init(self):
+        super(IrAttachment, self).init()
+        # Orphaned upload lookups of the cleanup cron (res_id = 0, oldest first)
+        tools.create_index(self._cr, 'ir_attachment_res_model_res_id_create_date_index',
+                           self._table, ['res_model', 'res_id', 'create_date'])
+
+    def _business_trip_write_store(self, store_fname, file_size, checksum):
+        """
+        Points self to content already in the filestore.
+        create() and write() drop store_fname, file_size and checksum on purpose,
+        so they are written at the column level.
+        """
+        self.sudo()._write({'store_fname': store_fname, 'file_size': file_size, 'checksum': checksum})
+        self.invalidate_cache(['store_fname', 'file_size', 'checksum', 'datas', 'raw', 'db_datas'], self.ids)
+
+    @api.model
+    def _business_trip_find_content(self, sha256, file_size):
+        """
+        Returns an attachment whose content is in the filestore with the given
+        SHA-256 and size, among the attachments the current user can read
+        (possibly empty). Content only readable by other users is never
+        matched, so uploads do not tell whether someone else stored a file.
+        """
+        candidates = self.search([
+            ('business_trip_sha256', '=', sha256),
+            ('file_size', '=', file_size),
+            ('store_fname', '!=', False),
+        ], order='id desc', limit=5)
+        for candidate in candidates:
+            if os.path.isfile(self._full_path(candidate.store_fname)):
+                return candidate
+        return self.browse()
+
+    @api.model
+    def _business_trip_create_shared(self, vals, source):
+        """
+        Creates a metadata-only attachment sharing the filestore content of source.
+        The filestore is addressed by checksum and its garbage collector only
+        removes files no attachment references any more, so the shared file lives
+        as long as one of the attachments pointing to it.
+        """
+        vals = dict(vals, mimetype=vals.get('mimetype') or source.mimetype,
+                    business_trip_sha256=source.business_trip_sha256)
+        attachment = self.create(vals)
+        attachment._business_trip_write_store(source.store_fname, source.file_size, source.checksum)
+        return attachment
+
+    @api.model
+    def _business_trip_create_from_spool(self, vals, spool_path, checksum=None, file_size=None):
+        """
+        Creates an attachment from the file at spool_path, which is consumed.
+
+        With file storage the spooled file is moved into the filestore under its
+        sha1 checksum, so its content is never loaded in memory nor base64 encoded.
+        The checksum and size are computed by blocks unless the caller already
+        hashed the file while receiving it. Content already in the filestore is
+        reused. With database storage the content is read once and stored through
+        the regular create(). Identical uploads, from any user, thus share one file.
+        """
+        if self._storage() != 'file':
+            with open(spool_path, 'rb') as spool:
+                vals = dict(vals, raw=spool.read())
+            os.unlink(spool_path)
+            return self.create(vals)
+
+        if not checksum or file_size is None:
+            file_size, checksum = _hash_file(spool_path, 'sha1')
+
+        # Same layout as _file_write(): <first 2 chars of the checksum>/<checksum>
+        store_fname = checksum[:2] + '/' + checksum
+        full_path = self._full_path(store_fname)
+        if os.path.isfile(full_path):
+            os.unlink(spool_path)
+        else:
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            shutil.move(spool_path, full_path)
+            # Removed by the filestore garbage collector if the transaction aborts
+            self._mark_for_gc(store_fname)
+
+        attachment = self.create(vals)
+        attachment._business_trip_write_store(store_fname, file_size, checksum)
+        return attachment
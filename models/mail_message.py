@@ -3,6 +3,9 @@ import logging
 
 _logger = logging.getLogger(__name__)
 
+# Settings switch for the confidential filtering trace logs (see res.config.settings)
+MAIL_TRACE_PARAM = 'custom_business_trip_management.mail_message_trace'
+
 class MailMessage(models.Model):
     _inherit = 'mail.message'
     
@@ -15,46 +18,72 @@ class MailMessage(models.Model):
         string='Confidential Recipients'
     )
     
-    def _format_for_notification(self):
-        """Override to filter confidential messages"""
-        _logger.info(f"---- Start _format_for_notification for user: {self.env.user.name} (partner_id: {self.env.user.partner_id.id}) ----")
-        notifications = super(MailMessage, self)._format_for_notification()
-        
-        current_partner_id = self.env.user.partner_id.id
-        
-        filtered_notifications = []
-        for i, notification_tuple in enumerate(notifications):
-            if not isinstance(notification_tuple, (list, tuple)) or not notification_tuple:
-                _logger.warning(f"Notification item {i} is not a valid tuple/list or is empty: {notification_tuple}")
-                if notification_tuple:
-                    filtered_notifications.append(notification_tuple)
-                continue
+    def init(self):
+        # Lookups by partner ("which confidential messages may this partner see")
+        tools.create_index(self._cr, 'mail_message_confidential_partner_message_index',
+                           'mail_message_confidential_res_partner_rel', ['res_partner_id', 'mail_message_id'])
 
-            message = notification_tuple[0]
-            
-            _logger.info(f"Processing message ID: {message.id}, Subject: {message.subject}, Confidential: {message.confidential}")
-            _logger.info(f"Confidential Recipients for message ID {message.id}: {message.confidential_recipients.ids}")
+    def _is_mail_trace_enabled(self):
+        """
+        Tells whether the confidential filtering trace logs must be emitted.
+        Enabled for one request with the 'business_trip_mail_trace' context key,
+        or for the whole module from the Business Trip settings.
+        Callers check it before building log arguments, so a disabled trace
+        costs no string formatting and no ORM reads.
+        """
+        if 'business_trip_mail_trace' in self.env.context:
+            return bool(self.env.context['business_trip_mail_trace'])
+        return self._get_mail_trace_setting()
 
-            if message.confidential:
-                is_current_user_admin = self.env.user.has_group('base.group_system')
-                is_current_user_recipient = current_partner_id in message.confidential_recipients.ids
-                
-                _logger.info(f"Message ID: {message.id} IS CONFIDENTIAL. Current user admin: {is_current_user_admin}, Current user in recipients: {is_current_user_recipient}")
+    @tools.ormcache()
+    def _get_mail_trace_setting(self):
+        # Cleared together with the other ormcaches when a config parameter is written
+        return tools.str2bool(self.env['ir.config_parameter'].sudo().get_param(MAIL_TRACE_PARAM, 'False'))
 
-                if not is_current_user_recipient and not is_current_user_admin:
-                    _logger.info(f"SKIPPING confidential message ID: {message.id} for user: {self.env.user.name} (partner_id: {current_partner_id})")
-                    continue
-            
-            filtered_notifications.append(notification_tuple)
-        
-        _logger.info(f"---- End _format_for_notification for user: {self.env.user.name}. Original notifications: {len(notifications)}, Filtered: {len(filtered_notifications)} ----")
-        return filtered_notifications
+    def _filter_confidential_visible(self):
+        """
+        Returns the messages of self the current user is allowed to see, i.e. every
+        non-confidential message plus the confidential ones addressed to the user's
+        partner. Superuser and system administrators see everything.
+
+        Visibility is resolved with a single SQL query over the confidential
+        recipients table, so formatting a whole thread costs one query regardless
+        of the number of messages.
+        """
+        if self.env.is_superuser() or 'system' in self.env.user._get_business_trip_roles():
+            return self
+        message_ids = [message_id for message_id in self.ids if isinstance(message_id, int)]
+        if not message_ids:
+            return self
+
+        self.flush(['confidential', 'confidential_recipients'])
+        self.env.cr.execute("""
+            SELECT m.id
+              FROM mail_message m
+             WHERE m.id IN %s
+               AND m.confidential
+               AND NOT EXISTS (
+                    SELECT 1
+                      FROM mail_message_confidential_res_partner_rel rel
+                     WHERE rel.mail_message_id = m.id
+                       AND rel.res_partner_id = %s)
+        """, (tuple(message_ids), self.env.user.partner_id.id))
+        hidden_ids = {row[0] for row in self.env.cr.fetchall()}
+        if not hidden_ids:
+            return self
+        if self._is_mail_trace_enabled():
+            _logger.info("Hiding confidential messages %s from user %s", sorted(hidden_ids), self.env.user.name)
+        return self.filtered(lambda message: message.id not in hidden_ids)
+
+    def _format_for_notification(self):
+        """Override to filter confidential messages"""
+        return super(MailMessage, self._filter_confidential_visible())._format_for_notification()
         
     @api.model
     def _search(self, args, offset=0, limit=None, order=None, count=False, access_rights_uid=None):
         """Override _search to filter out confidential messages that the user shouldn't see"""
         # Only apply filtering if we're not admin and not in superuser mode
-        if not self.env.is_superuser() and not self.env.user.has_group('base.group_system'):
+        if not self.env.is_superuser() and 'system' not in self.env.user._get_business_trip_roles():
             partner_id = self.env.user.partner_id.id
             
             # Add condition to filter out confidential messages not intended for current user
@@ -70,8 +99,9 @@ class MailMessage(models.Model):
                 args = ['&'] + args + confidential_condition
             else:
                 args = confidential_condition
-                
-            _logger.info(f"Modified search args for mail.message to filter confidential messages: {args}")
+
+            if self._is_mail_trace_enabled():
+                _logger.info("Confidential filter added to mail.message search for partner %s: %s", partner_id, args)
             
         return super(MailMessage, self)._search(args, offset=offset, limit=limit, order=order, count=count, access_rights_uid=access_rights_uid)
         
@@ -79,22 +109,6 @@ class MailMessage(models.Model):
         """Add confidential fields to the message format fields"""
         return super(MailMessage, self)._get_message_format_fields() + ['confidential', 'confidential_recipients']
         
-    def message_format(self):
+    def message_format(self, *args, **kwargs):
         """Override message_format to filter out confidential messages"""
-        messages = super(MailMessage, self).message_format()
-        
-        # If not admin, filter out confidential messages not for current user
-        if not self.env.is_superuser() and not self.env.user.has_group('base.group_system'):
-            partner_id = self.env.user.partner_id.id
-            filtered_messages = []
-            
-            for message in messages:
-                # Skip confidential messages not intended for current user
-                if message.get('confidential') and partner_id not in message.get('confidential_recipients', []):
-                    _logger.info(f"Filtering out confidential message ID {message.get('id')} from message_format for user {self.env.user.name}")
-                    continue
-                filtered_messages.append(message)
-                
-            return filtered_messages
-            
-        return messages
\ No newline at end of file
+        return super(MailMessage, self._filter_confidential_visible()).message_format(*args, **kwargs)
@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
-from odoo import models
+from odoo import models, tools
 import logging
 
 _logger = logging.getLogger(__name__)
 
+# Card and body are rendered together by this template (see views/mail_templates.xml)
+STYLED_MESSAGE_TEMPLATE = 'custom_business_trip_management.chatter_styled_message'
+
 class MailTemplateMixin(models.AbstractModel):
     """
     A mixin to provide a standardized method for posting styled messages to the chatter.
@@ -13,6 +16,54 @@ class MailTemplateMixin(models.AbstractModel):
     _name = 'mail.template.mixin'
     _description = 'Mixin for posting styled chatter messages'
 
+    @tools.ormcache()
+    def _get_styled_message_handles(self):
+        """
+        Ids of the styled message template and of the note and comment subtypes,
+        resolved once per registry. The compiled template itself is cached by
+        ir.qweb, keyed on the same id.
+        """
+        return (
+            self.env.ref(STYLED_MESSAGE_TEMPLATE).id,
+            self.env.ref('mail.mt_note').id,
+            self.env.ref('mail.mt_comment').id,
+        )
+
+    def _render_styled_message(self, card_type, icon, title, template_xml_id=None, body_html=None, render_context=None):
+        """
+        Renders the message card with its body in a single QWeb pass.
+        If the body template fails, the card is rendered with an error notice instead.
+        """
+        template_id = self._get_styled_message_handles()[0]
+        values = dict(render_context or {},
+                      card_type=card_type,
+                      icon=icon,
+                      title=title,
+                      body_template=template_xml_id,
+                      body=body_html,
+                      submitted_by=self.env.user.name)
+        try:
+            return self.env['ir.qweb']._render(template_id, values)
+        except Exception as e:
+            if not template_xml_id:
+                raise
+            _logger.error(f"Failed to render QWeb template {template_xml_id}: {e}", exc_info=True)
+            values.update(body_template=False, body=f"Error rendering template: {template_xml_id}")
+            return self.env['ir.qweb']._render(template_id, values)
+
+    def _prepare_styled_message_post_vals(self, message_body, is_internal_note=True, confidential=False, recipient_partner_ids=None):
+        note_subtype_id, comment_subtype_id = self._get_styled_message_handles()[1:]
+        post_vals = {
+            'body': message_body,
+            'subtype_id': note_subtype_id if is_internal_note else comment_subtype_id,
+        }
+
+        if confidential:
+            post_vals['confidential'] = True
+            if recipient_partner_ids:
+                post_vals['confidential_recipients'] = [(6, 0, recipient_partner_ids)]
+        return post_vals
+
     def _post_styled_message(self, card_type, icon, title, template_xml_id=None, body_html=None, render_context=None, is_internal_note=True, confidential=False, recipient_partner_ids=None):
         """
         Renders the generic message card template and posts it to the chatter.
@@ -29,36 +80,28 @@ class MailTemplateMixin(models.AbstractModel):
         :param recipient_partner_ids: (list, optional) List of partner IDs who can view the confidential message.
         """
         self.ensure_one()
-        
-        final_body_html = body_html
-        if template_xml_id:
-            try:
-                body_template = self.env.ref(template_xml_id)
-                final_body_html = body_template._render(render_context or {}, engine='ir.qweb')
-            except Exception as e:
-                _logger.error(f"Failed to render QWeb template {template_xml_id}: {e}", exc_info=True)
-                final_body_html = f"<p>Error rendering template: {template_xml_id}</p>"
 
-        card_template = self.env.ref('custom_business_trip_management.chatter_message_card')
-        
-        message_body = card_template._render({
-            'card_type': card_type,
-            'icon': icon,
-            'title': title,
-            'body_html': final_body_html,
-            'submitted_by': self.env.user.name
-        }, engine='ir.qweb')
+        message_body = self._render_styled_message(card_type, icon, title, template_xml_id, body_html, render_context)
+        self.message_post(**self._prepare_styled_message_post_vals(message_body, is_internal_note, confidential, recipient_partner_ids))
 
-        post_vals = {
-            'body': message_body,
-            'subtype_id': self.env.ref('mail.mt_note' if is_internal_note else 'mail.mt_comment').id
-        }
+        return True
 
-        if confidential:
-            post_vals['confidential'] = True
-            if recipient_partner_ids:
-                post_vals['confidential_recipients'] = [(6, 0, recipient_partner_ids)]
-        
-        self.message_post(**post_vals)
-        
-        return True 
\ No newline at end of file
+    def _post_styled_messages(self, card_type, icon, title, template_xml_id=None, body_html=None, render_context=None, is_internal_note=True, confidential=False, recipient_partner_ids=None):
+        """
+        Batched variant of _post_styled_message, posting the card on every record of self.
+
+        render_context is either a dict shared by all records, in which case the
+        card is rendered once, or a callable taking a record and returning its
+        render context, in which case a card is rendered per record.
+        """
+        shared_body = None
+        if not callable(render_context):
+            shared_body = self._render_styled_message(card_type, icon, title, template_xml_id, body_html, render_context)
+
+        for record in self:
+            message_body = shared_body
+            if message_body is None:
+                message_body = record._render_styled_message(card_type, icon, title, template_xml_id, body_html, render_context(record))
+            record.message_post(**record._prepare_styled_message_post_vals(message_body, is_internal_note, confidential, recipient_partner_ids))
+
+        return True
@@ -0,0 +1,12 @@
+from odoo import models, fields
+
+class ProjectProject(models.Model):
+    _inherit = 'project.project'
+
+    # Pool of business trip tasks this project holds, e.g. 'employee:42' or 'month:2026-10'
+    # (see business.trip._get_business_trip_projects)
+    business_trip_pool_key = fields.Char(string='Business Trip Pool', index=True, copy=False, readonly=True)
+
+    _sql_constraints = [
+        ('business_trip_pool_key_unique', 'unique(business_trip_pool_key)', 'A project already holds this pool of business trips.'),
+    ]
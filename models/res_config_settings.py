@@ -1,4 +1,5 @@
-from odoo import models, fields, api
+from odoo import models, fields, api, _
+from .business_trip import BUSINESS_TRIP_PROJECT_POOLING, DEFAULT_PROJECT_POOLING
 
 class ResConfigSettings(models.TransientModel):
     _inherit = 'res.config.settings'
@@ -15,4 +16,59 @@ class ResConfigSettings(models.TransientModel):
         readonly=False,
         string="Undo Expense Approval Deadline (Days)",
         help="Number of days after expense approval within which the approval can be undone. Set to 0 for no time limit."
-    ) 
\ No newline at end of file
+    )
+
+    business_trip_mail_trace = fields.Boolean(
+        string="Trace Confidential Message Filtering",
+        config_parameter='custom_business_trip_management.mail_message_trace',
+        help="Log how confidential chatter messages are filtered for each user. Keep disabled in production: it is meant for troubleshooting only."
+    )
+
+    business_trip_builder_id = fields.Many2one(
+        'formio.builder',
+        string="Business Trip Form Builder",
+        config_parameter='custom_business_trip_management.business_trip_builder',
+        help="Form.io builder (version) used for new business trip forms. When empty, the current version of the 'Business Trip Form' builder is used."
+    )
+
+    business_trip_project_pooling = fields.Selection(
+        BUSINESS_TRIP_PROJECT_POOLING,
+        string="Business Trip Projects",
+        config_parameter='custom_business_trip_management.project_pooling',
+        default=DEFAULT_PROJECT_POOLING,
+        help="How the tasks of approved business trips are grouped into projects. Per sales order, trips without a sales order share the Business Trip Organization project."
+    )
+
+    business_trip_upload_max_size_mb = fields.Integer(
+        string="Maximum Upload Size (MB)",
+        config_parameter='custom_business_trip_management.upload_max_size_mb',
+        default=10,
+        help="Largest file accepted by the business trip attachment upload."
+    )
+
+    business_trip_upload_rate_limit = fields.Integer(
+        string="Uploads per Hour",
+        config_parameter='custom_business_trip_management.upload_rate_limit',
+        default=50,
+        help="Business trip uploads allowed per user and per hour. Can be overridden on user groups and users."
+    )
+
+    business_trip_gazetteer_path = fields.Char(
+        string="Geonames Dump File",
+        config_parameter='custom_business_trip_management.gazetteer_path',
+        help="Path, on the server, of a Geonames cities dump (e.g. cities15000.zip) answering the destination autocomplete without calling Geonames."
+    )
+
+    def action_import_business_trip_gazetteer(self):
+        """Saves the settings and (re)imports the Geonames dump into the local gazetteer."""
+        self.set_values()
+        imported = self.env['business.trip.city'].sudo()._import_geonames_dump(self.business_trip_gazetteer_path)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Gazetteer imported'),
+                'message': _('%s cities imported.') % imported,
+                'sticky': False,
+            }
+        }
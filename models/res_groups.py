@@ -0,0 +1,16 @@
+from odoo import models, fields
+
+class ResGroups(models.Model):
+    _inherit = 'res.groups'
+
+    business_trip_upload_limit = fields.Integer(
+        string="Business Trip Uploads per Hour",
+        help="Upload rate limit of the members of this group. The highest limit of a user's groups applies. 0 for no group limit."
+    )
+
+    def write(self, vals):
+        res = super().write(vals)
+        if 'business_trip_upload_limit' in vals:
+            # Limits are cached per user by res.users._get_business_trip_upload_limit
+            self.clear_caches()
+        return res
@@ -1,8 +1,21 @@
-from odoo import models, api
+from odoo import models, fields, api, tools
+from .business_trip_rate_limit import UPLOAD_RATE_LIMIT_PARAM, DEFAULT_UPLOAD_RATE_LIMIT
+
+# Groups checked by the business trip role computes, keyed by role name
+BUSINESS_TRIP_ROLE_GROUPS = {
+    'system': 'base.group_system',
+    'finance': 'account.group_account_manager',
+    'organizer': 'custom_business_trip_management.group_business_trip_organizer',
+}
 
 class ResUsers(models.Model):
     _inherit = 'res.users'
 
+    business_trip_upload_limit = fields.Integer(
+        string="Business Trip Uploads per Hour",
+        help="Overrides the upload rate limit of this user's groups and of the Business Trip settings. 0 to use them."
+    )
+
     @api.model
     def create(self, vals):
         user = super().create(vals)
@@ -14,3 +27,81 @@ class ResUsers(models.Model):
                 if requester_group not in user.groups_id:
                     user.write({'groups_id': [(4, requester_group.id)]})
         return user
+
+    def write(self, vals):
+        res = super().write(vals)
+        if 'business_trip_upload_limit' in vals:
+            self.clear_caches()
+        return res
+
+    @tools.ormcache('self.id')
+    def _get_business_trip_roles(self):
+        """
+        Returns a frozenset with the names of the BUSINESS_TRIP_ROLE_GROUPS
+        roles this user holds.
+
+        The snapshot is cached per user id so role computes over large
+        recordsets resolve group membership once instead of once per record.
+        Odoo clears ormcaches whenever groups_id of a user or users of a
+        group are written, which keeps the snapshot in sync.
+        """
+        self.ensure_one()
+        return frozenset(
+            role for role, group_xmlid in BUSINESS_TRIP_ROLE_GROUPS.items()
+            if self.has_group(group_xmlid)
+        )
+
+    @tools.ormcache('self.id')
+    def _get_business_trip_upload_limit(self):
+        """
+        Returns the number of business trip uploads per hour allowed to this user:
+        its own limit if set, else the highest limit set on its groups, else the
+        limit of the Business Trip settings.
+        """
+        self.ensure_one()
+        if self.business_trip_upload_limit > 0:
+            return self.business_trip_upload_limit
+        group_limits = [limit for limit in self.groups_id.mapped('business_trip_upload_limit') if limit > 0]
+        if group_limits:
+            return max(group_limits)
+        limit = self.env['ir.config_parameter'].sudo().get_param(UPLOAD_RATE_LIMIT_PARAM)
+        try:
+            return int(limit) if limit else DEFAULT_UPLOAD_RATE_LIMIT
+        except ValueError:
+            return DEFAULT_UPLOAD_RATE_LIMIT
+
+    def _get_business_trip_manager_ids(self):
+        """
+        Returns {user id: manager user id} for the users of self, from the
+        hr.employee hierarchy: the user of the parent of the user's employee.
+        Users without an employee, or whose manager has no user, map to False.
+        All the users are resolved with one query.
+        """
+        if not self:
+            return {}
+        self.env['hr.employee'].flush(['user_id', 'parent_id', 'active', 'name'])
+        # Same employee as search([('user_id', '=', user.id)], limit=1): active, first by name
+        self.env.cr.execute("""
+            SELECT DISTINCT ON (employee.user_id) employee.user_id, manager.user_id
+              FROM hr_employee employee
+         LEFT JOIN hr_employee manager ON manager.id = employee.parent_id
+             WHERE employee.user_id IN %s AND employee.active
+          ORDER BY employee.user_id, employee.name, employee.id
+        """, (tuple(self.ids),))
+        manager_ids = dict.fromkeys(self.ids, False)
+        manager_ids.update({user_id: manager_id or False for user_id, manager_id in self.env.cr.fetchall()})
+        return manager_ids
+
+    @tools.ormcache('self.id')
+    def _get_business_trip_manager_id(self):
+        """
+        Cached manager user id of this user (see _get_business_trip_manager_ids).
+        Cleared by hr.employee whenever the hierarchy or the employee users change.
+        """
+        self.ensure_one()
+        return self._get_business_trip_manager_ids()[self.id]
+
+    def _get_business_trip_manager(self):
+        """Manager of this user, as a res.users record (possibly empty)."""
+        self.ensure_one()
+        return self.browse(self._get_business_trip_manager_id())
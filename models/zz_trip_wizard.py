@@ -6,6 +6,10 @@ import logging
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError, UserError
 from datetime import datetime, timedelta
+from .business_trip_plan_line import (
+    PLAN_ITEM_TYPES, PLAN_DIRECTIONS, PLAN_TRAVEL_CLASSES, PLAN_ACCOMMODATION_TYPES,
+    PLAN_COST_STATUSES, PLAN_PAYMENT_METHODS, PLAN_ITEM_KEYS,
+)
 import uuid
 import re
 
@@ -1118,23 +1122,24 @@ class BusinessTripOrganizerPlanWizard(models.TransientModel):
         form_id = self.env.context.get('active_id')
         if form_id:
             form = self.env['formio.form'].browse(form_id)
+            # The organizer plan is stored on the business trip of the form
+            trip = form.business_trip_id
             res.update({
                 'form_id': form_id,
-                'organizer_trip_plan_details': form.organizer_trip_plan_details,
-                'manual_planned_cost': form.organizer_planned_cost,
+                'organizer_trip_plan_details': trip.organizer_trip_plan_details,
+                'manual_planned_cost': trip.organizer_planned_cost,
                 # Attachments will be handled separately
             })
             
             # Determine if manual cost entry should be enabled
             # If there's a cost but no structured plan items, assume manual entry
-            if form.organizer_planned_cost and form.organizer_planned_cost > 0:
-                has_structured_items = form.structured_plan_items_json and form.structured_plan_items_json.strip() not in ['', '[]']
-                if not has_structured_items:
+            if trip.organizer_planned_cost and trip.organizer_planned_cost > 0:
+                if not trip.plan_line_ids:
                     res['manual_cost_entry'] = True
                     
             # Load existing attachments
-            if form.organizer_attachments_ids:
-                res['organizer_attachments_ids'] = [(6, 0, form.organizer_attachments_ids.ids)]
+            if trip.organizer_attachments_ids:
+                res['organizer_attachments_ids'] = [(6, 0, trip.organizer_attachments_ids.ids)]
                 
             # Load employee documents if available
             if hasattr(form, 'employee_documents_ids') and form.employee_documents_ids:
@@ -1147,56 +1152,19 @@ class BusinessTripOrganizerPlanWizard(models.TransientModel):
         return res
     
     def _recreate_plan_items_from_form(self, res, form):
-        """Recreate plan items from the structured JSON data saved on the form."""
-        plan_items_vals_list = []
-        if form.structured_plan_items_json:
-            try:
-                loaded_items_data = json.loads(form.structured_plan_items_json)
-                if isinstance(loaded_items_data, list):
-                    for item_data_dict in loaded_items_data:
-                        vals = {
-                            'item_type': item_data_dict.get('item_type'),
-                            'custom_type': item_data_dict.get('custom_type'),
-                            'item_data_json': item_data_dict.get('item_data_json'),
-                            'direction': item_data_dict.get('direction'),
-                            'description': item_data_dict.get('description'),
-                            'item_date': fields.Date.from_string(item_data_dict.get('item_date')) if item_data_dict.get('item_date') else None,
-                            'from_location': item_data_dict.get('from_location'),
-                            'to_location': item_data_dict.get('to_location'),
-                            'carrier': item_data_dict.get('carrier'),
-                            'reference_number': item_data_dict.get('reference_number'),
-                            'departure_time': item_data_dict.get('departure_time'),
-                            'arrival_time': item_data_dict.get('arrival_time'),
-                            'travel_class': item_data_dict.get('travel_class'),
-                            'nights': item_data_dict.get('nights'),
-                            'accommodation_type': item_data_dict.get('accommodation_type'),
-                            'cost': item_data_dict.get('cost'),
-                            'cost_status': item_data_dict.get('cost_status'),
-                            'is_reimbursable': item_data_dict.get('is_reimbursable', True),
-                            'payment_method': item_data_dict.get('payment_method'),
-                            'notes': item_data_dict.get('notes'),
-                        }
-                        plan_items_vals_list.append((0, 0, vals))
-                else:
-                    _logger.warning(
-                        f"Failed to recreate plan items for form {form.id}: structured_plan_items_json was not a list."
-                    )
-            except json.JSONDecodeError as e:
-                _logger.error(
-                    f"Failed to parse structured_plan_items_json for form {form.id}: {e}. JSON content: {form.structured_plan_items_json}"
-                )
-            except Exception as e:
-                _logger.error(f"Unexpected error recreating plan items from JSON for form {form.id}: {e}")
+        """Recreate plan items from the plan lines saved on the business trip of the form."""
+        trip = form.business_trip_id
+        plan_items_vals_list = [(0, 0, line._prepare_wizard_item_vals()) for line in trip.plan_line_ids]
 
         if plan_items_vals_list:
             res['plan_item_ids'] = plan_items_vals_list
-        elif not form.structured_plan_items_json and not form.organizer_trip_plan_details and form.organizer_planned_cost > 0:
-            # If no JSON and no manual notes, but there was a cost, create default items (legacy or initial setup).
+        elif not trip.structured_plan_items_json and not trip.organizer_trip_plan_details and trip.organizer_planned_cost > 0:
+            # If no saved plan and no manual notes, but there was a cost, create default items (legacy or initial setup).
             # This might need to be adjusted based on desired behavior for empty plans.
             _logger.info(f"No structured plan items found for form {form.id}, creating default items as organizer_planned_cost > 0.")
             self._create_default_plan_items(res, form)
         else:
-            # No items from JSON and no condition for default items, so ensure plan_item_ids is empty or not set in res
+            # No saved items and no condition for default items, so ensure plan_item_ids is empty or not set in res
             # This handles the case where an empty plan was explicitly saved (empty JSON list).
             if 'plan_item_ids' not in res: # if previous logic (text parsing) was removed this might not be needed
                  res['plan_item_ids'] = []
@@ -1207,6 +1175,15 @@ class BusinessTripOrganizerPlanWizard(models.TransientModel):
         # based on the initial trip request data.
         return res
 
+    def _prepare_structured_plan_items(self):
+        """Plan items of the wizard as the list stored in business.trip.structured_plan_items_json."""
+        plan_items_data = []
+        for item in self.plan_item_ids:
+            item_vals = {key: item[key] for key in PLAN_ITEM_KEYS}
+            item_vals['item_date'] = item.item_date.isoformat() if item.item_date else None
+            plan_items_data.append(item_vals)
+        return plan_items_data
+
     def action_save_plan(self):
         """
         Saves the current state of the plan from the wizard to the main form,
@@ -1227,43 +1204,17 @@ class BusinessTripOrganizerPlanWizard(models.TransientModel):
                 'res_id': self.form_id.id
             })
 
-        # Serialize plan items to JSON
-        plan_items_data = []
-        for item in self.plan_item_ids:
-            item_vals = {
-                'id': item.id,
-                'item_type': item.item_type,
-                'custom_type': item.custom_type,
-                'direction': item.direction,
-                'description': item.description,
-                'item_date': item.item_date.strftime('%Y-%m-%d') if item.item_date else None,
-                'from_location': item.from_location,
-                'to_location': item.to_location,
-                'carrier': item.carrier,
-                'reference_number': item.reference_number,
-                'departure_time': item.departure_time,
-                'arrival_time': item.arrival_time,
-                'travel_class': item.travel_class,
-                'nights': item.nights,
-                'accommodation_type': item.accommodation_type,
-                'cost': item.cost,
-                'cost_status': item.cost_status,
-                'is_reimbursable': item.is_reimbursable,
-                'payment_method': item.payment_method,
-                'notes': item.notes,
-                'item_data_json': item.item_data_json
-            }
-            plan_items_data.append(item_vals)
-
-        # Save the plan details to the main form
-        self.form_id.write({
+        # Save the plan details to the business trip, which keeps its plan lines in sync
+        self.form_id.business_trip_id.write({
             'organizer_planned_cost': self.organizer_planned_cost,
             'organizer_trip_plan_details': self.organizer_trip_plan_details,
-            'structured_plan_items_json': json.dumps(plan_items_data, indent=4),
+            'structured_plan_items_json': json.dumps(self._prepare_structured_plan_items(), indent=4),
             'organizer_attachments_ids': [(6, 0, self.organizer_attachments_ids.ids)],
-            'employee_documents_ids': [(6, 0, self.employee_documents_ids.ids)],
             'organizer_submission_date': fields.Datetime.now()
         })
+        self.form_id.write({
+            'employee_documents_ids': [(6, 0, self.employee_documents_ids.ids)],
+        })
 
         # --- START: MODIFIED SECTION ---
         # After saving to the form, post a structured summary to the confidential chatter.
@@ -1327,29 +1278,15 @@ class BusinessTripOrganizerPlanWizard(models.TransientModel):
             })
 
         # 1. Save all plan data directly within this method
-        plan_items_data = []
-        for item in self.plan_item_ids:
-            item_vals = {
-                'item_type': item.item_type, 'custom_type': item.custom_type,
-                'description': item.description, 'item_date': item.item_date.isoformat() if item.item_date else None,
-                'direction': item.direction, 'from_location': item.from_location,
-                'to_location': item.to_location, 'accommodation_type': item.accommodation_type,
-                'nights': item.nights, 'carrier': item.carrier,
-                'reference_number': item.reference_number, 'cost': item.cost,
-                'payment_method': item.payment_method, 'cost_status': item.cost_status,
-                'item_data_json': item.item_data_json, 'is_reimbursable': item.is_reimbursable,
-                'notes': item.notes,
-            }
-            plan_items_data.append(item_vals)
-
-        form_vals = {
+        self.form_id.business_trip_id.write({
             'organizer_trip_plan_details': self.organizer_trip_plan_details,
             'organizer_planned_cost': self.organizer_planned_cost,
             'organizer_attachments_ids': [(6, 0, self.organizer_attachments_ids.ids)],
+            'structured_plan_items_json': json.dumps(self._prepare_structured_plan_items(), indent=4),
+        })
+        self.form_id.write({
             'employee_documents_ids': [(6, 0, self.employee_documents_ids.ids)],
-            'structured_plan_items_json': json.dumps(plan_items_data, indent=4),
-        }
-        self.form_id.write(form_vals)
+        })
         _logger.info(f"Plan data for form {self.form_id.id} saved before confirmation.")
 
         # 2. Update the form state to 'organization_done' and then 'awaiting_trip_start'
@@ -1541,29 +1478,7 @@ class BusinessTripPlanLineItem(models.TransientModel):
     wizard_id = fields.Many2one('business.trip.organizer.plan.wizard', string='Plan Wizard', ondelete='cascade')
     
     # Type of travel arrangement
-    item_type = fields.Selection([
-        ('transport_air', 'Air Travel'),
-        ('transport_train', 'Train Travel'),
-        ('transport_bus', 'Bus Travel'),
-        ('transport_car', 'Car Rental'),
-        ('transport_taxi', 'Taxi/Local Transport'),
-        ('transport_other', 'Other Transportation'),
-        ('accommodation', 'Accommodation'),
-        ('accommodation_airbnb', 'Airbnb/Rental'),
-        ('meals', 'Meals'),
-        ('meals_per_diem', 'Per Diem Allowance'),
-        ('visa_fee', 'Visa Fee'),
-        ('conference', 'Conference/Event Fee'),
-        ('parking', 'Parking'),
-        ('insurance', 'Travel Insurance'),
-        ('internet', 'Internet/Communication'),
-        ('translation', 'Translation Services'),
-        ('entertainment', 'Entertainment/Activities'),
-        ('shopping', 'Shopping Allowance'),
-        ('currency_exchange', 'Currency Exchange Fee'),
-        ('other', 'Other'),
-        ('custom', 'Custom Item'),
-    ], string='Item Type', required=True)
+    item_type = fields.Selection(PLAN_ITEM_TYPES, string='Item Type', required=True)
     
     # For custom item types
     custom_type = fields.Char(string='Custom Item Type', help="Define if item type is 'Custom'.")
@@ -1740,14 +1655,7 @@ class BusinessTripPlanLineItem(models.TransientModel):
             record.update_item_data('event_times', record.event_times_widget)
     
     # Direction for transportation
-    direction = fields.Selection([
-        ('outbound', 'Outbound'),
-        ('inbound', 'Return'),
-        ('local', 'Local'),
-        ('transit', 'Transit/Connection'),
-        ('round_trip', 'Round Trip'),
-        ('na', 'N/A')
-    ], string='Direction', default='na')
+    direction = fields.Selection(PLAN_DIRECTIONS, string='Direction', default='na')
     
     # Details
     description = fields.Char(string='Description', required=True)
@@ -1760,48 +1668,21 @@ class BusinessTripPlanLineItem(models.TransientModel):
     reference_number = fields.Char(string='Reference/Booking Number', help="Booking/ticket reference.")
     departure_time = fields.Float(string='Departure Time', help="Departure time (e.g., 9.5 for 9:30).")
     arrival_time = fields.Float(string='Arrival Time', help="Arrival time (e.g., 15.5 for 15:30).")
-    travel_class = fields.Selection([
-        ('economy', 'Economy'),
-        ('business', 'Business'),
-        ('first', 'First Class'),
-        ('premium', 'Premium Economy'),
-        ('standard', 'Standard'),
-        ('other', 'Other')
-    ], string='Travel Class')
+    travel_class = fields.Selection(PLAN_TRAVEL_CLASSES, string='Travel Class')
     
     # Accommodation details
     nights = fields.Integer(string='Nights', default=1)
-    accommodation_type = fields.Selection([
-        ('hotel', 'Hotel'),
-        ('airbnb', 'Airbnb/Vacation Rental'),
-        ('corporate', 'Corporate Housing'),
-        ('hostel', 'Hostel'),
-        ('guesthouse', 'Guesthouse'),
-        ('relatives', 'Relatives/Friends'),
-        ('other', 'Other')
-    ], string='Accommodation Type')
+    accommodation_type = fields.Selection(PLAN_ACCOMMODATION_TYPES, string='Accommodation Type')
     
     # Cost details
     cost = fields.Float(string='Cost', required=False)
     currency_id = fields.Many2one('res.currency', related='wizard_id.currency_id', readonly=True)
-    cost_status = fields.Selection([
-        ('estimated', 'Estimated'),
-        ('quoted', 'Quoted'),
-        ('confirmed', 'Confirmed'),
-        ('paid', 'Paid'),
-        ('to_reimburse', 'To Reimburse')
-    ], string='Cost Status', default='estimated')
+    cost_status = fields.Selection(PLAN_COST_STATUSES, string='Cost Status', default='estimated')
     
     # Additional details
     is_reimbursable = fields.Boolean(string='Reimbursable', default=True, 
                                     help="Is this cost reimbursable to employee?")
-    payment_method = fields.Selection([
-        ('company', 'Company Paid'),
-        ('employee', 'Employee Paid (Reimbursable)'),
-        ('cash_advance', 'Cash Advance'),
-        ('per_diem', 'Per Diem'),
-        ('company_card', 'Company Card')
-    ], string='Payment Method', default='company')
+    payment_method = fields.Selection(PLAN_PAYMENT_METHODS, string='Payment Method', default='company')
     
     # Helper fields
     attachment_ids = fields.Many2many('ir.attachment', 
@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+
+from . import test_submission_files
+from . import test_submission_mapping
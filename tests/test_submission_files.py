@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+import base64
+import json
+
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestSubmissionFiles(TransactionCase):
+    """Uploaded documents of a submission are readable from their binary fields."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        builder = cls.env['formio.builder'].create({
+            'name': 'Business Trip Submission Files Test',
+            'title': 'Business Trip Submission Files Test',
+        })
+        cls.form = cls.env['formio.form'].create({
+            'builder_id': builder.id,
+            'title': 'Business Trip Submission Files Test',
+        })
+        cls.trip_data = cls.env['business.trip.data'].create({'form_id': cls.form.id})
+        cls.license_content = b'%PDF-1.4 driver license ' * 4096
+        cls.document_content = b'\x89PNG\r\n\x1a\n identity document ' * 4096
+
+    def _file_component(self, name, mimetype, content):
+        return [{
+            'storage': 'base64',
+            'name': name,
+            'url': f'data:{mimetype};base64,' + base64.b64encode(content).decode(),
+        }]
+
+    def _submission(self):
+        return {
+            'first_name': 'Jane',
+            'last_name': 'Doe',
+            'means_of_transport': {'rental_car': True},
+            'drivers_license_file': self._file_component('license.pdf', 'application/pdf', self.license_content),
+            'accompanying_persons_panel': [{
+                'full_name_acc': 'John Doe',
+                'accompanying_identity_document_acc': self._file_component('passport.png', 'image/png', self.document_content),
+            }],
+        }
+
+    def test_process_submission_stores_binary_fields(self):
+        self.assertTrue(self.trip_data.process_submission_data(self._submission()))
+
+        self.trip_data.invalidate_cache()
+        self.assertEqual(base64.b64decode(self.trip_data.rental_car_drivers_license), self.license_content)
+        self.assertEqual(self.trip_data.rental_car_drivers_license_filename, 'license.pdf')
+        person = self.trip_data.accompanying_person_ids
+        self.assertEqual(len(person), 1)
+        self.assertEqual(base64.b64decode(person.identity_document), self.document_content)
+        self.assertEqual(person.identity_document_filename, 'passport.png')
+
+    def test_reprocess_stripped_submission_keeps_binary_fields(self):
+        self.trip_data.process_submission_data(self._submission())
+
+        # The stored submission links to the attachments instead of carrying the base64
+        stored_submission = json.loads(self.form.submission_data)
+        license_info = stored_submission['drivers_license_file'][0]
+        self.assertTrue(license_info.get('attachment_id'))
+        self.assertNotIn('base64', license_info['url'])
+
+        self.assertTrue(self.trip_data.process_submission_data(stored_submission))
+        self.trip_data.invalidate_cache()
+        self.assertEqual(base64.b64decode(self.trip_data.rental_car_drivers_license), self.license_content)
+        self.assertEqual(base64.b64decode(self.trip_data.accompanying_person_ids.identity_document), self.document_content)
+
+    def test_uploaded_attachment_is_attached_to_trip_data(self):
+        # Uploaded through the controller: not linked to any record yet
+        upload = self.env['ir.attachment'].create({
+            'name': 'license.pdf',
+            'res_model': 'business.trip.data',
+            'res_id': 0,
+            'raw': self.license_content,
+        })
+        submission = dict(self._submission(), drivers_license_file=[{
+            'storage': 'url', 'name': 'license.pdf', 'url': f'/web/content/{upload.id}', 'attachment_id': upload.id,
+        }])
+
+        self.assertTrue(self.trip_data.process_submission_data(submission))
+        self.assertEqual(upload.res_id, self.trip_data.id)
+        self.trip_data.invalidate_cache()
+        self.assertEqual(base64.b64decode(self.trip_data.rental_car_drivers_license), self.license_content)
+
+    def test_reprocess_with_deleted_attachments_keeps_binary_fields(self):
+        self.trip_data.process_submission_data(self._submission())
+        stored_submission = json.loads(self.form.submission_data)
+        attachment_ids = [
+            stored_submission['drivers_license_file'][0]['attachment_id'],
+            stored_submission['accompanying_persons_panel'][0]['accompanying_identity_document_acc'][0]['attachment_id'],
+        ]
+        self.env['ir.attachment'].browse(attachment_ids).unlink()
+
+        self.assertTrue(self.trip_data.process_submission_data(stored_submission))
+        self.trip_data.invalidate_cache()
+        self.assertEqual(base64.b64decode(self.trip_data.rental_car_drivers_license), self.license_content)
+        person = self.trip_data.accompanying_person_ids
+        self.assertEqual(base64.b64decode(person.identity_document), self.document_content)
+
+        # The stored submission points to the document moved off the deleted person
+        document_info = json.loads(self.form.submission_data)['accompanying_persons_panel'][0]['accompanying_identity_document_acc'][0]
+        self.assertNotIn(document_info['attachment_id'], attachment_ids)
+        self.assertEqual(self.env['ir.attachment'].browse(document_info['attachment_id']).res_id, self.trip_data.id)
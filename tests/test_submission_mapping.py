@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+import json
+
+from odoo.tests import TransactionCase, tagged
+from odoo.tools import file_open
+
+
+@tagged('post_install', '-at_install')
+class TestSubmissionMapping(TransactionCase):
+    """
+    The declarative SUBMISSION_FIELDS mapping extracts the same vals as the
+    hand-written extraction it replaced. The expected vals of
+    data/submission_extraction.json were recorded from that implementation
+    (before the mapping was introduced) on representative submissions: nested
+    and flat Form.io data, accommodation needed or not, every transport group,
+    root keys taking precedence over the nested ones, empty values falling back
+    to them, and unparseable dates.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with file_open('custom_business_trip_management/tests/data/submission_extraction.json') as data_file:
+            cls.cases = json.load(data_file)
+        cls.TripData = cls.env['business.trip.data']
+
+    def _extract(self, submission):
+        vals = self.TripData._prepare_submission_vals(submission, [])
+        self.assertTrue(vals)
+        # Resolved against the currencies of the database, not part of the mapping
+        vals.pop('currency_id')
+        # Dates as ISO strings, like the recorded vals
+        return json.loads(json.dumps(vals, default=str))
+
+    def test_mapping_matches_hand_written_extraction(self):
+        for name, submission in self.cases['submissions'].items():
+            with self.subTest(submission=name):
+                self.assertEqual(self._extract(submission), self.cases['expected'][name])
+
+    def test_unparseable_number_falls_back_to_default(self):
+        # The hand-written extraction raised here, the mapping logs and uses the default
+        vals = self._extract({'first_name': 'Jane', 'expected_cost': 'abc', 'manual_travel_duration': 'n/a'})
+        self.assertEqual(vals['expected_cost'], 0.0)
+        self.assertEqual(vals['manual_travel_duration'], 0.0)